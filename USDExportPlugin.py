@@ -82,6 +82,11 @@ def USDExportCommand_Init(in_ctxt):
     args.Add("use_subdiv")
     args.Add("ignore_unknown")
     args.Add("force_change_frame")
+    args.Add("fused_sampling")  # write animation in one pass, without the animation check
+    args.Add("sample_cache_budget")  # memory limit (in megabytes) for values, sampled by animation checks
+    args.Add("held_samples")  # write animated mesh attributes only when they are changed
+    args.Add("indexed_primvars")  # write uvs and vertex colors as indexed primvars with unique values
+    args.Add("half_precision")  # [attr1, attr2, ...] attributes, written with half precision ("normal", "uvmap", "color", "width")
 
     return True
 
@@ -102,6 +107,11 @@ def USDExportCommand_Execute(*args):
     use_subdiv = args[6] if args[6] is not None else False
     ignore_unknown = args[7] if args[7] is not None else True
     force_change_frame = args[8] if args[8] is not None else False
+    fused_sampling = args[9] if args[9] is not None else False
+    sample_cache_budget = args[10] if args[10] is not None else 256
+    held_samples = args[11] if args[11] is not None else False
+    indexed_primvars = args[12] if args[12] is not None else False
+    half_precision = args[13] if args[13] is not None else ()
 
     params = {"animation": animation,
               "objects_list": objects_list,
@@ -109,7 +119,12 @@ def USDExportCommand_Execute(*args):
               "attr_list": attr_list,
               "options": {"use_subdiv": use_subdiv,
                           "ignore_unknown": ignore_unknown,
-                          "force_change_frame": force_change_frame},
+                          "force_change_frame": force_change_frame,
+                          "fused_sampling": fused_sampling,
+                          "sample_cache_budget": int(sample_cache_budget * 1048576),
+                          "held_samples": held_samples,
+                          "indexed_primvars": indexed_primvars,
+                          "half_precision": half_precision},
               "materials": {"is_materials": is_materials}}
     if DEBUG_MODE:
         imp.reload(export_processor)
@@ -131,6 +146,14 @@ def USDExportOpen_Execute():
     if os.path.isfile(props_path):
         with open(props_path, "r") as file:
             export_props = eval(file.read())
+        # these keys are absent in files from previous versions
+        export_props.setdefault("opt_fused_sampling", False)
+        export_props.setdefault("opt_held_samples", False)
+        export_props.setdefault("opt_indexed_primvars", False)
+        export_props.setdefault("opt_half_normals", False)
+        export_props.setdefault("opt_half_uvs", False)
+        export_props.setdefault("opt_half_colors", False)
+        export_props.setdefault("opt_half_widths", False)
     else:  # set default values
         export_props = {"is_selection": False,
                         "is_animation": False,
@@ -154,7 +177,14 @@ def USDExportOpen_Execute():
                         "end_frame": get_end_timeline_frame(),
                         "opt_subdiv": False,
                         "opt_ignore_unknown": True,
-                        "opt_force_key_change": False}
+                        "opt_force_key_change": False,
+                        "opt_fused_sampling": False,
+                        "opt_held_samples": False,
+                        "opt_indexed_primvars": False,
+                        "opt_half_normals": False,
+                        "opt_half_uvs": False,
+                        "opt_half_colors": False,
+                        "opt_half_widths": False}
 
     # create property
     prop = scene_root.AddProperty("CustomProperty", False, "USD_Export")
@@ -208,6 +238,20 @@ def USDExportOpen_Execute():
     param.Animatable = False
     param = prop.AddParameter3("opt_force_key_change", constants.siBool, export_props["opt_force_key_change"])
     param.Animatable = False
+    param = prop.AddParameter3("opt_fused_sampling", constants.siBool, export_props["opt_fused_sampling"])
+    param.Animatable = False
+    param = prop.AddParameter3("opt_held_samples", constants.siBool, export_props["opt_held_samples"])
+    param.Animatable = False
+    param = prop.AddParameter3("opt_indexed_primvars", constants.siBool, export_props["opt_indexed_primvars"])
+    param.Animatable = False
+    param = prop.AddParameter3("opt_half_normals", constants.siBool, export_props["opt_half_normals"])
+    param.Animatable = False
+    param = prop.AddParameter3("opt_half_uvs", constants.siBool, export_props["opt_half_uvs"])
+    param.Animatable = False
+    param = prop.AddParameter3("opt_half_colors", constants.siBool, export_props["opt_half_colors"])
+    param.Animatable = False
+    param = prop.AddParameter3("opt_half_widths", constants.siBool, export_props["opt_half_widths"])
+    param.Animatable = False
 
     # define layout
     layout = prop.PPGLayout
@@ -267,6 +311,16 @@ def USDExportOpen_Execute():
     layout.AddItem("opt_subdiv", "Activate Subdivision")
     layout.AddItem("opt_ignore_unknown", "Ignore Unexported Objects")
     layout.AddItem("opt_force_key_change", "Change Frames in Animation Export")
+    layout.AddItem("opt_fused_sampling", "Single Pass Animation Export")
+    layout.AddItem("opt_held_samples", "Write Only Changed Mesh Samples")
+    layout.AddItem("opt_indexed_primvars", "Indexed UVs and Colors")
+    layout.EndGroup()
+
+    layout.AddGroup("Half Precision")
+    layout.AddItem("opt_half_normals", "Normals")
+    layout.AddItem("opt_half_uvs", "UVs")
+    layout.AddItem("opt_half_colors", "Vertex Colors")
+    layout.AddItem("opt_half_widths", "Widths of Points and Curves")
     layout.EndGroup()
 
     rtn = app.InspectObj(prop, "", "Export *.usd file...", constants.siModal, False)
@@ -297,6 +351,13 @@ def USDExportOpen_Execute():
         export_props["opt_subdiv"] = prop.Parameters("opt_subdiv").Value
         export_props["opt_ignore_unknown"] = prop.Parameters("opt_ignore_unknown").Value
         export_props["opt_force_key_change"] = prop.Parameters("opt_force_key_change").Value
+        export_props["opt_fused_sampling"] = prop.Parameters("opt_fused_sampling").Value
+        export_props["opt_held_samples"] = prop.Parameters("opt_held_samples").Value
+        export_props["opt_indexed_primvars"] = prop.Parameters("opt_indexed_primvars").Value
+        export_props["opt_half_normals"] = prop.Parameters("opt_half_normals").Value
+        export_props["opt_half_uvs"] = prop.Parameters("opt_half_uvs").Value
+        export_props["opt_half_colors"] = prop.Parameters("opt_half_colors").Value
+        export_props["opt_half_widths"] = prop.Parameters("opt_half_widths").Value
         # write it
         with open(props_path, "w") as file:
             file.write(str(export_props))
@@ -335,6 +396,16 @@ def USDExportOpen_Execute():
         if prop.Parameters("is_edge_creases").Value:
             attributes.append("edge_creases")
 
+        half_attributes = []
+        if prop.Parameters("opt_half_normals").Value:
+            half_attributes.append("normal")
+        if prop.Parameters("opt_half_uvs").Value:
+            half_attributes.append("uvmap")
+        if prop.Parameters("opt_half_colors").Value:
+            half_attributes.append("color")
+        if prop.Parameters("opt_half_widths").Value:
+            half_attributes.append("width")
+
         objects = [o for o in app.Selection] if prop.Parameters("is_selection").Value else [app.ActiveProject2.ActiveScene.Root]
         app.USDExportCommand(prop.Parameters("file_path").Value,
                              objects,
@@ -344,7 +415,12 @@ def USDExportOpen_Execute():
                              prop.Parameters("is_materials").Value,
                              prop.Parameters("opt_subdiv").Value,
                              prop.Parameters("opt_ignore_unknown").Value,
-                             prop.Parameters("opt_force_key_change").Value)
+                             prop.Parameters("opt_force_key_change").Value,
+                             prop.Parameters("opt_fused_sampling").Value,
+                             None,
+                             prop.Parameters("opt_held_samples").Value,
+                             prop.Parameters("opt_indexed_primvars").Value,
+                             half_attributes)
 
     # delete dialog
     app.DeleteObj(prop)
@@ -60,6 +60,8 @@ def USDImportCommand_Init(in_ctxt):
     args.Add("clear_scene")
     args.Add("is_materials")
     args.Add("light_mode")
+    args.Add("ice_cache_workers")  # number of processes for writing animated icecache files, 1 - write in the main process
+    args.Add("ice_cache_compression")  # gzip level 0-9 of icecache files, -1 - write uncompressed files
 
     return True
 
@@ -73,12 +75,16 @@ def USDImportCommand_Execute(*args):
     clear_scene = args[3] if args[3] is not None else False
     is_materials = args[4] if args[4] is not None else True
     light_mode = args[5] if args[5] is not None else 0  # default light mode use default lights
+    ice_cache_workers = args[6] if args[6] is not None else 1
+    ice_cache_compression = args[7] if args[7] is not None else 9
 
     import_options = {"clear_scene": clear_scene,
                       "is_materials": is_materials,
                       "attributes": attributes,
                       "object_types": object_types,
                       "light_mode": light_mode,
+                      "ice_cache_workers": ice_cache_workers,
+                      "ice_cache_compression": ice_cache_compression,
                       "XSIMath": XSIMath}
     if DEBUG_MODE:
         imp.reload(import_processor)
@@ -119,7 +125,9 @@ def USDImportOpen_Execute():
                         "is_vertex_creases": True,
                         "is_edge_creases": True,
                         "is_vertex_color": True,
-                        "light_mode": 0}
+                        "light_mode": 0,
+                        "ice_cache_workers": 1,
+                        "ice_cache_compression": 9}
 
     # create property
     prop = scene_root.AddProperty("CustomProperty", False, "USD_Import")
@@ -164,6 +172,11 @@ def USDImportOpen_Execute():
     param = prop.AddParameter3("light_mode", constants.siInt2, import_props["light_mode"])
     param.Animatable = False
 
+    param = prop.AddParameter3("ice_cache_workers", constants.siInt4, import_props.get("ice_cache_workers", 1), 1, 64)
+    param.Animatable = False
+    param = prop.AddParameter3("ice_cache_compression", constants.siInt2, import_props.get("ice_cache_compression", 9))
+    param.Animatable = False
+
     # define layout
     layout = prop.PPGLayout
     layout.Clear()
@@ -215,6 +228,21 @@ def USDImportOpen_Execute():
     layout.AddEnumControl("light_mode", ["Default", 0, "Sycles", 1] if utils.is_sycles_install(app) else ["Default", 0], "Light Sources")
     layout.EndGroup()
 
+    layout.AddGroup("ICE Cache")
+    layout.AddItem("ice_cache_workers", "Worker Processes")
+    layout.AddEnumControl("ice_cache_compression", ["Store (Uncompressed)", -1,
+                                                    "0 (Gzip, No Compression)", 0,
+                                                    "1 (Fastest)", 1,
+                                                    "2", 2,
+                                                    "3", 3,
+                                                    "4", 4,
+                                                    "5", 5,
+                                                    "6", 6,
+                                                    "7", 7,
+                                                    "8", 8,
+                                                    "9 (Smallest)", 9], "Compression")
+    layout.EndGroup()
+
     layout.AddGroup("Options")
     layout.AddItem("clear_scene", "Clear Scene")
     layout.AddItem("materials", "Assign Imported Materials")
@@ -239,6 +267,8 @@ def USDImportOpen_Execute():
         import_props["is_edge_creases"] = prop.Parameters("is_edge_creases").Value
         import_props["is_vertex_color"] = prop.Parameters("is_vertex_color").Value
         import_props["light_mode"] = prop.Parameters("light_mode").Value
+        import_props["ice_cache_workers"] = prop.Parameters("ice_cache_workers").Value
+        import_props["ice_cache_compression"] = prop.Parameters("ice_cache_compression").Value
         with open(props_path, "w") as file:
             file.write(str(import_props))
 
@@ -280,7 +310,9 @@ def USDImportOpen_Execute():
                              objects_types,
                              prop.Parameters("clear_scene").Value,
                              prop.Parameters("materials").Value,
-                             prop.Parameters("light_mode").Value)
+                             prop.Parameters("light_mode").Value,
+                             prop.Parameters("ice_cache_workers").Value,
+                             prop.Parameters("ice_cache_compression").Value)
 
     # delete dialog
     app.DeleteObj(prop)
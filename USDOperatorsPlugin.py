@@ -122,7 +122,9 @@ def USDMeshOperator_Update(in_ctxt):
                     "ignore_inmesh_tfm": ignore_inmesh_tfm,
                     "is_topology_change": is_topology_change,
                     "assign_material": assign_material,
-                    "material_library": material_library}
+                    "material_library": material_library,
+                    "file_path": file_path,
+                    "mesh_path": mesh_path}
 
     if is_active:
         xsi_geometry = in_ctxt.OutputTarget.Geometry
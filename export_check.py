@@ -0,0 +1,176 @@
+# export check
+# standalone script, it does not require Softimage, but requires pxr (usd-core)
+# usage:
+#     python export_check.py
+#
+
+"""
+Export small scenes through export_processor.export with fake Softimage objects and check written usd files.
+
+model - the model with animated null child is exported with single pass animation export,
+        the transform of the child should be written to the stage of the model
+scene - animated null is exported without the model, the transform should be written to the main stage
+
+Fake objects implement only methods, which are called by exporters of nulls and models.
+If win32com is not installed, then Softimage constants are replaced by strings.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import types
+
+try:
+    from win32com.client import constants
+except ImportError:
+    constants = types.SimpleNamespace(siModelType="#model", siNullPrimType="null", siPolyMeshType="polymsh", siCameraPrimType="camera", siLightPrimType="light")
+    win32com_module = types.ModuleType("win32com")
+    client_module = types.ModuleType("win32com.client")
+    client_module.constants = constants
+    win32com_module.client = client_module
+    sys.modules["win32com"] = win32com_module
+    sys.modules["win32com.client"] = client_module
+
+from pxr import Usd, UsdGeom
+import export_processor
+
+
+class FakeMatrix:
+    def __init__(self, translation):
+        self.translation = translation
+
+    def Value(self, row, column):
+        if row == 3 and column < 3:
+            return self.translation[column]
+        return 1.0 if row == column else 0.0
+
+
+class FakeTransform:
+    def __init__(self, translation):
+        self.Matrix4 = FakeMatrix(translation)
+
+
+class FakeLocal:
+    def __init__(self, get_translation):
+        self.get_translation = get_translation
+        self.Transform = FakeTransform(get_translation(None))
+
+    def GetTransform2(self, frame):
+        return FakeTransform(self.get_translation(frame))
+
+
+class FakeParameter:
+    def __init__(self, value):
+        self.Value = value
+
+
+class FakeProperty:
+    def Parameters(self, name):
+        return FakeParameter(True)
+
+
+class FakeObject:
+    object_id = 0
+
+    def __init__(self, name, obj_type, get_translation, children=()):
+        FakeObject.object_id += 1
+        self.ObjectID = FakeObject.object_id
+        self.Name = name
+        self.FullName = name
+        self.Type = obj_type
+        self.Kinematics = types.SimpleNamespace(Local=FakeLocal(get_translation))
+        self.Children = list(children)
+        self.InstanceMaster = None
+
+    def Properties(self, name):
+        return FakeProperty()
+
+
+def build_params(objects, animation):
+    return {"animation": animation,
+            "objects_list": objects,
+            "object_types": (constants.siModelType, constants.siNullPrimType),
+            "attr_list": (),
+            "options": {"use_subdiv": False,
+                        "ignore_unknown": True,
+                        "force_change_frame": False,
+                        "fused_sampling": True},
+            "materials": {"is_materials": False}}
+
+
+def export_scene(folder, objects, animation):
+    '''export objects and return the path to the main file
+    '''
+    app = types.SimpleNamespace(ActiveProject2=types.SimpleNamespace(ActiveScene=types.SimpleNamespace(Root=FakeObject("Scene_Root", "#model", lambda frame: (0.0, 0.0, 0.0)))))
+    toolkit = types.SimpleNamespace(ProgressBar=types.SimpleNamespace())
+    file_path = os.path.join(folder, "scene.usda")
+    export_processor.export(app, file_path, build_params(objects, animation), toolkit)
+    return file_path
+
+
+def find_stage_files(folder):
+    '''exporters use windows separators in paths, so on other systems the file of the asset
+    is written near the folder with the name, which starts from the name of the folder
+    '''
+    parent_folder, folder_name = os.path.split(folder)
+    return [os.path.join(parent_folder, file_name) for file_name in os.listdir(parent_folder) if file_name.startswith(folder_name + "\\")]
+
+
+def find_stage(folder, name):
+    for file_path in [os.path.join(folder, file_name) for file_name in os.listdir(folder)] + find_stage_files(folder):
+        if file_path.endswith(name):
+            return Usd.Stage.Open(file_path)
+    return None
+
+
+def get_translations(usd_prim):
+    xform = UsdGeom.Xformable(usd_prim)
+    return [xform.GetLocalTransformation(frame).ExtractTranslation()[0] for frame in xform.GetTimeSamples()]
+
+
+def check_model(folder):
+    child = FakeObject("child", constants.siNullPrimType, lambda frame: (0.0 if frame is None else float(frame), 0.0, 0.0))
+    model = FakeObject("model", constants.siModelType, lambda frame: (0.0, 0.0, 0.0), [child])
+    export_scene(folder, [model], (1, 3))
+    model_stage = find_stage(folder, "model.usda")
+    if model_stage is None:
+        return "the stage of the model is not written"
+    child_prim = model_stage.GetPrimAtPath("/model/child")
+    if not child_prim.IsValid():
+        return "the child of the model is not written"
+    translations = get_translations(child_prim)
+    if translations != [1.0, 2.0, 3.0]:
+        return "wrong animation of the model child: " + str(translations)
+    return None
+
+
+def check_scene(folder):
+    null = FakeObject("null", constants.siNullPrimType, lambda frame: (0.0 if frame is None else 2.0 * frame, 0.0, 0.0))
+    stage = Usd.Stage.Open(export_scene(folder, [null], (1, 3)))
+    translations = get_translations(stage.GetPrimAtPath("/null"))
+    if translations != [2.0, 4.0, 6.0]:
+        return "wrong animation of the null: " + str(translations)
+    return None
+
+
+def main():
+    failed = 0
+    for name, check in [("model", check_model), ("scene", check_scene)]:
+        folder = tempfile.mkdtemp()
+        try:
+            error = check(folder)
+        except Exception as e:
+            error = "exception " + repr(e)
+        finally:
+            for file_path in find_stage_files(folder):
+                os.remove(file_path)
+            shutil.rmtree(folder)
+        print(name + ": " + ("ok" if error is None else "FAILED, " + error))
+        if error is not None:
+            failed += 1
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,6 +11,7 @@ import prim_model
 import prim_pointcloud
 import materials
 import utils
+import sampling
 import imp
 
 DEBUG_MODE = False
@@ -27,6 +28,7 @@ def export(app, file_path, params, xsi_toolkit):
         imp.reload(prim_pointcloud)
         imp.reload(materials)
         imp.reload(utils)
+        imp.reload(sampling)
 
     start_time = time.time()
 
@@ -43,6 +45,11 @@ def export(app, file_path, params, xsi_toolkit):
     opts = params.get("options", None)
     if opts is not None:
         opts["extension"] = utils.get_file_extension(file_path)
+    # values, sampled by animation checks, are reused by exporters
+    params["sample_cache"] = sampling.FrameSampleCache(sampling.DEFAULT_BUDGET if opts is None else opts.get("sample_cache_budget", sampling.DEFAULT_BUDGET))
+    # animated objects are exported in one pass through the frames after all objects are added to the stage
+    if params.get("animation", None) is not None and opts is not None and opts.get("fused_sampling", False):
+        params["scheduler"] = sampling.ExportScheduler(app, params["animation"], opts.get("force_change_frame", False))
 
     is_materials = True
     mats = params.get("materials", None)
@@ -65,7 +72,10 @@ def export(app, file_path, params, xsi_toolkit):
     else:
         for obj in params["objects_list"]:
             export_step(app, params, path_for_objects, stage, obj, exported_objects, materials_opt, root_path, progress_bar)
+    if params.get("scheduler", None) is not None:
+        params.pop("scheduler").run(progress_bar)
     stage.Save()
+    params["sample_cache"].clear()
 
     progress_bar.Visible = False
 
@@ -119,7 +129,7 @@ def export_step(app, params, path_for_objects, stage, obj, exported_objects, mat
                 usd_model.GetReferences().AddReference("./" + utils.get_last_folder(path_for_objects) + "/" + master.FullName + ".usda", "/" + master.Name)
                 usd_model.SetInstanceable(True)
                 usd_pointer = UsdGeom.Xformable(usd_model)
-                prim_xform.add_transform_to_xfo(usd_pointer, obj, params.get("animation", None))
+                prim_xform.add_transform_to_xfo(usd_pointer, obj, params.get("animation", None), params.get("sample_cache", None), opt.get("fused_sampling", False), params.get("scheduler", None))
                 prim_xform.add_visibility_to_xfo(usd_pointer, obj)
         elif (obj_type == constants.siNullPrimType and constants.siNullPrimType in opt_object_types) or (obj_type == "CameraRoot" and constants.siCameraPrimType in opt_object_types):
             # null
@@ -133,6 +143,8 @@ def export_step(app, params, path_for_objects, stage, obj, exported_objects, mat
                     # all unsupported object are nulls, so they are Xforms
                     print("Unknown object " + obj_type + ". Degrade to xform")
                     usd_pointer, ref_stage, ref_stage_asset = prim_xform.add_xform(app, params, path_for_objects, False, stage, obj, root_path)
+        # the object is exported, so its sampled values are not needed
+        sampling.release_samples(params.get("sample_cache", None), obj.ObjectID)
         # continue recirsive process
         if usd_pointer is not None:
             exported_objects.append(obj.ObjectID)
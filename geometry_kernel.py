@@ -0,0 +1,346 @@
+# vectorized versions of geometry functions from utils module
+# numpy is optional (it is not included into Softimage python), if it is not installed, then pure python functions from utils are used
+# all functions have the same semantics as in utils (with the same EPSILON tolerance)
+# input arrays can be lists of tuples, Vt-arrays or numpy arrays, output arrays are numpy arrays (or lists without numpy)
+# use to_list() before passing the result to Softimage COM-methods or USD attributes
+import hashlib
+import utils
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+IDENTITY_MATRIX = [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]
+
+
+def is_numpy():
+    return numpy is not None
+
+
+def as_vectors(array, dimension=3):
+    '''return contiguous numpy array of the shape (count, dimension)
+    array is a sequence of vectors [(x1, y1, z1), ...] or flat sequence [x1, y1, z1, x2, ...]
+    without numpy return the list of tuples
+    '''
+    if numpy is None:
+        if len(array) > 0 and not hasattr(array[0], "__len__"):
+            return [tuple(array[dimension*i:dimension*(i + 1)]) for i in range(len(array) // dimension)]
+        return [tuple(v[k] for k in range(dimension)) for v in array]
+    return numpy.ascontiguousarray(numpy.asarray(array, dtype=numpy.float64).reshape(-1, dimension))
+
+
+def to_list(array):
+    '''convert numpy array to python lists, other arrays return as is
+    '''
+    if numpy is not None and isinstance(array, numpy.ndarray):
+        return array.tolist()
+    return array
+
+
+def widen_half_array(array, dimension=1):
+    '''return float values of the usd array with half precision (for example Vt.HalfArray or Vt.Vec3hArray)
+    the result is a flat array for dimension 1, otherwise it is an array of vectors
+    '''
+    if numpy is None:
+        if dimension == 1:
+            return [float(v) for v in array]
+        return [tuple(float(v[k]) for k in range(dimension)) for v in array]
+    values = numpy.asarray(array).astype(numpy.float64)
+    return values.reshape(-1) if dimension == 1 else values.reshape(-1, dimension)
+
+
+def transpose_vectors_array(array):
+    '''transform array of the form [(x1, y1, z1), (x2, y2, z2), ...] to [[x1, x2, ...], [y1, y2, ...], [z1, z2, ...]]
+    '''
+    if numpy is None:
+        return utils.transpose_vectors_array(array)
+    return numpy.ascontiguousarray(as_vectors(array, 3).T)
+
+
+def transpose_2vectors_array(array):
+    '''transform array of the form [(x1, y1), (x2, y2), ...] to [[x1, x2, ...], [y1, y2, ...]]
+    '''
+    if numpy is None:
+        return utils.transpose_2vectors_array(array)
+    return numpy.ascontiguousarray(as_vectors(array, 2).T)
+
+
+def transpose_4vectors_array(array):
+    '''transform array of the form [(x1, y1, z1, w1), (x2, y2, z2, w2) ...] to [[x1, x2, ...], [y1, y2, ...], [z1, z2, ...], [w1, w2, ...]]
+    '''
+    if numpy is None:
+        return utils.transpose_4vectors_array(array)
+    return numpy.ascontiguousarray(as_vectors(array, 4).T)
+
+
+def from_xsi_vectors_array(array):
+    '''transform xsi array of the form [[x1, x2, ...], [y1, y2, ...], [z1, z2, ...]] (for example Vertices.PositionArray)
+    to the array of vectors [(x1, y1, z1), (x2, y2, z2), ...]
+    '''
+    if numpy is None:
+        return list(zip(*array))
+    return numpy.ascontiguousarray(numpy.asarray(array, dtype=numpy.float64).T)
+
+
+def set_vectors_at_indexes(vectors, indexes, values):
+    '''write values to the array of vectors: vectors[indexes[i]] = values[i]
+    vectors is an array from from_xsi_vectors_array() or as_vectors(), values is an array of vectors, it is modified in-place and returned
+    '''
+    if len(indexes) == 0:
+        return vectors
+    if numpy is None:
+        for i in range(len(indexes)):
+            vectors[indexes[i]] = tuple(values[i])
+        return vectors
+    vectors[numpy.asarray(indexes, dtype=numpy.int64)] = as_vectors(values, vectors.shape[1])
+    return vectors
+
+
+def select_greater(values, threshold):
+    '''return the pair (indexes, values) for all values, which are greater than the threshold
+    '''
+    if numpy is None:
+        indexes = [i for i in range(len(values)) if values[i] > threshold]
+        return indexes, [values[i] for i in indexes]
+    values = numpy.asarray(values, dtype=numpy.float64).reshape(-1)
+    indexes = numpy.flatnonzero(values > threshold)
+    return indexes, values[indexes]
+
+
+def select_items(array, indexes, dimension=1):
+    '''array is a flat array of items with dimension values, return flat array with items at indexes
+    '''
+    if numpy is None:
+        return [array[dimension*i + k] for i in indexes for k in range(dimension)]
+    return numpy.asarray(array).reshape(-1, dimension)[numpy.asarray(indexes, dtype=numpy.int64)].reshape(-1)
+
+
+def build_indexed_values(array, dimension, tolerance=utils.EPSILON):
+    '''return the pair (values, indexes), where values are unique vectors of the array and array[i] is close to values[indexes[i]]
+    vectors are equal, if they are equal after rounding of coordinates to the tolerance, each unique vector is the first such vector of the array
+    '''
+    if numpy is None:
+        key_to_index = {}
+        values = []
+        indexes = []
+        for v in as_vectors(array, dimension):
+            key = tuple(int(round(c / tolerance)) for c in v)
+            if key not in key_to_index:
+                key_to_index[key] = len(values)
+                values.append(v)
+            indexes.append(key_to_index[key])
+        return values, indexes
+    vectors = as_vectors(array, dimension)
+    if len(vectors) == 0:
+        return vectors, numpy.zeros(0, dtype=numpy.int64)
+    keys = numpy.round(vectors / tolerance).astype(numpy.int64)
+    unique_keys, first_positions, indexes = numpy.unique(keys, axis=0, return_index=True, return_inverse=True)
+    return vectors[first_positions], indexes.reshape(-1)
+
+
+def build_xsi_faces_array(face_indexes, face_sizes):
+    '''return polygons array for Geometry.Set() in the form [size1, index, index, ..., size2, index, ...]
+    positions of polygon sizes are cumulative sums of sizes, all other positions are filled by indexes
+    '''
+    if numpy is None:
+        return utils.usd_to_xsi_faces_array(face_indexes, face_sizes, None)
+    sizes = numpy.asarray(face_sizes, dtype=numpy.int64).reshape(-1)
+    corners_count = int(sizes.sum())
+    polygons = numpy.empty(len(sizes) + corners_count, dtype=numpy.int64)
+    size_positions = numpy.cumsum(sizes + 1) - (sizes + 1)
+    polygons[size_positions] = sizes
+    is_index = numpy.ones(len(polygons), dtype=bool)
+    is_index[size_positions] = False
+    polygons[is_index] = numpy.asarray(face_indexes, dtype=numpy.int64).reshape(-1)[0:corners_count]
+    return polygons
+
+
+def decode_xsi_polygons(polygons):
+    '''split the polygons array from Geometry.Get2() (size1, index, index, ..., size2, index, ...) to the pair (sizes, indexes)
+    positions of sizes are found by the walk through polygons (not through corners), then indexes are selected by the mask
+    '''
+    polygons_count = len(polygons)
+    size_positions = []
+    position = 0
+    while position < polygons_count:
+        size_positions.append(position)
+        position += polygons[position] + 1
+    if numpy is None:
+        indexes = []
+        for position in size_positions:
+            indexes.extend(polygons[position + 1:position + 1 + polygons[position]])
+        return [polygons[position] for position in size_positions], indexes
+    stream = numpy.asarray(polygons, dtype=numpy.int64)
+    size_positions = numpy.asarray(size_positions, dtype=numpy.int64)
+    is_index = numpy.ones(polygons_count, dtype=bool)
+    is_index[size_positions] = False
+    return stream[size_positions], stream[is_index]
+
+
+def decode_xsi_mesh_data(mesh_data):
+    '''convert the result of Geometry.Get2() to the tuple (points, polygon sizes, polygon point indexes)
+    with numpy points is the array of the shape (count, 3), sizes and indexes are integer arrays
+    '''
+    sizes, indexes = decode_xsi_polygons(mesh_data[1])
+    return from_xsi_vectors_array(mesh_data[0]), sizes, indexes
+
+
+def to_vt_array(array, vt_class, dtype):
+    '''convert the numpy array to the Vt-array (for example Vt.Vec3fArray with dtype "f" or Vt.IntArray with dtype "i")
+    the data is copied from the buffer, if FromNumpy is supported by the USD build, in other case return to_list(array)
+    '''
+    if numpy is not None and isinstance(array, numpy.ndarray) and hasattr(vt_class, "FromNumpy"):
+        return vt_class.FromNumpy(numpy.ascontiguousarray(array, dtype=dtype))
+    return to_list(array)
+
+
+def swap_yz(array):
+    '''return array of vectors with swapped second and third coordinates
+    '''
+    if numpy is None:
+        return [(v[0], v[2], v[1]) for v in array]
+    return numpy.ascontiguousarray(as_vectors(array, 3)[:, [0, 2, 1]])
+
+
+def get_bounding_box(positions):
+    '''return [(min_x, min_y, min_z), (max_x, max_y, max_z)]
+    '''
+    if numpy is None:
+        return utils.get_bounding_box(positions)
+    if len(positions) == 0:
+        return [(0.0, 0.0, 0.0), (0.0, 0.0, 0.0)]
+    vectors = as_vectors(positions, 3)
+    return [tuple(vectors.min(axis=0).tolist()), tuple(vectors.max(axis=0).tolist())]
+
+
+def vectors_mult_to_matrix(vectors, matrix, remove_translation=False):
+    '''multiply each vector to the row-based matrix 4x4
+    if remove_translation is True, then in the matrix the last row will be (0, 0, 0, 1)
+    '''
+    if numpy is None:
+        return [utils.vector_mult_to_matrix(v, matrix, remove_translation) for v in vectors]
+    m = numpy.array([[matrix[i][j] for j in range(4)] for i in range(4)], dtype=numpy.float64)
+    result = numpy.dot(as_vectors(vectors, 3), m[0:3, 0:3])
+    if not remove_translation:
+        result += m[3, 0:3]
+    return result
+
+
+def multiply_matrices(a, b):
+    '''a and b are matrices 4x4
+    return a * b
+    '''
+    if numpy is None:
+        return utils.multiply_matrices(a, b)
+    return numpy.dot(numpy.array([[a[i][j] for j in range(4)] for i in range(4)], dtype=numpy.float64),
+                     numpy.array([[b[i][j] for j in range(4)] for i in range(4)], dtype=numpy.float64))
+
+
+def is_matrices_are_different_arrays(matrix_a, matrix_b):
+    if numpy is None:
+        return utils.is_matrices_are_different_arrays(matrix_a, matrix_b)
+    a = numpy.array([[matrix_a[i][j] for j in range(4)] for i in range(4)], dtype=numpy.float64)
+    b = numpy.array([[matrix_b[i][j] for j in range(4)] for i in range(4)], dtype=numpy.float64)
+    return bool((numpy.abs(a - b) > utils.EPSILON).any())
+
+
+def is_identity_matrix(matrix):
+    return not is_matrices_are_different_arrays(matrix, IDENTITY_MATRIX)
+
+
+def is_tuple3_arrays_are_different(array_a, array_b):
+    '''arrays are different, if the squared distance between some vectors is greater than EPSILON
+    '''
+    if len(array_a) != len(array_b):
+        return True
+    if numpy is None:
+        return utils.is_tuple3_arrays_are_different(array_a, array_b)
+    delta = as_vectors(array_a, 3) - as_vectors(array_b, 3)
+    return bool(((delta * delta).sum(axis=1) > utils.EPSILON).any())
+
+
+def is_float_arrays_are_different(array_a, array_b):
+    if numpy is None:
+        return utils.is_float_arrays_are_different(array_a, array_b)
+    if len(array_a) != len(array_b):
+        return True
+    return bool((numpy.abs(numpy.asarray(array_a, dtype=numpy.float64) - numpy.asarray(array_b, dtype=numpy.float64)) > utils.EPSILON).any())
+
+
+def is_vector2_arrays_are_different(array_a, array_b):
+    '''compare only the first two coordinates of vectors
+    '''
+    if numpy is None:
+        return utils.is_vector2_arrays_are_different(array_a, array_b)
+    if len(array_a) != len(array_b):
+        return True
+    if len(array_a) == 0:
+        return False
+    a = numpy.asarray(array_a, dtype=numpy.float64)
+    b = numpy.asarray(array_b, dtype=numpy.float64)
+    return bool((numpy.abs(a[:, 0:2] - b[:, 0:2]) > utils.EPSILON).any())
+
+
+def as_values(array, dimension=1):
+    '''return contiguous numpy array of the shape (count, ) for dimension = 1, or (count, dimension) for vectors
+    without numpy return the list of floats or the list of tuples
+    '''
+    if dimension > 1:
+        return as_vectors(array, dimension)
+    if numpy is None:
+        return list(array)
+    return numpy.ascontiguousarray(numpy.asarray(array, dtype=numpy.float64).reshape(-1))
+
+
+def get_digest(values):
+    '''return md5 digest of values, created by as_values
+    equal digests mean equal arrays, so the comparison with the tolerance is not needed
+    without numpy return None, in this case python lists are compared directly
+    '''
+    if numpy is None:
+        return None
+    return hashlib.md5(values.tobytes()).hexdigest()
+
+
+def build_change_reference(array, dimension=1):
+    '''return the pair (values, digest), which is used in is_changed() for comparing arrays with the start one
+    '''
+    values = as_values(array, dimension)
+    return values, get_digest(values)
+
+
+def is_changed(reference, array, dimension=1, is_distance=False, tolerance=utils.EPSILON):
+    '''return True if the array is differ from the reference array (created by build_change_reference)
+    at first compare digests, and only if they are different, compare values with the tolerance
+    if is_distance is True, then vectors are different when squared distance is greater than the tolerance (as in is_tuple3_arrays_are_different)
+    otherwise each coordinate is compared separately
+    '''
+    reference_values, reference_digest = reference
+    values = as_values(array, dimension)
+    if len(values) != len(reference_values):
+        return True
+    if reference_digest is None:
+        if values == reference_values:  # exact comparison of python lists, it is done without python loops
+            return False
+    elif get_digest(values) == reference_digest:
+        return False
+    if numpy is None:
+        if dimension == 1:
+            for a, b in zip(reference_values, values):
+                if abs(a - b) > tolerance:
+                    return True
+            return False
+        for a, b in zip(reference_values, values):
+            if is_distance:
+                if sum((a[k] - b[k])**2 for k in range(dimension)) > tolerance:
+                    return True
+            else:
+                for k in range(dimension):
+                    if abs(a[k] - b[k]) > tolerance:
+                        return True
+        return False
+    delta = values - reference_values
+    if is_distance and dimension > 1:
+        return bool(((delta * delta).sum(axis=1) > tolerance).any())
+    return bool((numpy.abs(delta) > tolerance).any())
@@ -0,0 +1,174 @@
+# geometry kernel parity check
+# standalone script, it does not require Softimage, but requires pxr (usd-core) and numpy
+# usage:
+#     python geometry_kernel_parity.py [count] [seed]
+#
+
+"""
+Check that numpy functions of geometry_kernel return the same results as pure python fallbacks.
+
+Each case is called twice for the same random input: with numpy and with geometry_kernel.numpy = None.
+Results are converted to python lists and compared with the tolerance utils.EPSILON.
+count is the number of points (and polygons) in test data, seed is the seed of the random generator.
+For each case it prints one row: ok or FAILED and the name of the case. The exit code is the number of failed cases.
+"""
+
+import random
+import sys
+import geometry_kernel
+import utils
+
+EPSILON_SHIFT = utils.EPSILON * 0.1  # less than the tolerance, so arrays with this shift are equal
+CHANGE_SHIFT = 0.5  # greater than the tolerance, so arrays with this shift are different
+
+
+def build_positions(rnd, count):
+    return [(rnd.uniform(-10.0, 10.0), rnd.uniform(-10.0, 10.0), rnd.uniform(-10.0, 10.0)) for i in range(count)]
+
+
+def build_polygons(rnd, count, points_count):
+    '''return the pair (face_indexes, face_sizes) for polygons with 3, 4 or 5 corners
+    '''
+    face_sizes = [rnd.randint(3, 5) for i in range(count)]
+    face_indexes = [rnd.randrange(points_count) for i in range(sum(face_sizes))]
+    return face_indexes, face_sizes
+
+
+def build_matrix(rnd):
+    return [[rnd.uniform(-2.0, 2.0) for j in range(4)] for i in range(4)]
+
+
+def shift_vectors(vectors, index, shift):
+    '''return the copy of vectors, where the first coordinate of the vector at index is shifted
+    '''
+    to_return = list(vectors)
+    to_return[index] = (to_return[index][0] + shift, ) + tuple(to_return[index][1:])
+    return to_return
+
+
+def reconstruct_indexed(result):
+    '''build_indexed_values() with numpy returns values in the order of sorted keys, so compare arrays, restored from values and indexes
+    '''
+    values, indexes = result
+    values = geometry_kernel.to_list(values)
+    return [values[i] for i in geometry_kernel.to_list(indexes)]
+
+
+def build_cases(count, seed):
+    '''return the list of pairs (name, function), each function returns the result for comparison
+    all input data is created before the call, so both calls use the same data
+    '''
+    rnd = random.Random(seed)
+    points_count = max(1, count)
+    positions = build_positions(rnd, points_count)
+    xsi_positions = [[p[k] for p in positions] for k in range(3)]
+    flat_positions = [c for p in positions for c in p]
+    uvs = [(p[0], p[1]) for p in positions]
+    quads = [(p[0], p[1], p[2], 1.0) for p in positions]
+    floats = [p[0] for p in positions]
+    face_indexes, face_sizes = build_polygons(rnd, count, points_count)
+    xsi_polygons = list(utils.usd_to_xsi_faces_array(face_indexes, face_sizes, None))
+    matrix_a = build_matrix(rnd)
+    matrix_b = build_matrix(rnd)
+    indexes = sorted(rnd.sample(range(points_count), min(points_count, 10)))
+    # quantized values with repeats for indexed primvars
+    repeated_uvs = [(round(rnd.choice(uvs)[0], 2), round(rnd.choice(uvs)[1], 2)) for i in range(count)]
+    index = points_count // 2
+
+    return [("as_vectors", lambda: geometry_kernel.as_vectors(flat_positions, 3)),
+            ("transpose_vectors_array", lambda: geometry_kernel.transpose_vectors_array(positions)),
+            ("transpose_2vectors_array", lambda: geometry_kernel.transpose_2vectors_array(uvs)),
+            ("transpose_4vectors_array", lambda: geometry_kernel.transpose_4vectors_array(quads)),
+            ("from_xsi_vectors_array", lambda: geometry_kernel.from_xsi_vectors_array(xsi_positions)),
+            ("set_vectors_at_indexes", lambda: geometry_kernel.set_vectors_at_indexes(geometry_kernel.as_vectors(positions, 3), indexes, [positions[0]] * len(indexes))),
+            ("select_greater", lambda: geometry_kernel.select_greater(floats, 0.0)),
+            ("select_items", lambda: geometry_kernel.select_items(flat_positions, indexes, 3)),
+            ("build_indexed_values", lambda: reconstruct_indexed(geometry_kernel.build_indexed_values(repeated_uvs, 2, 0.001))),
+            ("build_xsi_faces_array", lambda: geometry_kernel.build_xsi_faces_array(face_indexes, face_sizes)),
+            ("decode_xsi_polygons", lambda: geometry_kernel.decode_xsi_polygons(xsi_polygons)),
+            ("decode_xsi_mesh_data", lambda: geometry_kernel.decode_xsi_mesh_data((xsi_positions, xsi_polygons))),
+            ("swap_yz", lambda: geometry_kernel.swap_yz(positions)),
+            ("get_bounding_box", lambda: geometry_kernel.get_bounding_box(positions)),
+            ("get_bounding_box empty", lambda: geometry_kernel.get_bounding_box([])),
+            ("vectors_mult_to_matrix", lambda: geometry_kernel.vectors_mult_to_matrix(positions, matrix_a)),
+            ("vectors_mult_to_matrix without translation", lambda: geometry_kernel.vectors_mult_to_matrix(positions, matrix_a, True)),
+            ("multiply_matrices", lambda: geometry_kernel.multiply_matrices(matrix_a, matrix_b)),
+            ("is_matrices_are_different_arrays", lambda: [geometry_kernel.is_matrices_are_different_arrays(matrix_a, matrix_b),
+                                                          geometry_kernel.is_matrices_are_different_arrays(matrix_a, matrix_a)]),
+            ("is_identity_matrix", lambda: [geometry_kernel.is_identity_matrix(geometry_kernel.IDENTITY_MATRIX),
+                                            geometry_kernel.is_identity_matrix(matrix_a)]),
+            ("is_tuple3_arrays_are_different", lambda: [geometry_kernel.is_tuple3_arrays_are_different(positions, shift_vectors(positions, index, EPSILON_SHIFT)),
+                                                        geometry_kernel.is_tuple3_arrays_are_different(positions, shift_vectors(positions, index, CHANGE_SHIFT)),
+                                                        geometry_kernel.is_tuple3_arrays_are_different(positions, positions[1:])]),
+            ("is_float_arrays_are_different", lambda: [geometry_kernel.is_float_arrays_are_different(floats, [v + EPSILON_SHIFT for v in floats]),
+                                                       geometry_kernel.is_float_arrays_are_different(floats, [v + CHANGE_SHIFT for v in floats]),
+                                                       geometry_kernel.is_float_arrays_are_different(floats, floats[1:])]),
+            ("is_vector2_arrays_are_different", lambda: [geometry_kernel.is_vector2_arrays_are_different(uvs, shift_vectors(uvs, index, EPSILON_SHIFT)),
+                                                         geometry_kernel.is_vector2_arrays_are_different(uvs, shift_vectors(uvs, index, CHANGE_SHIFT)),
+                                                         geometry_kernel.is_vector2_arrays_are_different([], [])]),
+            ("is_changed", lambda: [geometry_kernel.is_changed(geometry_kernel.build_change_reference(positions, 3), shift_vectors(positions, index, EPSILON_SHIFT), 3, is_distance=True),
+                                    geometry_kernel.is_changed(geometry_kernel.build_change_reference(positions, 3), shift_vectors(positions, index, CHANGE_SHIFT), 3),
+                                    geometry_kernel.is_changed(geometry_kernel.build_change_reference(floats), floats),
+                                    geometry_kernel.is_changed(geometry_kernel.build_change_reference(floats), [v + CHANGE_SHIFT for v in floats])])]
+
+
+def normalize(value):
+    '''convert numpy arrays, tuples and numbers to python lists and floats
+    '''
+    value = geometry_kernel.to_list(value)
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    if isinstance(value, bool):
+        return value
+    if hasattr(value, "item"):  # numpy scalar
+        value = value.item()
+    if isinstance(value, (int, float)):
+        return float(value)
+    return value
+
+
+def is_equal(a, b):
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(is_equal(a[i], b[i]) for i in range(len(a)))
+    if isinstance(a, float) and isinstance(b, float):
+        return abs(a - b) <= utils.EPSILON * max(1.0, abs(a), abs(b))
+    return a == b
+
+
+def call_case(function, is_numpy):
+    numpy_module = geometry_kernel.numpy
+    if not is_numpy:
+        geometry_kernel.numpy = None
+    try:
+        return normalize(function())
+    finally:
+        geometry_kernel.numpy = numpy_module
+
+
+def check_parity(count=1000, seed=1):
+    '''return the list of names of failed cases
+    '''
+    failed = []
+    for name, function in build_cases(count, seed):
+        try:
+            is_ok = is_equal(call_case(function, True), call_case(function, False))
+        except Exception as e:
+            print("exception in " + name + ": " + repr(e))
+            is_ok = False
+        print(("ok      " if is_ok else "FAILED  ") + name)
+        if not is_ok:
+            failed.append(name)
+    return failed
+
+
+def main(args):
+    if not geometry_kernel.is_numpy():
+        print("numpy is not installed, nothing to compare")
+        return 0
+    count = int(args[0]) if len(args) > 0 else 1000
+    seed = int(args[1]) if len(args) > 1 else 1
+    return len(check_parity(count, seed))
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -9,6 +9,10 @@ MODULE OVERVIEW:
 -Add any number of attribute data sets to the cache using specific methods for data types (see list below)
 -To write out data use:    icecache.write(filename, ascii=0)
 -By defult, data writes to icecache format. Set the ascii switch to 1 for writing out to text for debugging.
+-Binary data is compressed by gzip with the level 9. Use icecache.write(filename, compression=level) for levels 0-9,
+ or compression=COMPRESSION_STORE for writing uncompressed file.
+-Data is written by chunks of 4000 elements. If all elements in the chunk are the same, then the chunk is marked as constant
+ and only one element is written.
 
 
 There are different methods for specific data types for caching.
@@ -36,8 +40,35 @@ METHODS BY DATA TYPE:
     add_color(attrName, colorData)           4d data
     add_rotation(attrName, rotData)          4d data
 
+Instead of lists any method also accepts contiguous typed buffers (array.array or numpy arrays).
+These buffers are written by chunks, without packing each element separately.
+For buffers the data should be flat (or numpy array of the shape (count, dimension)):
+
+scalarBuffer = array.array("f", [s0, s1, s2, ...])
+3DVectorBuffer = array.array("f", [posx0, posy0, posz0, posx1, posy1, posz1, ...])
+
+For array data (strands, for example) use the pair (counts, values), where counts contains array size for each element
+and values is a flat buffer with all array items:
+
+strandsBuffer = ([2, 2], array.array("f", [x00, y00, z00, x01, y01, z01, x10, y10, z10, x11, y11, z11]))
+
+READING:
+
+ICECacheReader parses the header and attribute definitions of the binary cache file and gives lazy access to attribute data by chunks.
+It requires numpy. Uncompressed files are memory-mapped, gzip files are decompressed once into temporary scratch file.
+
+    reader = icecache.ICECacheReader(filename)
+    reader.get_attribute_names()
+    reader.get_chunks_count(attrName)
+    reader.get_chunk(attrName, chunkIndex)   numpy array of the shape (count, dimension) or (sizes, values) for array data
+    reader.get_attribute(attrName)           all chunks together
+    reader.close()
 """
 
+import array
+import os
+from struct import pack, unpack_from, calcsize
+
 
 def example_01():
     import icecache
@@ -75,30 +106,170 @@ def example_02():
     ic.write("many_particles.1.icecache")
 
 
+def example_03():
+    import icecache
+    import array
+    import random
+
+    particles_count = 100000
+    ic = icecache.ICECache(particles_count)
+
+    # the same as example_02, but data stored in flat buffers
+    positions = array.array("f", [random.uniform(-10.0, 10.0) for i in range(3 * particles_count)])
+    sizes = array.array("f", [random.uniform(0.1, 0.15) for i in range(particles_count)])
+    ic.add_point_position(positions)
+    ic.add_scalar("Size", sizes)
+
+    ic.write("many_particles_buffers.1.icecache")
+
+
+def example_04():
+    import icecache
+
+    # read back the cache from example_02
+    with icecache.ICECacheReader("many_particles.1.icecache") as reader:
+        print(reader.get_attribute_names())
+        print(reader.get_chunk("Size", 0)[:10])
+        print(reader.get_attribute("PointPosition").shape)
+
+
 if __name__ == "__main__":
     example_02()
 
 
+COMPRESSION_STORE = -1  # write uncompressed binary file, without gzip stream
+
+DATA_TYPES = {
+    1: "1I",
+    2: "1L",
+    4: "1f",
+    8: "2f",
+    16: "3f",
+    32: "4f",
+    64: "4f",
+    128: "9f",
+    256: "16f",
+    512: "4f",
+    16384: "4f"
+}
+
+
+def is_buffer(data):
+    '''return True if data is array.array or numpy array
+    '''
+    return isinstance(data, array.array) or hasattr(data, "__array_interface__")
+
+
+def is_buffer_data(data, structure=1):
+    '''return True if attribute data should be written by buffer chunks
+    for array structure data should be the pair (counts, values) with buffer values
+    '''
+    if structure == 1:
+        return is_buffer(data)
+    else:
+        return isinstance(data, tuple) and len(data) == 2 and is_buffer(data[1])
+
+
+def to_flat_buffer(data):
+    '''return one-dimensional view of array.array or numpy array
+    '''
+    if isinstance(data, array.array):
+        return data
+    else:
+        return data.reshape(-1)
+
+
+def buffer_from_bytes(data, type_code):
+    buffer = array.array(type_code)
+    if hasattr(buffer, "frombytes"):
+        buffer.frombytes(data)
+    else:  # array.array in Python 2.7
+        buffer.fromstring(data)
+    return buffer
+
+
+def buffer_to_bytes(buffer, type_code):
+    '''convert items of the buffer to the type type_code and return the bytes
+    type_code is the same as for struct module (f, I, L)
+    type conversion is done here, so it requires memory only for one chunk
+    '''
+    if isinstance(buffer, array.array):
+        if buffer.typecode != type_code:
+            buffer = array.array(type_code, buffer)
+        if hasattr(buffer, "tobytes"):
+            return buffer.tobytes()
+        else:  # array.array in Python 2.7
+            return buffer.tostring()
+    else:
+        return buffer.astype(type_code).tobytes()
+
+
+def is_constant_items(items):
+    '''return True if the list contains more than one element and all elements are the same
+    '''
+    if len(items) < 2:
+        return False
+    first = items[0]
+    for item in items:
+        if item != first:
+            return False
+    return True
+
+
+def is_constant_buffer(buffer, dimension):
+    '''return True if the flat buffer contains more than one item (of the given dimension) and all items are the same
+    '''
+    if dimension == 0 or len(buffer) < 2 * dimension:
+        return False
+    count = len(buffer) // dimension
+    if isinstance(buffer, array.array):
+        return buffer == buffer[0:dimension] * count
+    else:
+        return bool((buffer.reshape(count, dimension) == buffer[0:dimension]).all())
+
+
+def write_point_cache(file_name, points, sizes, strands=None, compression=9):
+    '''write pointcloud cache with PointPosition, Size and (optional) StrandPosition attributes
+    points and sizes are flat float buffers, strands is the pair (strand sizes, values)
+    '''
+    ic = ICECache(len(points) // 3)
+    ic.add_point_position(points)
+    ic.add_scalar("Size", sizes)
+    if strands is not None:
+        ic.add_strand_position(strands)
+    ic.write(file_name, compression=compression)
+
+
+def pack_point_cache_task(file_name, points, sizes, strands=None, compression=9):
+    '''convert arguments of write_point_cache to the task for write_point_cache_task
+    buffers are converted to bytes, because in Python 2.7 array.array is pickled as a list
+    '''
+    strands_task = None
+    if strands is not None:
+        strands_task = (buffer_to_bytes(array.array("I", strands[0]), "I"), buffer_to_bytes(strands[1], "f"))
+    return (file_name, buffer_to_bytes(points, "f"), buffer_to_bytes(sizes, "f"), strands_task, compression)
+
+
+def write_point_cache_task(task):
+    '''entry point for worker processes, task is created by pack_point_cache_task
+    '''
+    file_name, points, sizes, strands, compression = task
+    if strands is not None:
+        strands = (buffer_from_bytes(strands[0], "I"), buffer_from_bytes(strands[1], "f"))
+    write_point_cache(file_name, buffer_from_bytes(points, "f"), buffer_from_bytes(sizes, "f"), strands, compression)
+
+
 class ICECache:
     def __init__(self, nb_particles):
         self.nb_particles = nb_particles
         self.attribute_data = {}
-        self.cache_data = []
+        self.cache_data = []  # packed data of the current chunk, it is written to the file at each flush
+        self.cache_file = None
+        self.is_ascii = 0
+        self.is_first_write = True
         self.DEBUG = 0
 
-        self.data_types = {
-            1: "1I",
-            2: "1L",
-            4: "1f",
-            8: "2f",
-            16: "3f",
-            32: "4f",
-            64: "4f",
-            128: "9f",
-            256: "16f",
-            512: "4f",
-            16384: "4f"
-        }
+        self.data_types = DATA_TYPES
 
     def add_attribute(self,
                       attribute_name,  # attrName:
@@ -156,99 +327,72 @@ class ICECache:
     def add_rotation(self, attr_name, rot_data, structure=1):
         self.add_attribute(attr_name, 16384, structure, 2, 2, rot_data)
 
-    def write(self, file_name, ascii=0):
+    def write(self, file_name, ascii=0, compression=9):
+        '''write the cache to the file
+        data is not collected in memory, each chunk is packed and written to the output stream as soon as it is produced
+        compression is gzip level 0-9 or COMPRESSION_STORE for uncompressed binary file, it is ignored in ascii mode
+        '''
         import gzip
-        from struct import pack
-
-        self.__write_header()
-        self.__write_attribute_defs()
-        self.__write_attribute_data()
 
         if not ascii:
-            text = []
-            for elem in self.cache_data:
-                if self.DEBUG:
-                    print(elem)
-                type = elem[0]
-
-                if type == "2f":
-                    bin = pack(type,
-                               float(elem[1]),
-                               float(elem[2])
-                               )
-                elif type == "3f":
-                    bin = pack(type,
-                               float(elem[1]),
-                               float(elem[2]),
-                               float(elem[3]),
-                               )
-                elif type == "4f":
-                    bin = pack(type,
-                               float(elem[1]),
-                               float(elem[2]),
-                               float(elem[3]),
-                               float(elem[4]),
-                               )
-                elif type == "9f":
-                    bin = pack(type,
-                               float(elem[1]),
-                               float(elem[2]),
-                               float(elem[3]),
-                               float(elem[4]),
-                               float(elem[5]),
-                               float(elem[6]),
-                               float(elem[7]),
-                               float(elem[8]),
-                               float(elem[9])
-                               )
-                elif type == "16f":
-                    bin = pack(type,
-                               float(elem[1]),
-                               float(elem[2]),
-                               float(elem[3]),
-                               float(elem[4]),
-                               float(elem[5]),
-                               float(elem[6]),
-                               float(elem[7]),
-                               float(elem[8]),
-                               float(elem[9]),
-                               float(elem[10]),
-                               float(elem[11]),
-                               float(elem[12]),
-                               float(elem[13]),
-                               float(elem[14]),
-                               float(elem[15]),
-                               float(elem[16])
-                               )
-                else:
-                    bin = pack(type, elem[1])
-                text.append(bin)
-
-            cachefile = gzip.open(file_name, "wb")
-            cachefile.write("".join(text))
-            cachefile.close()
-
+            if compression == COMPRESSION_STORE:
+                self.cache_file = open(file_name, "wb")
+            else:
+                self.cache_file = gzip.open(file_name, "wb", compression)
         else:
-            text = []
-            for elem in self.cache_data:
-                for item in elem[1:]:
-                    text.append(str(item))
-
-            cachefile = open(file_name, "w")
-            cachefile.write(" ".join(text))
-            cachefile.close()
+            self.cache_file = open(file_name, "w")
+        self.is_ascii = ascii
+        self.cache_data = []
+        self.is_first_write = True
+        try:
+            self.__write_header()
+            self.__write_attribute_defs()
+            self.__write_attribute_data()
+            self.__flush()
+        finally:
+            self.cache_file.close()
+            self.cache_file = None
+
+    def __add(self, elem):
+        '''add one element [type, value1, value2, ...] to the current chunk
+        '''
+        if self.DEBUG:
+            print(elem)
+        type = elem[0]
+        if self.is_ascii:
+            for item in (elem[2] if type == "buffer" else elem[1:]):
+                self.cache_data.append(str(item))
+        elif type == "buffer":
+            self.cache_data.append(buffer_to_bytes(elem[2], elem[1]))
+        elif type.endswith("s"):
+            self.cache_data.append(pack(type, elem[1].encode("ascii")))
+        elif type.endswith("f"):
+            self.cache_data.append(pack(type, *[float(v) for v in elem[1:]]))
+        else:
+            self.cache_data.append(pack(type, elem[1]))
+
+    def __flush(self):
+        '''write packed data of the current chunk to the file
+        '''
+        if len(self.cache_data) > 0:
+            if self.is_ascii:
+                self.cache_file.write(("" if self.is_first_write else " ") + " ".join(self.cache_data))
+            else:
+                self.cache_file.write(b"".join(self.cache_data))
+            self.is_first_write = False
+            self.cache_data = []
 
     def __write_header(self):
-        self.cache_data += [["8s", "ICECACHE"]]  # header string
-        self.cache_data += [["I", 103]]  # version number
-        self.cache_data += [["I", 0]]  # object type, pointcloud
-        self.cache_data += [["I", self.nb_particles]]  # point count
-        self.cache_data += [["I", 0]]  # edge count
-        self.cache_data += [["I", 0]]  # polygon count
-        self.cache_data += [["I", 0]]  # sample count
-        self.cache_data += [["I", 1]]  # substep
-        self.cache_data += [["I", 0]]  # user data blob count
-        self.cache_data += [["I", len(self.attribute_data)]]  # attributes count
+        self.__add(["8s", "ICECACHE"])  # header string
+        self.__add(["I", 103])  # version number
+        self.__add(["I", 0])  # object type, pointcloud
+        self.__add(["I", self.nb_particles])  # point count
+        self.__add(["I", 0])  # edge count
+        self.__add(["I", 0])  # polygon count
+        self.__add(["I", 0])  # sample count
+        self.__add(["I", 1])  # substep
+        self.__add(["I", 0])  # user data blob count
+        self.__add(["I", len(self.attribute_data)])  # attributes count
 
     def __write_attribute_defs(self):
         attribute_list = list(self.attribute_data.keys())
@@ -262,14 +406,14 @@ class ICECache:
                 filler = 0
             attribute_name = attribute + "".join(["_"] * filler)
 
-            self.cache_data += [["L", name_length]]  # attribute name length
+            self.__add(["L", name_length])  # attribute name length
             # attribute name
-            self.cache_data += [[str(len(attribute_name)) + "s", attribute_name]]
-            self.cache_data += [["I", data["data_type"]]]  # cache data type
-            self.cache_data += [["I", data["structure_type"]]]  # structure type
-            self.cache_data += [["I", data["context_type"]]]  # context type
-            self.cache_data += [["I", 0]]  # cache database ID, obsolete
-            self.cache_data += [["I", data["category"]]]  # category
+            self.__add([str(len(attribute_name)) + "s", attribute_name])
+            self.__add(["I", data["data_type"]])  # cache data type
+            self.__add(["I", data["structure_type"]])  # structure type
+            self.__add(["I", data["context_type"]])  # context type
+            self.__add(["I", 0])  # cache database ID, obsolete
+            self.__add(["I", data["category"]])  # category
 
     def __write_attribute_data(self):
         attribute_list = list(self.attribute_data.keys())
@@ -277,7 +421,9 @@ class ICECache:
         for attribute in attribute_list:
             data = self.attribute_data[attribute]
             data_type = data["data_type"]
-            if attribute.lower() == "pointposition":
+            if is_buffer_data(data["data"], data["structure_type"]):
+                self.__write_buffer_data(data["data"], data_type, data["structure_type"], attribute.lower() == "pointposition")
+            elif attribute.lower() == "pointposition":
                 self.__write_position_data(data["data"])
             elif data_type == 1:
                 self.__write_bool_data(data["data"], data["structure_type"])
@@ -302,115 +448,314 @@ class ICECache:
             elif data_type == 16384:
                 self.__write_vector4_data(data["data"], data["structure_type"])
 
-    def __get_chunks(self, num):
+    def __get_chunk_bounds(self, num):
+        '''return the list of pairs (start, end) for each chunk of 4000 elements
+        if num is divisible by 4000, then the last chunk is empty
+        '''
         if num < 4000:
-            return [range(num)]
+            return [(0, num)]
 
         outlist = []
-        chunks = num / 4000
+        chunks = num // 4000
         for i in range(chunks):
-            outlist.append(range((i)*4000, (i+1)*4000))
-        outlist.append(range((i+1)*4000, (i+1)*4000 + num % 4000))
+            outlist.append((i*4000, (i+1)*4000))
+        outlist.append((chunks*4000, chunks*4000 + num % 4000))
         return outlist
 
+    def __get_chunks(self, num):
+        return [range(start, end) for start, end in self.__get_chunk_bounds(num)]
+
+    def __write_buffer_data(self, data, data_type, structure=1, is_position=False):
+        dimension = int(self.data_types[data_type][:-1])
+        type_code = self.data_types[data_type][-1]
+        if structure == 1:
+            values = to_flat_buffer(data)
+            count = len(values) // dimension
+            if is_position:
+                # positions are written with one constant flag, but flush them by chunks
+                self.__flush()
+                self.__add(["I", 0])  # is constant?
+                for start, end in self.__get_chunk_bounds(count):
+                    self.__add(["buffer", type_code, values[start*dimension:end*dimension]])
+                    self.__flush()
+            else:
+                for start, end in self.__get_chunk_bounds(count):
+                    self.__flush()
+                    chunk = values[start*dimension:end*dimension]
+                    if is_constant_buffer(chunk, dimension):
+                        self.__add(["I", 1])  # is constant?
+                        self.__add(["buffer", type_code, chunk[0:dimension]])
+                    else:
+                        self.__add(["I", 0])
+                        self.__add(["buffer", type_code, chunk])
+        else:
+            counts = data[0]
+            values = to_flat_buffer(data[1])
+            shift = 0
+            for start, end in self.__get_chunk_bounds(len(counts)):
+                self.__flush()
+                sizes = [int(counts[i]) for i in range(start, end)]
+                chunk_size = sum(sizes)
+                chunk = values[shift*dimension:(shift + chunk_size)*dimension]
+                # chunk is constant, if all arrays have the same size and the same values
+                is_constant = is_constant_items(sizes) and (sizes[0] == 0 or is_constant_buffer(chunk, sizes[0] * dimension))
+                self.__add(["I", 1 if is_constant else 0])  # is constant?
+                item_shift = 0
+                for size in (sizes[0:1] if is_constant else sizes):
+                    self.__add(["I", size])
+                    self.__add(["buffer", type_code, chunk[item_shift*dimension:(item_shift + size)*dimension]])
+                    item_shift += size
+                shift += chunk_size
+
     def __write_position_data(self, data):
-        self.cache_data += [["I", 0]]  # is constant?
+        self.__flush()
+        self.__add(["I", 0])  # is constant?
         count = len(data)
         for i in range(count):
-            self.cache_data += [["3f"] + data[i][0:3]]
-
-    def __write_bool_data(self, data, structure=1):
+            self.__add(["3f"] + data[i][0:3])
+            if i % 4000 == 3999:
+                self.__flush()
+
+    def __write_list_data(self, data, type, structure=1):
+        '''write data, stored as python lists, by chunks
+        if all elements in the chunk are the same, then write the constant flag and only one element
+        '''
+        dimension = int(type[:-1]) if len(type) > 1 else 1
         chunks = self.__get_chunks(len(data))
         for chunk in chunks:
-            self.cache_data += [["I", 0]]  # is constant?
-            for i in chunk:
+            self.__flush()
+            if structure == 1:
+                items = [self.__get_item(data[i], dimension) for i in chunk]
+            else:  # for array data (strands, for example), write the number of elements and then actual values
+                items = [[self.__get_item(a, dimension) for a in data[i]] for i in chunk]
+            is_constant = is_constant_items(items)
+            self.__add(["I", 1 if is_constant else 0])  # is constant?
+            for item in (items[0:1] if is_constant else items):
                 if structure == 1:
-                    self.cache_data += [["I"] + [data[i]]]
+                    self.__add([type] + item)
                 else:
-                    self.cache_data += [["I", len(data[i])]]
-                    for a in data[i]:
-                        self.cache_data += [["I"] + [a]]
+                    self.__add(["I", len(item)])
+                    for a in item:
+                        self.__add([type] + a)
+
+    def __get_item(self, value, dimension):
+        return [value] if dimension == 1 else list(value[0:dimension])
+
+    def __write_bool_data(self, data, structure=1):
+        self.__write_list_data(data, "I", structure)
 
     def __write_long_data(self, data, structure=1):
-        chunks = self.__get_chunks(len(data))
-        for chunk in chunks:
-            self.cache_data += [["I", 0]]  # is constant?
-            for i in chunk:
-                if structure == 1:
-                    self.cache_data += [["L"] + [data[i]]]
-                else:
-                    self.cache_data += [["I", len(data[i])]]
-                    for a in data[i]:
-                        self.cache_data += [["L"] + [a]]
+        self.__write_list_data(data, "L", structure)
 
     def __write_float_data(self, data, structure=1):
-        chunks = self.__get_chunks(len(data))
-        for chunk in chunks:
-            self.cache_data += [["I", 0]]  # is constant?
-            for i in chunk:
-                if structure == 1:
-                    self.cache_data += [["1f"] + [data[i]]]
-                else:
-                    self.cache_data += [["I", len(data[i])]]
-                    for a in data[i]:
-                        self.cache_data += [["1f"] + [a]]
+        self.__write_list_data(data, "1f", structure)
 
     def __write_vector2_data(self, data, structure=1):
-        chunks = self.__get_chunks(len(data))
-        for chunk in chunks:
-            self.cache_data += [["I", 0]]  # is constant?
-            for i in chunk:
-                if structure == 1:
-                    self.cache_data += [["2f"] + data[i][0:2]]
-                else:
-                    self.cache_data += [["I", len(data[i])]]
-                    for a in data[i]:
-                        self.cache_data += [["2f"] + a[0:2]]
+        self.__write_list_data(data, "2f", structure)
 
     def __write_vector3_data(self, data, structure=1):
-        chunks = self.__get_chunks(len(data))
-        for chunk in chunks:
-            self.cache_data += [["I", 0]]  # is constant?
-            for i in chunk:
-                if structure == 1:
-                    self.cache_data += [["3f"] + data[i][0:3]]
-                else:  # for array data (strands, for example), write the number of elements and then actual values
-                    self.cache_data += [["I", len(data[i])]]
-                    for a in data[i]:
-                        self.cache_data += [["3f"] + a[0:3]]
+        self.__write_list_data(data, "3f", structure)
 
     def __write_vector4_data(self, data, structure=1):
-        chunks = self.__get_chunks(len(data))
-        for chunk in chunks:
-            self.cache_data += [["I", 0]]  # is constant?
-            for i in chunk:
-                if structure == 1:
-                    self.cache_data += [["4f"] + data[i][0:4]]
-                else:
-                    self.cache_data += [["I", len(data[i])]]
-                    for a in data[i]:
-                        self.cache_data += [["4f"] + a[0:4]]
+        self.__write_list_data(data, "4f", structure)
 
     def __write_matrix33_data(self, data, structure=1):
-        chunks = self.__get_chunks(len(data))
-        for chunk in chunks:
-            self.cache_data += [["I", 0]]  # is constant?
-            for i in chunk:
-                if structure == 1:
-                    self.cache_data += [["9f"] + data[i][0:9]]
-                else:
-                    self.cache_data += [["I", len(data[i])]]
-                    for a in data[i]:
-                        self.cache_data += [["9f"] + a[0:9]]
+        self.__write_list_data(data, "9f", structure)
 
     def __write_matrix44_data(self, data, structure=1):
-        chunks = self.__get_chunks(len(data))
-        for chunk in chunks:
-            self.cache_data += [["I", 0]]  # is constant?
-            for i in chunk:
-                if structure == 1:
-                    self.cache_data += [["16f"] + data[i][0:16]]
-                else:
-                    self.cache_data += [["I", len(data[i])]]
-                    for a in data[i]:
-                        self.cache_data += [["16f"] + a[0:16]]
+        self.__write_list_data(data, "16f", structure)
+
+
+class ICECacheReader:
+    def __init__(self, file_name, scratch_folder=None, long_size=None):
+        '''file_name is a path to the binary *.icecache file (gzip or uncompressed)
+        scratch_folder is a folder for the decompressed copy of the gzip file, by default it is the system temp folder
+        long_size is the size of the long type in the file, by default it is the same as in the current platform (4 bytes for Windows)
+        '''
+        import numpy
+        import gzip
+        import shutil
+        import tempfile
+
+        self.numpy = numpy
+        self.file_name = file_name
+        self.scratch_path = None
+        self.long_size = calcsize("L") if long_size is None else long_size
+
+        with open(file_name, "rb") as file:
+            is_gzip = file.read(2) == b"\x1f\x8b"
+        if is_gzip:
+            handle, self.scratch_path = tempfile.mkstemp(suffix=".icecache", dir=scratch_folder)
+            with os.fdopen(handle, "wb") as scratch_file:
+                source_file = gzip.open(file_name, "rb")
+                try:
+                    shutil.copyfileobj(source_file, scratch_file, 1 << 20)
+                finally:
+                    source_file.close()
+        self.data = numpy.memmap(self.scratch_path if is_gzip else file_name, dtype=numpy.uint8, mode="r")
+
+        self.attribute_data = {}  # key - attribute name, value - dictionary with definition and chunks index
+        self.attribute_names = []  # in the same order as in the file
+        self.offset = 0
+        self.__read_header()
+        self.__read_attribute_defs()
+        self.__index_attribute_data()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.data = None
+        if self.scratch_path is not None:
+            try:
+                os.remove(self.scratch_path)
+            except OSError:
+                pass  # in Windows the file can not be removed while it is mapped by arrays returned from get_chunk()
+            self.scratch_path = None
+
+    def __read(self, format):
+        values = unpack_from(format, self.data, self.offset)
+        self.offset += calcsize(format)
+        return values[0] if len(values) == 1 else values
+
+    def __read_header(self):
+        header = self.__read("8s")
+        if header != b"ICECACHE":
+            raise ValueError("File " + self.file_name + " is not an ICE cache")
+        self.version = self.__read("I")
+        self.object_type = self.__read("I")
+        self.nb_particles = self.__read("I")
+        self.__read("4I")  # edge, polygon, sample counts and substep
+        self.__read("I")  # user data blob count
+        self.attributes_count = self.__read("I")
+
+    def __read_attribute_defs(self):
+        long_format = "I" if self.long_size == 4 else "Q"
+        for i in range(self.attributes_count):
+            name_length = self.__read(long_format)
+            padded_length = name_length + (4 - name_length % 4) % 4
+            attribute_name = str(self.__read(str(padded_length) + "s")[:name_length].decode("ascii"))
+            attr_data = {}
+            attr_data["data_type"] = self.__read("I")
+            attr_data["structure_type"] = self.__read("I")
+            attr_data["context_type"] = self.__read("I")
+            self.__read("I")  # cache database ID, obsolete
+            attr_data["category"] = self.__read("I")
+            attr_data["chunks"] = []
+            self.attribute_data[attribute_name] = attr_data
+            self.attribute_names.append(attribute_name)
+
+    def __get_item_format(self, data_type):
+        '''return pair (numpy dtype, dimension) for the data type
+        '''
+        item = DATA_TYPES[data_type]
+        dimension = int(item[:-1])
+        if item[-1] == "f":
+            return self.numpy.dtype("=f4"), dimension
+        elif item[-1] == "I" or self.long_size == 4:
+            return self.numpy.dtype("=u4"), dimension
+        else:
+            return self.numpy.dtype("=u8"), dimension
+
+    def __index_attribute_data(self):
+        '''find offsets of all chunks in the file without reading the data
+        each chunk is stored as a tuple (offset, count, is_constant, sizes), sizes is None for single data
+        '''
+        for attribute in self.attribute_names:
+            attr_data = self.attribute_data[attribute]
+            dtype, dimension = self.__get_item_format(attr_data["data_type"])
+            item_size = dtype.itemsize * dimension
+            chunks = attr_data["chunks"]
+            if attribute.lower() == "pointposition":
+                # positions have only one constant flag for all data
+                is_constant = self.__read("I") != 0
+                for start in range(0, max(self.nb_particles, 1), 4000):
+                    count = min(4000, self.nb_particles - start)
+                    chunks.append((self.offset if is_constant else self.offset + start * item_size, count, is_constant, None))
+                self.offset += item_size if is_constant else self.nb_particles * item_size
+            else:
+                # the same chunks as in ICECache, the last chunk is empty if the number of particles is divisible by 4000
+                for chunk_index in range(self.nb_particles // 4000 + 1):
+                    count = min(4000, self.nb_particles - chunk_index * 4000)
+                    is_constant = self.__read("I") != 0
+                    chunk_offset = self.offset
+                    if attr_data["structure_type"] == 1:
+                        self.offset += item_size if is_constant else count * item_size
+                        chunks.append((chunk_offset, count, is_constant, None))
+                    else:
+                        sizes = []
+                        for i in range(1 if is_constant else count):
+                            size = self.__read("I")
+                            sizes.append(size)
+                            self.offset += size * item_size
+                        chunks.append((chunk_offset, count, is_constant, sizes))
+
+    def get_attribute_names(self):
+        return list(self.attribute_names)
+
+    def get_attribute_definition(self, attribute_name):
+        '''return dictionary with keys data_type, structure_type, context_type and category
+        '''
+        attr_data = self.__find_attribute(attribute_name)
+        return dict((k, v) for k, v in attr_data.items() if k != "chunks")
+
+    def get_chunks_count(self, attribute_name):
+        return len(self.__find_attribute(attribute_name)["chunks"])
+
+    def is_chunk_constant(self, attribute_name, chunk_index):
+        return self.__find_attribute(attribute_name)["chunks"][chunk_index][2]
+
+    def get_chunk(self, attribute_name, chunk_index):
+        '''return numpy array of the shape (count, dimension) (or (count, ) for one-dimensional data)
+        for array data return the pair (sizes, values), where values contains items of all arrays in the chunk
+        arrays are read-only views to the mapped file, constant chunks are broadcasted to the chunk size
+        '''
+        numpy = self.numpy
+        attr_data = self.__find_attribute(attribute_name)
+        dtype, dimension = self.__get_item_format(attr_data["data_type"])
+        offset, count, is_constant, sizes = attr_data["chunks"][chunk_index]
+        shape = (dimension, ) if dimension > 1 else ()
+        if sizes is None:
+            values = self.__view(offset, 1 if is_constant else count, dtype, shape)
+            return numpy.broadcast_to(values, (count, ) + shape) if is_constant else values
+        else:
+            if is_constant:
+                size = sizes[0]
+                values = self.__view(offset + 4, size, dtype, shape)
+                return numpy.full(count, size, dtype=numpy.uint32), numpy.tile(values, (count, ) + (1, ) * len(shape))
+            else:
+                parts = []
+                for size in sizes:
+                    parts.append(self.__view(offset + 4, size, dtype, shape))
+                    offset += 4 + size * dtype.itemsize * dimension
+                values = numpy.concatenate(parts) if len(parts) > 0 else numpy.zeros((0, ) + shape, dtype=dtype)
+                return numpy.array(sizes, dtype=numpy.uint32), values
+
+    def get_attribute(self, attribute_name):
+        '''return data of all chunks, in the same form as get_chunk()
+        '''
+        numpy = self.numpy
+        chunks = [self.get_chunk(attribute_name, i) for i in range(self.get_chunks_count(attribute_name))]
+        if self.__find_attribute(attribute_name)["structure_type"] == 1:
+            return numpy.concatenate(chunks)
+        else:
+            return numpy.concatenate([c[0] for c in chunks]), numpy.concatenate([c[1] for c in chunks])
+
+    def __view(self, offset, count, dtype, shape):
+        size = 1
+        for s in shape:
+            size *= s
+        return self.data[offset:offset + count * size * dtype.itemsize].view(dtype).reshape((count, ) + shape)
+
+    def __find_attribute(self, attribute_name):
+        '''attribute names in Softimage are case insensitive
+        '''
+        if attribute_name in self.attribute_data:
+            return self.attribute_data[attribute_name]
+        for name in self.attribute_names:
+            if name.lower() == attribute_name.lower():
+                return self.attribute_data[name]
+        raise KeyError("There is no attribute " + attribute_name + " in the cache " + self.file_name)
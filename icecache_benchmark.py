@@ -0,0 +1,254 @@
+# icecache benchmark
+# standalone script, it does not require Softimage
+# usage:
+#     python icecache_benchmark.py [compression] [particles count]
+#     python icecache_benchmark.py suite [--counts 10000,100000] [--mixes position,strands] [--modes binary,ascii] [--format csv|json] [--output file]
+#
+
+"""
+Measure the speed and the size of icecache files.
+
+compression mode writes the same pointcloud for different compression settings.
+For each compression level it prints one row: level, write time, file size, compression ratio and throughput.
+
+suite mode times ICECache.write for different particle counts, attribute mixes and file modes:
+    position - only PointPosition
+    strands  - PointPosition, Size and StrandPosition (4 points per strand)
+    matrices - PointPosition and 4x4 matrix attribute
+    binary   - gzip compressed file with default level
+    ascii    - text file for debugging
+Each row contains write time, throughput, peak memory of the writer (traced by tracemalloc in the separate run) and file size.
+The table is printed as csv (or json) to the standard output or to the file.
+
+Test data is a pointcloud with positions near the regular grid and constant sizes,
+so it is compressed similar to real simulations.
+"""
+
+import array
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import icecache
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2.7
+    tracemalloc = None
+
+SUITE_COUNTS = [10000, 100000, 1000000, 10000000]
+SUITE_MIXES = ["position", "strands", "matrices"]
+SUITE_MODES = ["binary", "ascii"]
+SUITE_KEYS = ["mix", "mode", "particles", "seconds", "particles_per_second", "megabytes_per_second", "peak_memory", "bytes"]
+ASCII_MAX_COUNT = 100000  # ascii files are very slow and large, so skip bigger counts
+STRAND_LENGTH = 4
+
+
+def build_test_data(particles_count, seed=1):
+    '''return the pair (positions, sizes) of flat float buffers
+    '''
+    rnd = random.Random(seed)
+    side = max(1, int(round(particles_count ** (1.0 / 3.0))))
+    positions = array.array("f", [0.0]) * (3 * particles_count)
+    for i in range(particles_count):
+        positions[3*i] = (i % side) + rnd.uniform(-0.1, 0.1)
+        positions[3*i + 1] = ((i // side) % side) + rnd.uniform(-0.1, 0.1)
+        positions[3*i + 2] = (i // (side * side)) + rnd.uniform(-0.1, 0.1)
+    sizes = array.array("f", [0.1]) * particles_count
+    return positions, sizes
+
+
+def build_strands(positions, strand_length=STRAND_LENGTH):
+    '''return the pair (counts, values) with vertical strands, started from each position
+    '''
+    particles_count = len(positions) // 3
+    counts = array.array("I", [strand_length]) * particles_count
+    values = array.array("f", [0.0]) * (3 * strand_length * particles_count)
+    shift = 0
+    for i in range(particles_count):
+        x, y, z = positions[3*i], positions[3*i + 1], positions[3*i + 2]
+        for k in range(strand_length):
+            values[shift] = x
+            values[shift + 1] = y + 0.1 * k
+            values[shift + 2] = z
+            shift += 3
+    return counts, values
+
+
+def build_matrices(positions):
+    '''return flat buffer with 4x4 matrices, scaled by particle index and translated to positions
+    '''
+    particles_count = len(positions) // 3
+    matrices = array.array("f", [0.0]) * (16 * particles_count)
+    for i in range(particles_count):
+        scale = 1.0 + (i % 7) * 0.1
+        shift = 16 * i
+        matrices[shift] = scale
+        matrices[shift + 5] = scale
+        matrices[shift + 10] = scale
+        matrices[shift + 12] = positions[3*i]
+        matrices[shift + 13] = positions[3*i + 1]
+        matrices[shift + 14] = positions[3*i + 2]
+        matrices[shift + 15] = 1.0
+    return matrices
+
+
+def build_cache(mix, positions, sizes, extra):
+    '''return the pair (ICECache object, size of input data in bytes)
+    extra is strands pair for the strands mix and matrices buffer for the matrices mix
+    '''
+    ic = icecache.ICECache(len(positions) // 3)
+    ic.add_point_position(positions)
+    input_bytes = len(positions) * positions.itemsize
+    if mix == "strands":
+        ic.add_scalar("Size", sizes)
+        ic.add_strand_position(extra)
+        input_bytes += len(sizes) * sizes.itemsize + len(extra[0]) * extra[0].itemsize + len(extra[1]) * extra[1].itemsize
+    elif mix == "matrices":
+        ic.add_matrix4("Matrix", extra)
+        input_bytes += len(extra) * extra.itemsize
+    return ic, input_bytes
+
+
+def measure_write(ic, file_path, is_ascii, measure_memory):
+    '''return the pair (seconds, peak memory in bytes) for one call of ICECache.write
+    peak memory is measured by the second write with tracemalloc, because tracing slows down the writer
+    '''
+    start_time = time.time()
+    ic.write(file_path, ascii=1 if is_ascii else 0)
+    seconds = time.time() - start_time
+    peak_memory = None
+    if measure_memory and tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            ic.write(file_path, ascii=1 if is_ascii else 0)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return seconds, peak_memory
+
+
+def benchmark_suite(counts=None, mixes=None, modes=None, folder=None, measure_memory=True, ascii_max_count=ASCII_MAX_COUNT):
+    '''return the list of rows, each row is a dictionary with keys from SUITE_KEYS
+    peak_memory is None if tracemalloc is not available
+    '''
+    if counts is None:
+        counts = SUITE_COUNTS
+    if mixes is None:
+        mixes = SUITE_MIXES
+    if modes is None:
+        modes = SUITE_MODES
+    if folder is None:
+        folder = tempfile.gettempdir()
+
+    file_path = os.path.join(folder, "icecache_benchmark.icecache")
+    rows = []
+    for particles_count in counts:
+        positions, sizes = build_test_data(particles_count)
+        for mix in mixes:
+            if mix == "strands":
+                extra = build_strands(positions)
+            elif mix == "matrices":
+                extra = build_matrices(positions)
+            else:
+                extra = None
+            ic, input_bytes = build_cache(mix, positions, sizes, extra)
+            for mode in modes:
+                if mode == "ascii" and particles_count > ascii_max_count:
+                    continue
+                seconds, peak_memory = measure_write(ic, file_path, mode == "ascii", measure_memory)
+                rows.append({"mix": mix,
+                             "mode": mode,
+                             "particles": particles_count,
+                             "seconds": seconds,
+                             "particles_per_second": particles_count / seconds if seconds > 0.0 else None,
+                             "megabytes_per_second": input_bytes / (seconds * 1048576.0) if seconds > 0.0 else None,
+                             "peak_memory": peak_memory,
+                             "bytes": os.path.getsize(file_path)})
+            ic = None
+            extra = None
+    if os.path.isfile(file_path):
+        os.remove(file_path)
+    return rows
+
+
+def benchmark_compression(particles_count=1000000, levels=None, folder=None):
+    '''return the list of rows, each row is a dictionary with keys
+    compression, seconds, bytes, ratio, particles_per_second
+    '''
+    if levels is None:
+        levels = [icecache.COMPRESSION_STORE] + list(range(10))
+    if folder is None:
+        folder = tempfile.gettempdir()
+
+    positions, sizes = build_test_data(particles_count)
+    file_path = os.path.join(folder, "icecache_benchmark.icecache")
+    rows = []
+    raw_size = None
+    for level in levels:
+        start_time = time.time()
+        icecache.write_point_cache(file_path, positions, sizes, compression=level)
+        seconds = time.time() - start_time
+        file_size = os.path.getsize(file_path)
+        if level == icecache.COMPRESSION_STORE:
+            raw_size = file_size
+        rows.append({"compression": "store" if level == icecache.COMPRESSION_STORE else str(level),
+                     "seconds": seconds,
+                     "bytes": file_size,
+                     "ratio": float(raw_size) / file_size if raw_size is not None else None,
+                     "particles_per_second": particles_count / seconds if seconds > 0.0 else None})
+    os.remove(file_path)
+    return rows
+
+
+def print_rows(rows, keys):
+    print("\t".join(keys))
+    for row in rows:
+        print("\t".join(("%.4g" % row[k]) if isinstance(row[k], float) else str(row[k]) for k in keys))
+
+
+def write_rows(rows, keys, stream, format="csv"):
+    '''write rows as csv table or json list to the opened text stream
+    '''
+    if format == "json":
+        json.dump([dict((k, row[k]) for k in keys) for row in rows], stream, indent=1)
+        stream.write("\n")
+    else:
+        writer = csv.writer(stream, lineterminator="\n")
+        writer.writerow(keys)
+        for row in rows:
+            writer.writerow(["" if row[k] is None else row[k] for k in keys])
+
+
+def main(args):
+    import argparse
+
+    if len(args) > 0 and args[0].isdigit():
+        args = ["compression"] + list(args)  # old form: icecache_benchmark.py [particles count]
+    parser = argparse.ArgumentParser(description="icecache benchmark")
+    parser.add_argument("mode", nargs="?", default="compression", choices=["compression", "suite"])
+    parser.add_argument("count", nargs="?", type=int, default=1000000, help="particles count for the compression mode")
+    parser.add_argument("--counts", default=",".join(str(c) for c in SUITE_COUNTS))
+    parser.add_argument("--mixes", default=",".join(SUITE_MIXES))
+    parser.add_argument("--modes", default=",".join(SUITE_MODES))
+    parser.add_argument("--no-memory", action="store_true", help="do not measure peak memory")
+    parser.add_argument("--format", default="csv", choices=["csv", "json"])
+    parser.add_argument("--output", default=None, help="path to the output file, by default print to the standard output")
+    options = parser.parse_args(args)
+
+    if options.mode == "compression":
+        print_rows(benchmark_compression(options.count), ["compression", "seconds", "bytes", "ratio", "particles_per_second"])
+    else:
+        rows = benchmark_suite([int(c) for c in options.counts.split(",")], options.mixes.split(","), options.modes.split(","), measure_memory=not options.no_memory)
+        if options.output is None:
+            write_rows(rows, SUITE_KEYS, sys.stdout, options.format)
+        else:
+            with open(options.output, "w") as file:
+                write_rows(rows, SUITE_KEYS, file, options.format)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -39,11 +39,12 @@ def import_usd(app, file_path, options, xsi_toolkit):
     options["file_name"] = utils.get_file_name_from_path(file_path)  # without extension
     options["import_camera"] = False
     cameras_to_remove = []
+    options["materials_index"] = materials.import_build_index()  # libraries and materials can be changed between sessions, so the index is created for each import
     if is_clear:
         progress_bar.Caption = "Clear the scene"
         if options["is_materials"]:
             # clear material library
-            materials.import_clear_library(app, options["file_name"])
+            materials.import_clear_library(app, options["file_name"], options["materials_index"])
 
         scene_root = app.ActiveProject2.ActiveScene.Root
         for child in scene_root.Children:
@@ -87,14 +87,54 @@ def export_materials_in_stage(app, params, stage, progress_bar=None):
 
 # --------------------------------------------------------------
 # ------------------------Import--------------------------------
-def import_clear_library(app, lib_name):
-    lib = utils.get_library(app, lib_name, create=False)
+def import_build_index():
+    '''return the index of material libraries and materials for one import session (store it in import options as "materials_index")
+    it allows to avoid scanning of all libraries and materials for each imported object
+    libraries: library name -> xsi library
+    materials: (library name, material name) -> xsi material, it contains all materials of libraries from indexed
+    '''
+    return {"libraries": {}, "materials": {}, "indexed": set()}
+
+
+def import_get_library(app, lib_name, create=True, index=None):
+    if index is None:
+        return utils.get_library(app, lib_name, create)
+    if lib_name in index["libraries"]:
+        return index["libraries"][lib_name]
+    lib = utils.get_library(app, lib_name, create)
+    if lib is not None:
+        index["libraries"][lib_name] = lib
+    return lib
+
+
+def import_find_material(library, lib_name, mat_name, index=None):
+    '''find the material in the library by using the index, all materials of the library are indexed at the first call
+    '''
+    if index is None:
+        return utils.find_material_in_library(library, mat_name)
+    if lib_name not in index["indexed"]:
+        for mat in library.Items:
+            index["materials"][(lib_name, mat.Name)] = mat
+        index["indexed"].add(lib_name)
+    return index["materials"].get((lib_name, mat_name), None)
+
+
+def import_clear_library(app, lib_name, index=None):
+    lib = import_get_library(app, lib_name, create=False, index=index)
     if lib is not None:
         app.DeleteObj(lib)
+    if index is not None:
+        # remove the library and its materials from the index
+        index["libraries"].pop(lib_name, None)
+        index["indexed"].discard(lib_name)
+        for key in [k for k in index["materials"].keys() if k[0] == lib_name]:
+            del index["materials"][key]
 
 
-def import_material(app, usd_material, library_name=None):
+def import_material(app, usd_material, library_name=None, index=None):
     '''it return xsi_material, created if needed for usd_material
+    index is the dictionary from import_build_index(), it should be used only inside one import session
+    if index is None (for example, in the operator), then the library is scanned at each call
     '''
     if DEBUG_MODE:
         imp.reload(utils)
@@ -103,11 +143,13 @@ def import_material(app, usd_material, library_name=None):
         return None
     else:
         usd_path = usd_material.GetPath()
-        library = utils.get_library(app, library_name)
+        library = import_get_library(app, library_name, index=index)
         material_name = utils.get_last_hierarchy(str(usd_path))
-        xsi_material = utils.find_material_in_library(library, material_name)
+        xsi_material = import_find_material(library, library_name, material_name, index)
         if xsi_material is not None:
             return xsi_material
         else:
             xsi_material = app.SICreateMaterial("$XSI_DSPRESETS\\Shaders\\Material\\Phong", material_name, library)  # create default material
+            if index is not None:
+                index["materials"][(library_name, material_name)] = xsi_material
             return xsi_material
@@ -2,6 +2,8 @@ from pxr import UsdGeom, Sdf, Usd
 import prim_xform
 import materials
 import utils
+import geometry_kernel
+import sampling
 import imp
 
 DEBUG_MODE = False
@@ -10,50 +12,72 @@ DEBUG_MODE = False
 # ----------------------export-----------------------------
 
 
-def set_curves_data(usd_curves, usd_curves_prim, data_points, data_vertex_count, data_width, frame=None):
+def set_curves_data(usd_curves, usd_curves_prim, data_points, data_vertex_count, data_width, frame=None, is_half_widths=False):
     # prepare usd attributes
     usd_curves.CreateTypeAttr(UsdGeom.Tokens.cubic)
     usd_curves.CreateBasisAttr(UsdGeom.Tokens.bspline)
 
     usd_points = usd_curves.CreatePointsAttr()
     usd_vertex_count = usd_curves.CreateCurveVertexCountsAttr()
-    usd_width = usd_curves.CreateWidthsAttr()
+    usd_width = utils.create_widths_attribute(usd_curves, is_half_widths)
 
     # set values
+    data_points_list = geometry_kernel.to_list(data_points)
     if frame is None:
-        usd_points.Set(data_points)
+        usd_points.Set(data_points_list)
         usd_vertex_count.Set(data_vertex_count)
         usd_width.Set(data_width)
     else:
-        usd_points.Set(data_points, Usd.TimeCode(frame))
+        usd_points.Set(data_points_list, Usd.TimeCode(frame))
         usd_vertex_count.Set(data_vertex_count, Usd.TimeCode(frame))
         usd_width.Set(data_width, Usd.TimeCode(frame))
 
     # set bounding box
     usd_extent = usd_curves_prim.CreateAttribute("extent", Sdf.ValueTypeNames.Float3Array)
     if frame is None:
-        usd_extent.Set(utils.get_bounding_box(data_points))
+        usd_extent.Set(geometry_kernel.get_bounding_box(data_points))
     else:
-        usd_extent.Set(utils.get_bounding_box(data_points), Usd.TimeCode(frame))
+        usd_extent.Set(geometry_kernel.get_bounding_box(data_points), Usd.TimeCode(frame))
 
 
-def set_hair_at_frame(app, xsi_hair, usd_curves, usd_curves_prim, frame=None):
-    # read the data
-    if frame is None:
-        xsi_pos, xsi_length, xsi_width = app.GetHairData(xsi_hair)
-    else:
-        xsi_pos, xsi_length, xsi_width = app.GetHairData(xsi_hair, frame)
+def build_curves_writers(usd_curves, usd_curves_prim, is_half_widths=False):
+    '''return the list of FusedSampleWriter objects for points, vertex counts, widths and extent of the curves
+    '''
+    usd_curves.CreateTypeAttr(UsdGeom.Tokens.cubic)
+    usd_curves.CreateBasisAttr(UsdGeom.Tokens.bspline)
+    return [sampling.build_array_writer(usd_curves.CreatePointsAttr(), 3, is_distance=True, tolerance=utils.EPSILON**2),
+            sampling.build_array_writer(usd_curves.CreateCurveVertexCountsAttr()),
+            sampling.build_array_writer(utils.create_widths_attribute(usd_curves, is_half_widths)),
+            sampling.build_array_writer(usd_curves_prim.CreateAttribute("extent", Sdf.ValueTypeNames.Float3Array), 3)]
 
-    data_points = []
-    for i in range(len(xsi_pos) // 3):
-        data_points.append((xsi_pos[3*i], xsi_pos[3*i + 1], xsi_pos[3*i + 2]))
 
-    set_curves_data(usd_curves, usd_curves_prim, data_points, list(xsi_length), xsi_width, frame)
+def add_curves_sample(curves_writers, frame, data_points, data_vertex_count, data_width):
+    points_writer, vertex_count_writer, width_writer, extent_writer = curves_writers
+    points_writer.add(frame, geometry_kernel.to_list(data_points))
+    vertex_count_writer.add(frame, data_vertex_count)
+    width_writer.add(frame, data_width)
+    extent_writer.add(frame, geometry_kernel.get_bounding_box(data_points))
+
+
+def build_hair_data(hair_sample):
+    '''convert the result of GetHairData() to the tuple (points, vertex counts, widths)
+    '''
+    xsi_pos, xsi_length, xsi_width = hair_sample
+    return geometry_kernel.as_vectors(xsi_pos, 3), list(xsi_length), xsi_width
+
+
+def set_hair_at_frame(app, xsi_hair, usd_curves, usd_curves_prim, frame=None, sample_cache=None, is_half_widths=False):
+    # read the data
+    data_points, data_vertex_count, data_width = build_hair_data(sampling.read_sample(sample_cache, xsi_hair.ObjectID, "hair", frame, lambda: utils.read_hair_sample(app, xsi_hair, frame)))
+
+    set_curves_data(usd_curves, usd_curves_prim, data_points, data_vertex_count, data_width, frame, is_half_widths)
 
 
 def add_hair(app, params, path_for_objects, stage, xsi_hair, materials_opt, root_path, progress_bar=None):
     if DEBUG_MODE:
         imp.reload(utils)
+        imp.reload(geometry_kernel)
+        imp.reload(sampling)
         imp.reload(prim_xform)
         imp.reload(materials)
 
@@ -64,28 +88,31 @@ def add_hair(app, params, path_for_objects, stage, xsi_hair, materials_opt, root
     materials.add_material(materials_opt, xsi_hair.Material, ref_stage, ref_stage_asset, usd_xform, usd_curves_prim)
 
     opt_animation = params.get("animation", None)
-    if opt_animation is None or not utils.is_hair_animated(app, xsi_hair, opt_animation):
-        set_hair_at_frame(app, xsi_hair, usd_curves, usd_curves_prim)
+    opt = params.get("options", {})
+    sample_cache = params.get("sample_cache", None)
+    is_half_widths = "width" in opt.get("half_precision", ())
+    if opt_animation is not None and opt.get("fused_sampling", False):
+        # the stage is saved, when the track is finished
+        curves_writers = build_curves_writers(usd_curves, usd_curves_prim, is_half_widths)
+        sampling.add_track(params, app, xsi_hair, lambda frame: add_curves_sample(curves_writers, frame, *build_hair_data(utils.read_hair_sample(app, xsi_hair, frame))), ref_stage.Save, progress_bar)
     else:
-        for frame in range(opt_animation[0], opt_animation[1] + 1):
-            if progress_bar is not None:
-                progress_bar.Caption = utils.build_export_object_caption(xsi_hair, frame)
-            # for xsi-hairs we does not need update time frame
-            set_hair_at_frame(app, xsi_hair, usd_curves, usd_curves_prim, frame)
-    ref_stage.Save()
+        if opt_animation is None or not utils.is_hair_animated(app, xsi_hair, opt_animation, sample_cache):
+            set_hair_at_frame(app, xsi_hair, usd_curves, usd_curves_prim, sample_cache=sample_cache, is_half_widths=is_half_widths)
+        else:
+            for frame in range(opt_animation[0], opt_animation[1] + 1):
+                if progress_bar is not None:
+                    progress_bar.Caption = utils.build_export_object_caption(xsi_hair, frame)
+                # for xsi-hairs we does not need update time frame
+                set_hair_at_frame(app, xsi_hair, usd_curves, usd_curves_prim, frame, sample_cache, is_half_widths)
+        ref_stage.Save()
 
     return stage.GetPrimAtPath(root_path + str(usd_xform.GetPath()))
 
 
-def set_strands_at_frame(xsi_geometry, usd_curves, usd_curves_prim, frame=None):
-    # we should get point positions, strand positions and size attribute
-    xsi_pp = xsi_geometry.GetICEAttributeFromName("PointPosition")
-    xsi_sp = xsi_geometry.GetICEAttributeFromName("StrandPosition")
-    xsi_size = xsi_geometry.GetICEAttributeFromName("Size")
-    # read data
-    xsi_pp_data = xsi_pp.DataArray
-    xsi_sp_data = xsi_sp.DataArray2D
-    xsi_size_data = xsi_size.DataArray
+def build_strands_data(pointcloud_sample):
+    '''convert the result of utils.read_pointcloud_sample() (with strands) to the tuple (points, vertex counts, widths)
+    '''
+    xsi_pp_data, xsi_size_data, xsi_sp_data = pointcloud_sample
     # the size of xsi_pp_data and xsi_size_data are strands count
 
     # next from arrays with the data
@@ -94,19 +121,28 @@ def set_strands_at_frame(xsi_geometry, usd_curves, usd_curves_prim, frame=None):
     data_width = []
     for strand_index in range(len(xsi_pp_data)):
         # start point
-        data_points.append(utils.vector_to_tuple(xsi_pp_data[strand_index]))
+        data_points.append(xsi_pp_data[strand_index])
         # next strand points
-        for p_index in range(len(xsi_sp_data[strand_index])):
-            data_points.append(utils.vector_to_tuple(xsi_sp_data[strand_index][p_index]))
+        data_points += xsi_sp_data[strand_index]
         data_vertex_count.append(len(xsi_sp_data[strand_index]) + 1)
         data_width += [xsi_size_data[strand_index] if strand_index < len(xsi_size_data) else xsi_size_data[-1]] * (len(xsi_sp_data[strand_index]) + 1)
+    return data_points, data_vertex_count, data_width
+
+
+def set_strands_at_frame(xsi_geometry, usd_curves, usd_curves_prim, frame=None, pointcloud_sample=None, is_half_widths=False):
+    # we should get point positions, strand positions and size attribute
+    if pointcloud_sample is None:
+        pointcloud_sample = utils.read_pointcloud_geometry(xsi_geometry, True)
+    data_points, data_vertex_count, data_width = build_strands_data(pointcloud_sample)
 
-    set_curves_data(usd_curves, usd_curves_prim, data_points, data_vertex_count, data_width, frame)
+    set_curves_data(usd_curves, usd_curves_prim, data_points, data_vertex_count, data_width, frame, is_half_widths)
 
 
 def add_strands(app, params, path_for_objects, stage, xsi_pc, materials_opt, root_path, progress_bar=None):
     if DEBUG_MODE:
         imp.reload(utils)
+        imp.reload(geometry_kernel)
+        imp.reload(sampling)
         imp.reload(prim_xform)
         imp.reload(materials)
 
@@ -118,16 +154,25 @@ def add_strands(app, params, path_for_objects, stage, xsi_pc, materials_opt, roo
 
     opt_animation = params.get("animation", None)
     opt = params.get("options", {})
-    if opt_animation is None or not utils.is_poincloud_animated(xsi_pc, opt_animation, check_strands=True):
-        set_strands_at_frame(xsi_pc.GetActivePrimitive3().Geometry, usd_curves, usd_curves_prim)
+    # the animation check does not change frames, so sampled values can not be reused, when frames should be changed during the export
+    sample_cache = None if opt.get("force_change_frame", False) else params.get("sample_cache", None)
+    kind = utils.get_pointcloud_sample_kind(True)
+    is_half_widths = "width" in opt.get("half_precision", ())
+    if opt_animation is not None and opt.get("fused_sampling", False):
+        # frames are changed by the scheduler, the stage is saved, when the track is finished
+        curves_writers = build_curves_writers(usd_curves, usd_curves_prim, is_half_widths)
+        sampling.add_track(params, app, xsi_pc, lambda frame: add_curves_sample(curves_writers, frame, *build_strands_data(utils.read_pointcloud_sample(xsi_pc, frame, True))), ref_stage.Save, progress_bar)
     else:
-        for frame in range(opt_animation[0], opt_animation[1] + 1):
-            if progress_bar is not None:
-                progress_bar.Caption = utils.build_export_object_caption(xsi_pc, frame)
-            if opt.get("force_change_frame", False):
-                app.SetValue("PlayControl.Current", frame, "")
-                app.SetValue("PlayControl.Key", frame, "")
-            set_strands_at_frame(xsi_pc.GetActivePrimitive3(frame).GetGeometry3(frame), usd_curves, usd_curves_prim, frame)
-    ref_stage.Save()
+        if opt_animation is None or not utils.is_poincloud_animated(xsi_pc, opt_animation, check_strands=True, sample_cache=sample_cache):
+            set_strands_at_frame(None, usd_curves, usd_curves_prim, pointcloud_sample=sampling.read_sample(sample_cache, xsi_pc.ObjectID, kind, None, lambda: utils.read_pointcloud_sample(xsi_pc, None, True)), is_half_widths=is_half_widths)
+        else:
+            for frame in range(opt_animation[0], opt_animation[1] + 1):
+                if progress_bar is not None:
+                    progress_bar.Caption = utils.build_export_object_caption(xsi_pc, frame)
+                if opt.get("force_change_frame", False):
+                    app.SetValue("PlayControl.Current", frame, "")
+                    app.SetValue("PlayControl.Key", frame, "")
+                set_strands_at_frame(None, usd_curves, usd_curves_prim, frame, sampling.read_sample(sample_cache, xsi_pc.ObjectID, kind, frame, lambda: utils.read_pointcloud_sample(xsi_pc, frame, True)), is_half_widths)
+        ref_stage.Save()
 
     return stage.GetPrimAtPath(root_path + str(usd_xform.GetPath()))
@@ -1,70 +1,89 @@
-from pxr import UsdGeom, Sdf, Usd, UsdShade
+from pxr import UsdGeom, Sdf, Usd, UsdShade, Vt
 from win32com.client import constants
 import prim_xform
 import utils
+import geometry_kernel
+import sampling
 import materials
 import imp
 
 DEBUG_MODE = False
+XSI_FACES_CACHE_BUDGET = 64 * 1048576  # in bytes
+xsi_faces_cache = sampling.FrameSampleCache(XSI_FACES_CACHE_BUDGET)  # polygons arrays for each time sample of meshes, updated by the operator
+# exported sample attributes: (name in attributes list, property type, dimension, cluster filter)
+SAMPLE_ATTRIBUTES = [("uvmap", "uvspace", 2, "sample"),
+                     ("color", "vertexcolor", 3, "sample"),
+                     ("weightmap", "wtmap", 1, "pnt")]
+INDEXED_PRIMVAR_TOLERANCE = 0.00001  # uvs and colors, which are closer than this value, are written as one value of the indexed primvar
 
 # -------------------------------------------------------------
 # -------------------export------------------------------------
 
 
-def set_mesh_at_frame(app, stage, mesh_object, opt_attributes, usd_mesh, usd_mesh_prim, usd_mesh_primvar, is_constant, material_to_usd, frame=None, force_frame=False):
+def export_read_normals(xsi_polygonmesh, xsi_sample_clusters):
+    '''return normals for all samples of the mesh (in the order of samples)
+    node normals are read by one call of Nodes.NormalArray, node indexes are the same as sample indexes
+    '''
+    xsi_normals = geometry_kernel.from_xsi_vectors_array(xsi_polygonmesh.Nodes.NormalArray)
+    # may be normals were modified
+    for xsi_cluster in xsi_sample_clusters:
+        for prop in xsi_cluster.Properties:
+            if prop.Type == "normal":
+                cls_sample_index = xsi_cluster.Elements.Array  # store sample indexes in the array (s1, s2, s3, ...), but it is not ordered. Data elements in the same order as in this array
+                # for example cls_sample_index = [3, 1] it means that the fist value in the data for 3-d sample, the second - for 1-t sample
+                xsi_normal_data = prop.Elements.Array  # it contains only modified data
+                xsi_normals = geometry_kernel.set_vectors_at_indexes(xsi_normals, cls_sample_index, geometry_kernel.from_xsi_vectors_array(xsi_normal_data))
+    return xsi_normals
+
+
+def set_attribute_at_frame(attribute_writers, name, create_attribute, value, frame=None, dimension=1, is_held=False):
+    '''set the value of the usd attribute, created by create_attribute()
+    for animated export the value is passed to the FusedSampleWriter from attribute_writers with the given name (it is created at the first call)
+    so, time samples are written only if the value is changed
+    '''
+    if frame is None:
+        create_attribute().Set(value)
+    elif attribute_writers is None:
+        create_attribute().Set(value, Usd.TimeCode(frame))
+    else:
+        if name not in attribute_writers:
+            attribute_writers[name] = sampling.build_array_writer(create_attribute(), dimension, is_held=is_held)
+        attribute_writers[name].add(frame, value)
+
+
+def set_mesh_at_frame(app, stage, mesh_object, opt_attributes, usd_mesh, usd_mesh_prim, usd_mesh_primvar, is_constant, material_to_usd, frame=None, force_frame=False, sample_cache=None, attribute_writers=None, is_held=False, is_fused=False, half_attributes=()):
+    '''attribute_writers is a dictionary with FusedSampleWriter objects (name -> writer), it should be the same for all frames of the mesh
+    creases are always written by writers from this dictionary, so they are written only when they are changed
+    if is_held or is_fused is True, then the same is done for points, extent, normals and topology (in the held mode only changed values are written)
+    if attribute_writers is None, then all values are written at each frame
+    half_attributes is the list of attributes, which are written with half precision (only "normal" is used here)
+    return the geometry at the frame
+    '''
     if frame is not None and force_frame:
         app.SetValue("PlayControl.Current", frame, "")
         app.SetValue("PlayControl.Key", frame, "")
     # read mesh data
     xsi_polygonmesh = mesh_object.GetActivePrimitive3().Geometry if frame is None else mesh_object.GetActivePrimitive3(frame).GetGeometry3(frame)
-    if xsi_polygonmesh.Vertices.Count == 0:
-        xsi_mesh_data = (((0,), (0,), (0,)), (0,))
-    else:
-        xsi_mesh_data = xsi_polygonmesh.Get2()
+    # for animated mesh Get2() data may be already sampled by the topology check
+    xsi_mesh_data = utils.read_polygonmesh_data(xsi_polygonmesh) if frame is None else sampling.read_sample(sample_cache, mesh_object.ObjectID, "mesh", frame, lambda: utils.read_polygonmesh_data(xsi_polygonmesh))
     # 1: ((p1.x, p2.x, ...), (p1.y, p2.y, ...), (p1.z, p2.z, ...))
     # 2: (4<-polygon size, 0, 1, 5, 6, 4<-second polygon size, 45, 64, 34, 22, ...)
-    xsi_point_positions = []
-    xsi_polygon_sizes = []
-    xsi_polygon_point_indexes = []
-    for i in range(len(xsi_mesh_data[0][0])):
-        xsi_point_positions.append((xsi_mesh_data[0][0][i], xsi_mesh_data[0][1][i], xsi_mesh_data[0][2][i]))
-    is_size = True
-    polygon_corner = 0
-    for v in xsi_mesh_data[1]:
-        if is_size:
-            xsi_polygon_sizes.append(v)
-            polygon_corner = 0
-            is_size = False
-        else:
-            xsi_polygon_point_indexes.append(v)
-            polygon_corner += 1
-            if polygon_corner == xsi_polygon_sizes[-1]:
-                is_size = True
+    xsi_point_positions, xsi_polygon_sizes, xsi_polygon_point_indexes = geometry_kernel.decode_xsi_mesh_data(xsi_mesh_data)
+    xsi_extent = geometry_kernel.get_bounding_box(xsi_point_positions)
+    xsi_point_positions = geometry_kernel.to_vt_array(xsi_point_positions, Vt.Vec3fArray, "f")
+    xsi_polygon_sizes = geometry_kernel.to_vt_array(xsi_polygon_sizes, Vt.IntArray, "i")
+    xsi_polygon_point_indexes = geometry_kernel.to_vt_array(xsi_polygon_point_indexes, Vt.IntArray, "i")
 
-    usd_extent = usd_mesh_prim.CreateAttribute("extent", Sdf.ValueTypeNames.Float3Array)
-    if frame is None:
-        usd_extent.Set(utils.get_bounding_box(xsi_point_positions))
-    else:
-        usd_extent.Set(utils.get_bounding_box(xsi_point_positions), Usd.TimeCode(frame))
+    # in the held and fused modes animated attributes are written by writers, in other case they are written at each frame
+    held_writers = attribute_writers if is_held or is_fused else None
+    set_attribute_at_frame(held_writers, "extent", lambda: usd_mesh_prim.CreateAttribute("extent", Sdf.ValueTypeNames.Float3Array), xsi_extent, frame, 3, is_held)
 
     # set mesh attributes
-    usd_points_attr = usd_mesh.CreatePointsAttr()
-    if frame is None:
-        usd_points_attr.Set(xsi_point_positions)
-    else:
-        usd_points_attr.Set(xsi_point_positions, Usd.TimeCode(frame))
+    set_attribute_at_frame(held_writers, "points", usd_mesh.CreatePointsAttr, xsi_point_positions, frame, 3, is_held)
 
-    usd_face_vertex_attr = usd_mesh.CreateFaceVertexCountsAttr()
-    if frame is None or is_constant:
-        usd_face_vertex_attr.Set(xsi_polygon_sizes)
-    else:
-        usd_face_vertex_attr.Set(xsi_polygon_sizes, Usd.TimeCode(frame))
-
-    usd_face_indexes_attr = usd_mesh.CreateFaceVertexIndicesAttr()
-    if frame is None or is_constant:  # set topology at frame only if we change it, otherwise set universal values
-        usd_face_indexes_attr.Set(xsi_polygon_point_indexes)
-    else:
-        usd_face_indexes_attr.Set(xsi_polygon_point_indexes, Usd.TimeCode(frame))
+    # set topology at frame only if we change it, otherwise set universal values
+    set_attribute_at_frame(held_writers, "face_vertex_counts", usd_mesh.CreateFaceVertexCountsAttr, xsi_polygon_sizes, None if is_constant else frame, 1, is_held)
+    set_attribute_at_frame(held_writers, "face_vertex_indices", usd_mesh.CreateFaceVertexIndicesAttr, xsi_polygon_point_indexes, None if is_constant else frame, 1, is_held)
 
     xsi_sample_clusters = None
     if "normal" in opt_attributes or "color" in opt_attributes or "uvmap" in opt_attributes:
@@ -74,70 +93,34 @@ def set_mesh_at_frame(app, stage, mesh_object, opt_attributes, usd_mesh, usd_mes
 
     # normals
     if "normal" in opt_attributes:
-        xsi_normals = []
-        for xsi_polygon in xsi_polygonmesh.Polygons:
-            p_samples = xsi_polygon.Samples
-            p_nodes = xsi_polygon.Nodes
-            for ps_index in range(p_samples.Count):
-                xsi_normals.append(utils.vector_to_tuple(p_nodes[ps_index].Normal))
-        # may be normals were modified
-        for xsi_cluster in xsi_sample_clusters:
-            for prop in xsi_cluster.Properties:
-                if prop.Type == "normal":
-                    cls_sample_index = xsi_cluster.Elements.Array  # store sample indexes in the array (s1, s2, s3, ...), but it is not ordered. Data elements in the same order as in this array
-                    # for example cls_sample_index = [3, 1] it means that the fist value in the data for 3-d sample, the second - for 1-t sample
-                    xsi_normal_data = prop.Elements.Array  # it contains only modified data
-                    for i in range(len(cls_sample_index)):
-                        xsi_normals[cls_sample_index[i]] = (xsi_normal_data[0][i], xsi_normal_data[1][i], xsi_normal_data[2][i])
-        usd_normals_attr = usd_mesh.CreateNormalsAttr()
-        if frame is None:
-            usd_normals_attr.Set(xsi_normals)
+        xsi_normals = geometry_kernel.to_list(export_read_normals(xsi_polygonmesh, xsi_sample_clusters))
+        if "normal" in half_attributes:
+            # normals attribute has float type, so half precision normals are written to the primvar, which overrides it
+            set_attribute_at_frame(held_writers, "normals", lambda: usd_mesh_primvar.CreatePrimvar("normals", Sdf.ValueTypeNames.Normal3hArray, UsdGeom.Tokens.faceVarying).GetAttr(), xsi_normals, frame, 3, is_held)
         else:
-            usd_normals_attr.Set(xsi_normals, Usd.TimeCode(frame))
-        usd_mesh.SetNormalsInterpolation(UsdGeom.Tokens.faceVarying)
+            set_attribute_at_frame(held_writers, "normals", usd_mesh.CreateNormalsAttr, xsi_normals, frame, 3, is_held)
+            usd_mesh.SetNormalsInterpolation(UsdGeom.Tokens.faceVarying)
+
+    # creases are read by the geometry accessor for all vertices and edges at once
+    if "vertex_creases" in opt_attributes or "edge_creases" in opt_attributes:
+        xsi_accessor = xsi_polygonmesh.GetGeometryAccessor2()
 
     # vertex creases
     if "vertex_creases" in opt_attributes:
-        xsi_vertex_creases_values = []
-        xsi_vertex_crease_indexes = []
-        for xsi_vertex in xsi_polygonmesh.Vertices:
-            if xsi_vertex.Crease > 0.001:
-                xsi_vertex_creases_values.append(xsi_vertex.Crease)  # 10.0 is equal to maximum value
-                xsi_vertex_crease_indexes.append(xsi_vertex.Index)
-        if len(xsi_vertex_creases_values) > 0:
-            usd_corner_indices_attr = usd_mesh.CreateCornerIndicesAttr()
-            usd_corner_sharpness_attr = usd_mesh.CreateCornerSharpnessesAttr()
-            if frame is None:
-                usd_corner_indices_attr.Set(xsi_vertex_crease_indexes)
-                usd_corner_sharpness_attr.Set(xsi_vertex_creases_values)
-            else:
-                usd_corner_indices_attr.Set(xsi_vertex_crease_indexes, Usd.TimeCode(frame))
-                usd_corner_sharpness_attr.Set(xsi_vertex_creases_values, Usd.TimeCode(frame))
+        xsi_vertex_crease_indexes, xsi_vertex_creases_values = geometry_kernel.select_greater(xsi_accessor.GetVertexCreaseValues(), 0.001)  # 10.0 is equal to maximum value
+        if len(xsi_vertex_creases_values) > 0 or (attribute_writers is not None and "corner_indices" in attribute_writers):
+            set_attribute_at_frame(attribute_writers, "corner_indices", usd_mesh.CreateCornerIndicesAttr, geometry_kernel.to_list(xsi_vertex_crease_indexes), frame, 1, is_held)
+            set_attribute_at_frame(attribute_writers, "corner_sharpnesses", usd_mesh.CreateCornerSharpnessesAttr, geometry_kernel.to_list(xsi_vertex_creases_values), frame, 1, is_held)
 
     # edges creases
     if "edge_creases" in opt_attributes:
-        xsi_edge_vertex_indexes = []  # [e1.1, v1.2, e2.1, e2.2, e3.1, e3.2, ...]
-        edge_count = 0
-        xsi_edge_creases = []
-        for xsi_edge in xsi_polygonmesh.Edges:
-            xsi_edge_crease = xsi_edge.Crease
-            if xsi_edge_crease > 0.001:
-                xsi_edge_creases.append(xsi_edge_crease)
-                edge_count += 1
-                for xsi_vert in xsi_edge.Vertices:
-                    xsi_edge_vertex_indexes.append(xsi_vert.Index)
-        if edge_count > 0:
-            usd_crease_indeces_attr = usd_mesh.CreateCreaseIndicesAttr()
-            usd_crease_length_attr = usd_mesh.CreateCreaseLengthsAttr()
-            usd_crease_sharpness_attr = usd_mesh.CreateCreaseSharpnessesAttr()
-            if frame is None:
-                usd_crease_indeces_attr.Set(xsi_edge_vertex_indexes)
-                usd_crease_length_attr.Set([2] * edge_count)
-                usd_crease_sharpness_attr.Set(xsi_edge_creases)
-            else:
-                usd_crease_indeces_attr.Set(xsi_edge_vertex_indexes, Usd.TimeCode(frame))
-                usd_crease_length_attr.Set([2] * edge_count, Usd.TimeCode(frame))
-                usd_crease_sharpness_attr.Set(xsi_edge_creases, Usd.TimeCode(frame))
+        xsi_edge_indexes, xsi_edge_creases = geometry_kernel.select_greater(xsi_accessor.GetEdgeCreaseValues(), 0.001)
+        edge_count = len(xsi_edge_indexes)
+        if edge_count > 0 or (attribute_writers is not None and "crease_indices" in attribute_writers):
+            xsi_edge_vertex_indexes = geometry_kernel.select_items(xsi_accessor.GetEdgeIndices(), xsi_edge_indexes, 2)  # [e1.1, v1.2, e2.1, e2.2, e3.1, e3.2, ...]
+            set_attribute_at_frame(attribute_writers, "crease_indices", usd_mesh.CreateCreaseIndicesAttr, geometry_kernel.to_list(xsi_edge_vertex_indexes), frame, 1, is_held)
+            set_attribute_at_frame(attribute_writers, "crease_lengths", usd_mesh.CreateCreaseLengthsAttr, [2] * edge_count, frame, 1, is_held)
+            set_attribute_at_frame(attribute_writers, "crease_sharpnesses", usd_mesh.CreateCreaseSharpnessesAttr, geometry_kernel.to_list(xsi_edge_creases), frame, 1, is_held)
 
     # polygon clusters
     if "cluster" in opt_attributes:
@@ -159,20 +142,15 @@ def set_mesh_at_frame(app, stage, mesh_object, opt_attributes, usd_mesh, usd_mes
                 mat_identifier = utils.build_material_identifier(xsi_cluster_material)
                 if mat_identifier in material_to_usd:
                     UsdShade.MaterialBindingAPI(usd_subset).Bind(material_to_usd[mat_identifier])
+    return xsi_polygonmesh
 
 
-def export_set_sample_attribute(app, mesh_object, prop_type, dimension, usd_mesh_primvar, force_frame, opt_anim, cluster_filter):
-    if opt_anim is None:
-        xsi_start_polygonmesh = mesh_object.GetActivePrimitive3().Geometry
-    else:
-        if force_frame:
-            app.SetValue("PlayControl.Current", opt_anim[0], "")
-            app.SetValue("PlayControl.Key", opt_anim[0], "")
-        xsi_start_polygonmesh = mesh_object.GetActivePrimitive3(opt_anim[0]).GetGeometry3(opt_anim[0])  # at start frame
-    xsi_clusters = xsi_start_polygonmesh.Clusters.Filter(cluster_filter)
-    xsi_attr_data = {}  # key - name, value - [is_constant, [at frame 1], [at frame 2], ...] When we add new arrays, is_constant=True, until the array is differ from the first one
-    usd_attributes = {}  # key - name, value - link to usd attribute
-    for xsi_cluster in xsi_clusters:
+def export_read_sample_attribute(xsi_polygonmesh, prop_type, dimension, cluster_filter):
+    '''return the dictionary: name of the property -> data of the property at the given geometry
+    data is a list of tuples for sample clusters and a list of values (ordered by vertices) for point clusters
+    '''
+    xsi_attr_data = {}
+    for xsi_cluster in xsi_polygonmesh.Clusters.Filter(cluster_filter):
         index_to_vertex = None
         if xsi_cluster.IsAlwaysComplete():
             if cluster_filter == "pnt":  # for point cluster save map from index to vertex
@@ -181,7 +159,7 @@ def export_set_sample_attribute(app, mesh_object, prop_type, dimension, usd_mesh
                 if prop.Type == prop_type:
                     if index_to_vertex is None:
                         xsi_data_array = prop.Elements.Array
-                        xsi_attr_data[prop.Name] = [True, [tuple(xsi_data_array[j][i] for j in range(dimension)) for i in range(len(xsi_data_array[0]))]]  # init array by first values
+                        xsi_attr_data[prop.Name] = [tuple(xsi_data_array[j][i] for j in range(dimension)) for i in range(len(xsi_data_array[0]))]
                     else:
                         xsi_cluster_data = []
                         c_elements = prop.Elements
@@ -192,83 +170,135 @@ def export_set_sample_attribute(app, mesh_object, prop_type, dimension, usd_mesh
                         xsi_weights = []
                         for c in xsi_cluster_data:
                             xsi_weights.append(c[1])
-                        xsi_attr_data[prop.Name] = [True, xsi_weights]
-                    # create usd attribute, different attribute for differetn types
-                    if prop_type == "uvspace":
-                        usd_attributes[prop.Name] = usd_mesh_primvar.CreatePrimvar(prop.Name, Sdf.ValueTypeNames.TexCoord2fArray, UsdGeom.Tokens.varying)
-                    elif prop_type == "vertexcolor":
-                        usd_attributes[prop.Name] = usd_mesh_primvar.CreatePrimvar(prop.Name, Sdf.ValueTypeNames.Color3fArray, UsdGeom.Tokens.faceVarying)
-                    elif prop_type == "wtmap":
-                        usd_attributes[prop.Name] = usd_mesh_primvar.CreatePrimvar(prop.Name, Sdf.ValueTypeNames.FloatArray, UsdGeom.Tokens.vertex)
-    if len(xsi_attr_data) > 0:
+                        xsi_attr_data[prop.Name] = xsi_weights
+    return xsi_attr_data
+
+
+def export_add_sample_attribute_value(state, name, frame, data):
+    if name in state["index_writers"]:
+        # write unique values and indexes separately, each of them is written only when it is changed
+        values, indexes = geometry_kernel.build_indexed_values(data, state["dimension"], INDEXED_PRIMVAR_TOLERANCE)
+        state["writers"][name].add(frame, [tuple(v) for v in geometry_kernel.to_list(values)])
+        state["index_writers"][name].add(frame, geometry_kernel.to_list(indexes))
+    else:
+        state["writers"][name].add(frame, data)
+
+
+def export_begin_sample_attribute(xsi_polygonmesh, prop_type, dimension, usd_mesh_primvar, cluster_filter, is_held=False, frame=None, is_indexed=False, is_half=False):
+    '''create usd attributes for sample attributes of the geometry and write values at the first frame
+    return the dictionary with the state of the export, it should be passed to export_sample_attribute() for other frames and to export_finish_sample_attribute()
+    values are passed to FusedSampleWriter objects, so each frame is compared with the first one as it arrives,
+    and only the first value (or the last written value in the held mode) is stored between frames
+    if is_indexed is True, then uvs and colors are written as indexed primvars with unique values
+    if is_half is True, then uvs and colors are written with half precision
+    '''
+    state = {"prop_type": prop_type,
+             "dimension": dimension,
+             "cluster_filter": cluster_filter,
+             "writers": {},  # key - name, value - FusedSampleWriter for the usd attribute
+             "index_writers": {}}  # key - name, value - FusedSampleWriter for indices of the indexed primvar
+    for name, data in export_read_sample_attribute(xsi_polygonmesh, prop_type, dimension, cluster_filter).items():
+        # create usd attribute, different attribute for differetn types
+        if prop_type == "uvspace":
+            usd_attribute = usd_mesh_primvar.CreatePrimvar(name, Sdf.ValueTypeNames.TexCoord2hArray if is_half else Sdf.ValueTypeNames.TexCoord2fArray, UsdGeom.Tokens.varying)
+        elif prop_type == "vertexcolor":
+            usd_attribute = usd_mesh_primvar.CreatePrimvar(name, Sdf.ValueTypeNames.Color3hArray if is_half else Sdf.ValueTypeNames.Color3fArray, UsdGeom.Tokens.faceVarying)
+        elif prop_type == "wtmap":
+            usd_attribute = usd_mesh_primvar.CreatePrimvar(name, Sdf.ValueTypeNames.FloatArray, UsdGeom.Tokens.vertex)
+        else:
+            continue
+        state["writers"][name] = sampling.build_array_writer(usd_attribute.GetAttr(), dimension, is_held=is_held)
+        if is_indexed and prop_type != "wtmap":
+            state["index_writers"][name] = sampling.build_array_writer(usd_attribute.CreateIndicesAttr(), is_held=is_held)
+        export_add_sample_attribute_value(state, name, frame, data)  # the first value is written as default
+    return state
+
+
+def export_sample_attribute(state, xsi_polygonmesh, frame):
+    '''write attributes from the geometry at the next frame
+    if the attribute is differ from the first frame at first time, then held values are flushed to time samples
+    '''
+    if len(state["writers"]) == 0:
+        return
+    for name, data in export_read_sample_attribute(xsi_polygonmesh, state["prop_type"], state["dimension"], state["cluster_filter"]).items():
+        if name in state["writers"]:
+            export_add_sample_attribute_value(state, name, frame, data)
+
+
+def export_finish_sample_attribute(state):
+    sampling.finish_writers(state["writers"].values())
+    sampling.finish_writers(state["index_writers"].values())
+
+
+def export_set_sample_attribute(app, mesh_object, prop_type, dimension, usd_mesh_primvar, force_frame, opt_anim, cluster_filter, is_held=False, is_indexed=False, is_half=False):
+    '''if is_held is True, then for animated attributes only changed values are written (with the last value before each change and at the end)
+    '''
+    if opt_anim is None:
+        xsi_start_polygonmesh = mesh_object.GetActivePrimitive3().Geometry
+    else:
+        if force_frame:
+            app.SetValue("PlayControl.Current", opt_anim[0], "")
+            app.SetValue("PlayControl.Key", opt_anim[0], "")
+        xsi_start_polygonmesh = mesh_object.GetActivePrimitive3(opt_anim[0]).GetGeometry3(opt_anim[0])  # at start frame
+    state = export_begin_sample_attribute(xsi_start_polygonmesh, prop_type, dimension, usd_mesh_primvar, cluster_filter, is_held, None if opt_anim is None else opt_anim[0], is_indexed, is_half)
+    if len(state["writers"]) > 0 and opt_anim is not None:
         # iterate through frames
-        if opt_anim is not None:
-            for frame in range(opt_anim[0] + 1, opt_anim[1] + 1):
-                if force_frame:
-                    app.SetValue("PlayControl.Current", frame, "")
-                    app.SetValue("PlayControl.Key", frame, "")
-                frame_polymesh = mesh_object.GetActivePrimitive3(frame).GetGeometry3(frame)
-                frame_clusters = frame_polymesh.Clusters.Filter(cluster_filter)
-                for frame_cluster in frame_clusters:
-                    index_to_vertex = None
-                    if frame_cluster.IsAlwaysComplete():
-                        if cluster_filter == "pnt":
-                            index_to_vertex = xsi_cluster.Elements.Array
-                        for prop in frame_cluster.Properties:
-                            if prop.Type == prop_type:
-                                if index_to_vertex is None:
-                                    frame_attr_data = prop.Elements.Array
-                                    if prop.Name in xsi_attr_data:
-                                        current_xsi_data = xsi_attr_data[prop.Name]
-                                        current_xsi_data.append([tuple(frame_attr_data[j][i] for j in range(dimension)) for i in range(len(frame_attr_data[0]))])
-                                        # check is new array is differ from the first one
-                                        if current_xsi_data[0]:
-                                            current_xsi_data[0] = not utils.is_vector2_arrays_are_different(current_xsi_data[1], current_xsi_data[-1])
-                                else:
-                                    # read per-vertex data
-                                    xsi_cluster_data = []
-                                    c_elements = prop.Elements
-                                    c_count = len(c_elements)
-                                    for c_e in range(c_count):
-                                        xsi_cluster_data.append((index_to_vertex[c_e], c_elements[c_e][0]))
-                                    xsi_cluster_data = sorted(xsi_cluster_data, key=lambda x: x[0])
-                                    xsi_weights = []
-                                    for c in xsi_cluster_data:
-                                        xsi_weights.append(c[1])
-                                    # add it
-                                    if prop.Name in xsi_attr_data:
-                                        current_xsi_data = xsi_attr_data[prop.Name]
-                                        current_xsi_data.append(xsi_weights)
-                                        # check is new array is differ from the first one
-                                        if current_xsi_data[0]:
-                                            current_xsi_data[0] = not utils.is_float_arrays_are_different(current_xsi_data[1], current_xsi_data[-1])
-
-        # next write attributes
-        for xsi_name, xsi_data in xsi_attr_data.items():
-            if xsi_data[0]:
-                # constant, set only the first one
-                usd_attributes[xsi_name].Set(xsi_data[1])
-            else:
-                # change in times
-                step = 0
-                for frame in range(opt_anim[0], opt_anim[1] + 1):
-                    usd_attributes[xsi_name].Set(xsi_data[step + 1], Usd.TimeCode(frame))
-                    step += 1
+        for frame in range(opt_anim[0] + 1, opt_anim[1] + 1):
+            if force_frame:
+                app.SetValue("PlayControl.Current", frame, "")
+                app.SetValue("PlayControl.Key", frame, "")
+            export_sample_attribute(state, mesh_object.GetActivePrimitive3(frame).GetGeometry3(frame), frame)
+    export_finish_sample_attribute(state)
+
+
+def export_begin_sample_attributes(xsi_polygonmesh, usd_mesh_primvar, opt_attributes, is_held=False, frame=None, is_indexed=False, half_attributes=()):
+    '''return the list of export states for all enabled uvs, colors and weightmaps
+    '''
+    states = []
+    for attr_name, prop_type, dimension, cluster_filter in SAMPLE_ATTRIBUTES:
+        if attr_name in opt_attributes:
+            states.append(export_begin_sample_attribute(xsi_polygonmesh, prop_type, dimension, usd_mesh_primvar, cluster_filter, is_held, frame, is_indexed, attr_name in half_attributes))
+    return states
+
+
+def build_mesh_track(app, stage, mesh_object, opt_attributes, usd_mesh, usd_mesh_prim, usd_mesh_primvar, material_to_usd, opt_anim, is_held=False, is_indexed=False, half_attributes=()):
+    '''return the pair of functions (sample(frame), finish()) for the single pass export of the animated mesh
+    sample(frame) writes the geometry, uvs, colors and weightmaps from the same geometry at the frame
+    finish() finishes writers and saves the stage
+    '''
+    attribute_writers = {}
+    attribute_states = []
 
+    def sample(frame):
+        xsi_polygonmesh = set_mesh_at_frame(app, stage, mesh_object, opt_attributes, usd_mesh, usd_mesh_prim, usd_mesh_primvar, False, material_to_usd, frame=frame, attribute_writers=attribute_writers, is_held=is_held, is_fused=True, half_attributes=half_attributes)
+        if frame == opt_anim[0]:
+            attribute_states.extend(export_begin_sample_attributes(xsi_polygonmesh, usd_mesh_primvar, opt_attributes, is_held, frame, is_indexed, half_attributes))
+        else:
+            for state in attribute_states:
+                export_sample_attribute(state, xsi_polygonmesh, frame)
+
+    def finish():
+        sampling.finish_writers(attribute_writers.values())
+        for state in attribute_states:
+            export_finish_sample_attribute(state)
+        stage.Save()
+
+    return sample, finish
 
-def export_set_colors(app, mesh_object, usd_mesh_primvar, opt_attributes, force_frame, opt_anim):
+
+def export_set_colors(app, mesh_object, usd_mesh_primvar, opt_attributes, force_frame, opt_anim, is_held=False, is_indexed=False, half_attributes=()):
     if "color" in opt_attributes:
-        export_set_sample_attribute(app, mesh_object, "vertexcolor", 3, usd_mesh_primvar, force_frame, opt_anim, "sample")
+        export_set_sample_attribute(app, mesh_object, "vertexcolor", 3, usd_mesh_primvar, force_frame, opt_anim, "sample", is_held, is_indexed, "color" in half_attributes)
 
 
-def export_set_uvs(app, mesh_object, usd_mesh_primvar, opt_attributes, force_frame, opt_anim):
+def export_set_uvs(app, mesh_object, usd_mesh_primvar, opt_attributes, force_frame, opt_anim, is_held=False, is_indexed=False, half_attributes=()):
     if "uvmap" in opt_attributes:
-        export_set_sample_attribute(app, mesh_object, "uvspace", 2, usd_mesh_primvar, force_frame, opt_anim, "sample")
+        export_set_sample_attribute(app, mesh_object, "uvspace", 2, usd_mesh_primvar, force_frame, opt_anim, "sample", is_held, is_indexed, "uvmap" in half_attributes)
 
 
-def export_set_weightmaps(app, mesh_object, usd_mesh_primvar, opt_attributes, force_frame, opt_anim):
+def export_set_weightmaps(app, mesh_object, usd_mesh_primvar, opt_attributes, force_frame, opt_anim, is_held=False):
     if "weightmap" in opt_attributes:
-        export_set_sample_attribute(app, mesh_object, "wtmap", 1, usd_mesh_primvar, force_frame, opt_anim, "pnt")
+        export_set_sample_attribute(app, mesh_object, "wtmap", 1, usd_mesh_primvar, force_frame, opt_anim, "pnt", is_held)
 
 
 def add_mesh(app, params, path_for_objects, stage, mesh_object, materials_opt, root_path, progress_bar=None):
@@ -279,6 +309,8 @@ def add_mesh(app, params, path_for_objects, stage, mesh_object, materials_opt, r
     if DEBUG_MODE:
         imp.reload(prim_xform)
         imp.reload(utils)
+        imp.reload(geometry_kernel)
+        imp.reload(sampling)
 
     opt_attributes = params["attr_list"]
     opt_animation = params.get("animation", None)
@@ -305,24 +337,37 @@ def add_mesh(app, params, path_for_objects, stage, mesh_object, materials_opt, r
         if utils.build_material_identifier(xsi_mat) in material_to_usd:
             UsdShade.MaterialBindingAPI(usd_mesh_prim).Bind(material_to_usd[utils.build_material_identifier(main_material)])
 
-    is_constant, is_deformed = utils.is_constant_topology(app, mesh_object, params.get("animation", None), opt.get("force_change_frame", False))
+    sample_cache = params.get("sample_cache", None)
+    is_held = opt.get("held_samples", False)  # write animated attributes only when they are changed
+    is_indexed = opt.get("indexed_primvars", False)  # write uvs and colors as indexed primvars
+    half_attributes = opt.get("half_precision", ())  # attributes, which are written with half precision
 
     if opt.get("use_subdiv", False):
         usd_mesh.CreateSubdivisionSchemeAttr().Set("catmullClark")
     else:
         usd_mesh.CreateSubdivisionSchemeAttr().Set("none")
-    if opt_animation is None or not is_deformed:
-        set_mesh_at_frame(app, ref_stage, mesh_object, opt_attributes, usd_mesh, usd_mesh_prim, usd_mesh_primvar, is_constant, material_to_usd)
+    if opt_animation is not None and opt.get("fused_sampling", False):
+        # one pass through frames, geometry, uvs, colors and weightmaps are read from the same geometry at each frame
+        # writers author time samples only for changed attributes, so the topology check is not needed
+        # the stage is saved, when the track is finished
+        sample_mesh, finish_mesh = build_mesh_track(app, ref_stage, mesh_object, opt_attributes, usd_mesh, usd_mesh_prim, usd_mesh_primvar, material_to_usd, opt_animation, is_held, is_indexed, half_attributes)
+        sampling.add_track(params, app, mesh_object, sample_mesh, finish_mesh, progress_bar)
     else:
-        for frame in range(opt_animation[0], opt_animation[1] + 1):
-            if progress_bar is not None:
-                progress_bar.Caption = utils.build_export_object_caption(mesh_object, frame)
-            set_mesh_at_frame(app, ref_stage, mesh_object, opt_attributes, usd_mesh, usd_mesh_prim, usd_mesh_primvar, is_constant, material_to_usd, frame=frame, force_frame=opt.get("force_change_frame", False))
-    # define attributes
-    export_set_uvs(app, mesh_object, usd_mesh_primvar, opt_attributes, opt.get("force_change_frame", False), opt_animation)
-    export_set_colors(app, mesh_object, usd_mesh_primvar, opt_attributes, opt.get("force_change_frame", False), opt_animation)
-    export_set_weightmaps(app, mesh_object, usd_mesh_primvar, opt_attributes, opt.get("force_change_frame", False), opt_animation)
-    ref_stage.Save()
+        is_constant, is_deformed = utils.is_constant_topology(app, mesh_object, params.get("animation", None), opt.get("force_change_frame", False), sample_cache)
+        if opt_animation is None or not is_deformed:
+            set_mesh_at_frame(app, ref_stage, mesh_object, opt_attributes, usd_mesh, usd_mesh_prim, usd_mesh_primvar, is_constant, material_to_usd, half_attributes=half_attributes)
+        else:
+            attribute_writers = {}
+            for frame in range(opt_animation[0], opt_animation[1] + 1):
+                if progress_bar is not None:
+                    progress_bar.Caption = utils.build_export_object_caption(mesh_object, frame)
+                set_mesh_at_frame(app, ref_stage, mesh_object, opt_attributes, usd_mesh, usd_mesh_prim, usd_mesh_primvar, is_constant, material_to_usd, frame=frame, force_frame=opt.get("force_change_frame", False), sample_cache=sample_cache, attribute_writers=attribute_writers, is_held=is_held, half_attributes=half_attributes)
+            sampling.finish_writers(attribute_writers.values())
+        # define attributes
+        export_set_uvs(app, mesh_object, usd_mesh_primvar, opt_attributes, opt.get("force_change_frame", False), opt_animation, is_held, is_indexed, half_attributes)
+        export_set_colors(app, mesh_object, usd_mesh_primvar, opt_attributes, opt.get("force_change_frame", False), opt_animation, is_held, is_indexed, half_attributes)
+        export_set_weightmaps(app, mesh_object, usd_mesh_primvar, opt_attributes, opt.get("force_change_frame", False), opt_animation, is_held)
+        ref_stage.Save()
 
     return stage.GetPrimAtPath(root_path + str(usd_xform.GetPath()))
 
@@ -337,29 +382,29 @@ def read_points(usd_mesh, up_axis, ignore_tfm):
     times = usd_points.GetTimeSamples()
     in_mesh_tfm = usd_mesh.GetLocalTransformation()  # get at fisrt frame, ignore the animation
     # in_mesh_tfm is a row-based matrix, the last row is position, the last column is 0, 0, 0, 1
-    is_tfm_nontrivial = utils.is_matrices_are_different_arrays(in_mesh_tfm, [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]])
+    is_tfm_nontrivial = geometry_kernel.is_matrices_are_different_arrays(in_mesh_tfm, geometry_kernel.IDENTITY_MATRIX)
     if ignore_tfm is False and is_tfm_nontrivial is False:
         ignore_tfm = True
-    sorted(times)
+    times = sorted(times)
     if len(times) <= 0:
         if ignore_tfm:
             tfm_positions = usd_points.Get()
         else:
-            tfm_positions = [utils.vector_mult_to_matrix(p, in_mesh_tfm) for p in usd_points.Get()]
+            tfm_positions = geometry_kernel.vectors_mult_to_matrix(usd_points.Get(), in_mesh_tfm)
         if up_axis == "Y":
-            to_return.append((0, tfm_positions))
+            to_return.append((0, geometry_kernel.to_list(tfm_positions)))
         else:  # convert each vertex positions, swap y and z coordinates
-            to_return.append((0, [(p[0], p[2], p[1]) for p in tfm_positions]))
+            to_return.append((0, geometry_kernel.to_list(geometry_kernel.swap_yz(tfm_positions))))
     else:
         for frame in times:
             if ignore_tfm:
                 points_at_frame = usd_points.Get(frame)
             else:
-                points_at_frame = [utils.vector_mult_to_matrix(p, in_mesh_tfm) for p in usd_points.Get(frame)]
+                points_at_frame = geometry_kernel.vectors_mult_to_matrix(usd_points.Get(frame), in_mesh_tfm)
             if up_axis == "Y":
-                to_return.append((frame, points_at_frame))
+                to_return.append((frame, geometry_kernel.to_list(points_at_frame)))
             else:
-                to_return.append((frame, [(p[0], p[2], p[1]) for p in points_at_frame]))
+                to_return.append((frame, geometry_kernel.to_list(geometry_kernel.swap_yz(points_at_frame))))
 
     return to_return
 
@@ -367,7 +412,7 @@ def read_points(usd_mesh, up_axis, ignore_tfm):
 def read_face_sizes(usd_mesh):
     usd_sizes = usd_mesh.GetFaceVertexCountsAttr()
     times = usd_sizes.GetTimeSamples()
-    sorted(times)
+    times = sorted(times)
     if len(times) <= 1:
         return [(0, usd_sizes.Get())]
     else:
@@ -382,7 +427,7 @@ def read_face_sizes(usd_mesh):
 def read_face_indexes(usd_mesh):
     usd_indexes = usd_mesh.GetFaceVertexIndicesAttr()
     times = usd_indexes.GetTimeSamples()
-    sorted(times)
+    times = sorted(times)
     if len(times) <= 1:
         return [(0, usd_indexes.Get())]
     else:
@@ -401,7 +446,7 @@ def read_edges_creases(usd_mesh):
     length_attr = usd_mesh.GetCreaseLengthsAttr()
     sharpness_attr = usd_mesh.GetCreaseSharpnessesAttr()
     times = indices_attr.GetTimeSamples()
-    sorted(times)
+    times = sorted(times)
     if indices_attr.IsAuthored() and length_attr.IsAuthored() and sharpness_attr.IsAuthored() and len(times) == len(length_attr.GetTimeSamples()) and len(times) == len(sharpness_attr.GetTimeSamples()):
         if len(times) <= 1:
             to_return.append((0, utils.collapse_usd_hard_edges_data(indices_attr.Get(), length_attr.Get(), sharpness_attr.Get())))
@@ -424,7 +469,7 @@ def read_vertex_creases(usd_mesh):
     sharpness_times = sharpness_attr.GetTimeSamples()
     if indexes_attr.IsAuthored() and sharpness_attr.IsAuthored() and len(indexes_times) == len(sharpness_times):
         times = indexes_times
-        sorted(times)
+        times = sorted(times)
         if len(times) <= 1:
             to_return.append((0, zip(indexes_attr.Get(), sharpness_attr.Get())))
         else:
@@ -436,32 +481,56 @@ def read_vertex_creases(usd_mesh):
 
 def read_normals(usd_mesh, up_axis, ignore_tfm):
     to_return = []
-    usd_normals = usd_mesh.GetNormalsAttr()
+    usd_normals, normals_interpolation = utils.get_normals_attribute(usd_mesh)
     times = usd_normals.GetTimeSamples()
     in_mesh_tfm = usd_mesh.GetLocalTransformation()
-    is_tfm_nontrivial = utils.is_matrices_are_different_arrays(in_mesh_tfm, [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]])
+    is_tfm_nontrivial = geometry_kernel.is_matrices_are_different_arrays(in_mesh_tfm, geometry_kernel.IDENTITY_MATRIX)
     if ignore_tfm is False and is_tfm_nontrivial is False:
         ignore_tfm = True
-    sorted(times)
+    times = sorted(times)
     if len(times) <= 1:
-        usd_normals_data = usd_normals.Get()
+        usd_normals_data = utils.get_float_values(usd_normals, None, 3)
         if usd_normals_data is not None:
             if ignore_tfm:
                 usd_normals_data_tfm = usd_normals_data
             else:
-                usd_normals_data_tfm = [utils.vector_mult_to_matrix(n, in_mesh_tfm, remove_translation=True) for n in usd_normals_data]
-            to_return.append((0, usd_normals_data_tfm if up_axis == "Y" else [(n[0], n[2], n[1]) for n in usd_normals_data_tfm]))
+                usd_normals_data_tfm = geometry_kernel.vectors_mult_to_matrix(usd_normals_data, in_mesh_tfm, remove_translation=True)
+            to_return.append((0, geometry_kernel.to_list(usd_normals_data_tfm if up_axis == "Y" else geometry_kernel.swap_yz(usd_normals_data_tfm))))
     else:
         for frame in times:
-            vals_at_frame = usd_normals.Get(frame)
+            vals_at_frame = utils.get_float_values(usd_normals, frame, 3)
             if vals_at_frame is not None:
                 if ignore_tfm:
                     vals_at_frame_tfm = vals_at_frame
                 else:
-                    vals_at_frame_tfm = [utils.vector_mult_to_matrix(n, in_mesh_tfm, remove_translation=True) for n in vals_at_frame]
-                to_return.append((frame, vals_at_frame_tfm if up_axis == "Y" else [(n[0], n[2], n[1]) for n in vals_at_frame_tfm]))
+                    vals_at_frame_tfm = geometry_kernel.vectors_mult_to_matrix(vals_at_frame, in_mesh_tfm, remove_translation=True)
+                to_return.append((frame, geometry_kernel.to_list(vals_at_frame_tfm if up_axis == "Y" else geometry_kernel.swap_yz(vals_at_frame_tfm))))
 
-    return to_return, usd_mesh.GetNormalsInterpolation()
+    return to_return, normals_interpolation
+
+
+def read_primvar_data(primvar, dimension=1):
+    '''return the pair (indexes, data), where data is an array [(frame1, data1), (frame2, data2), ...]
+    indexes is None for not indexed primvars
+    if indexes of the indexed primvar are animated, then data contains flattened values at each frame and indexes is None
+    half precision values are converted to floats
+    '''
+    times = sorted(primvar.GetTimeSamples())
+    is_indexed = primvar.IsIndexed()
+    is_half = utils.is_half_type(primvar.GetTypeName())
+    if is_indexed and primvar.GetIndicesAttr().GetNumTimeSamples() > 1:
+        data = [(frame, primvar.ComputeFlattened(frame)) for frame in times]
+        indexes = None
+    else:
+        attribute = primvar.GetAttr()
+        if len(times) <= 1:
+            data = [(0, attribute.Get())]
+        else:
+            data = [(frame, attribute.Get(frame)) for frame in times]
+        indexes = primvar.GetIndices() if is_indexed else None
+    if is_half:
+        data = [(frame, None if values is None else geometry_kernel.to_list(geometry_kernel.widen_half_array(values, dimension))) for frame, values in data]
+    return indexes, data
 
 
 def read_uvs(usd_mesh):
@@ -472,22 +541,10 @@ def read_uvs(usd_mesh):
     for p in primvars:
         type_strings = p.GetTypeName().aliasesAsStrings
         interpolation = p.GetInterpolation()
-        if ("texCoord2f[]" in type_strings or "float2[]" in type_strings) and (interpolation == "faceVarying" or interpolation == "vertex"):
+        if utils.is_type_in(type_strings, utils.UV_TYPE_NAMES) and (interpolation == "faceVarying" or interpolation == "vertex"):
             # this is uv primvar
-            uv_data = []
-            uv_name = p.GetBaseName()
-            uv_time = p.GetTimeSamples()
-            sorted(uv_time)
-            uv_attribute = p.GetAttr()
-            if len(uv_time) <= 1:
-                uv_data.append((0, uv_attribute.Get()))
-            else:
-                for frame in uv_time:
-                    uv_data.append((frame, uv_attribute.Get(frame)))
-            indexes = None
-            if p.IsIndexed():
-                indexes = p.GetIndices()
-            to_return.append((uv_name, interpolation, indexes, uv_data))
+            indexes, uv_data = read_primvar_data(p, 2)
+            to_return.append((p.GetBaseName(), interpolation, indexes, uv_data))
 
     return to_return
 
@@ -498,22 +555,10 @@ def read_vertex_colors(usd_mesh):
     for p in primvars:
         type_strings = p.GetTypeName().aliasesAsStrings
         interpolation = p.GetInterpolation()
-        if "color3f[]" in type_strings and (interpolation == "faceVarying" or interpolation == "vertex"):
+        if utils.is_type_in(type_strings, utils.COLOR_TYPE_NAMES) and (interpolation == "faceVarying" or interpolation == "vertex"):
             # vertex colors are only face-varuing
-            color_data = []
-            color_name = p.GetBaseName()
-            color_time = p.GetTimeSamples()
-            sorted(color_time)
-            color_attribute = p.GetAttr()
-            if len(color_time) <= 1:
-                color_data.append((0, color_attribute.Get()))
-            else:
-                for frame in color_time:
-                    color_data.append((frame, color_attribute.Get(frame)))
-            indices = None
-            if p.IsIndexed():
-                indices = p.GetIndices()
-            to_return.append((color_name, interpolation, indices, color_data))
+            indices, color_data = read_primvar_data(p, 3)
+            to_return.append((p.GetBaseName(), interpolation, indices, color_data))
 
     return to_return
 
@@ -528,20 +573,8 @@ def read_weightmaps(usd_mesh):
         interpolation = p.GetInterpolation()
         if interpolation == "vertex" and "float[]" in type_strings:
             # weightmaps only per-vertex and has float values
-            weight_data = []
-            weight_name = p.GetBaseName()
-            weight_time = p.GetTimeSamples()
-            sorted(weight_time)
-            weight_attr = p.GetAttr()
-            if len(weight_time) <= 1:
-                weight_data.append((0, weight_attr.Get()))
-            else:
-                for frame in weight_time:
-                    weight_data.append((frame, weight_attr.Get(frame)))
-            indices = None
-            if p.IsIndexed():
-                indices = p.GetIndices()
-            to_return.append((weight_name, interpolation, indices, weight_data))
+            indices, weight_data = read_primvar_data(p)
+            to_return.append((p.GetBaseName(), interpolation, indices, weight_data))
     return to_return
 
 
@@ -579,24 +612,38 @@ def read_mesh_data(mesh_options, data_dict, file_path=None, mesh_path=None, usd_
         # we should get data of all attributes from usd_mesh and save it to data_dict by different keys
         # animated format is the following: it is an array of tuples [(frame, data at frame), ...]
         # if there is only one frame (or zero), then data is an one-element array [(0, data)]
-        data_dict["points"] = read_points(usd_mesh, mesh_options["up_axis"], mesh_options["ignore_inmesh_tfm"])
-        data_dict["face_sizes"] = read_face_sizes(usd_mesh)
-        data_dict["face_indexes"] = read_face_indexes(usd_mesh)
+        # collect data in the python dictionary, because data_dict can be the XSI dictionary, and reading from it converts all arrays
+        mesh_data = {}
+        mesh_data["points"] = read_points(usd_mesh, mesh_options["up_axis"], mesh_options["ignore_inmesh_tfm"])
+        mesh_data["face_sizes"] = read_face_sizes(usd_mesh)
+        mesh_data["face_indexes"] = read_face_indexes(usd_mesh)
         attrs = mesh_options.get("attributes", [])
         if "normal" in attrs:
-            data_dict["normals"], data_dict["normals_interpolation"] = read_normals(usd_mesh, mesh_options["up_axis"], mesh_options["ignore_inmesh_tfm"])
+            mesh_data["normals"], mesh_data["normals_interpolation"] = read_normals(usd_mesh, mesh_options["up_axis"], mesh_options["ignore_inmesh_tfm"])
         if "uvmap" in attrs:
-            data_dict["uvs"] = read_uvs(usd_mesh)
+            mesh_data["uvs"] = read_uvs(usd_mesh)
         if "color" in attrs:
-            data_dict["colors"] = read_vertex_colors(usd_mesh)
+            mesh_data["colors"] = read_vertex_colors(usd_mesh)
         if "weightmap" in attrs:
-            data_dict["weightmaps"] = read_weightmaps(usd_mesh)
+            mesh_data["weightmaps"] = read_weightmaps(usd_mesh)
         if "vertex_creases" in attrs:
-            data_dict["vertex_creases"] = read_vertex_creases(usd_mesh)
+            mesh_data["vertex_creases"] = read_vertex_creases(usd_mesh)
         if "edge_creases" in attrs:
-            data_dict["edge_creases"] = read_edges_creases(usd_mesh)
+            mesh_data["edge_creases"] = read_edges_creases(usd_mesh)
         if "cluster" in attrs:
-            data_dict["cluster"] = read_clusters(usd_mesh)
+            mesh_data["cluster"] = read_clusters(usd_mesh)
+        # sorted union of frames of all animated attributes, it allows to find the sample at frame once for all attributes
+        animated_arrays = [mesh_data[key] for key in ["points", "face_sizes", "face_indexes", "normals", "vertex_creases", "edge_creases"] if key in mesh_data]
+        for key in ["uvs", "colors", "weightmaps"]:
+            if key in mesh_data:
+                animated_arrays.extend(d[3] for d in mesh_data[key])
+        mesh_data["time_table"] = utils.build_time_table(animated_arrays)
+        if file_path is not None and mesh_path is not None:
+            # the file may be changed, so forget polygons, built from the previous data
+            xsi_faces_cache.release((file_path, mesh_path))
+
+        for key, value in mesh_data.items():
+            data_dict[key] = value
 
 
 def setup_normals_cluster(app, xsi_geometry):
@@ -640,11 +687,11 @@ def import_set_samples_from_vertices(xsi_property, xsi_geometry, data):
         for n in v.Nodes:
             xsi_data[n.Index] = data[v.Index]
     if data_size == 3:
-        xsi_data = utils.transpose_vectors_array(xsi_data)  # transpose array
+        xsi_data = geometry_kernel.to_list(geometry_kernel.transpose_vectors_array(xsi_data))  # transpose array
         # set values to cluster
         xsi_property.Elements.Array = ([tuple(xsi_data[0]), tuple(xsi_data[1]), tuple(xsi_data[2])])
     elif data_size == 2:
-        xsi_data = utils.transpose_2vectors_array(xsi_data)
+        xsi_data = geometry_kernel.to_list(geometry_kernel.transpose_2vectors_array(xsi_data))
         xsi_property.Elements.Array = ([tuple(xsi_data[0]), tuple(xsi_data[1])])
 
 
@@ -667,25 +714,28 @@ def import_setup_normals(app, normals, normals_interpolation, xsi_geometry, is_t
             new_normals_prop = app.AddProp("User Normal Property", normals_cls.FullName, constants.siDefaultPropagation, normal_name)
             normals_prop = new_normals_prop[1][0]
         if normals_interpolation == "faceVarying":
-            xsi_normals = utils.transpose_vectors_array(normals)
+            xsi_normals = geometry_kernel.to_list(geometry_kernel.transpose_vectors_array(normals))
             normals_prop.Elements.Array = ([tuple(xsi_normals[0]), tuple(xsi_normals[1]), tuple(xsi_normals[2])])
         elif normals_interpolation == "vertex":
             import_set_samples_from_vertices(normals_prop, xsi_geometry, normals)
 
 
-def import_setup_uvs(app, xsi_geometry, uvs_data, is_dynamic, is_topology_change, frame=None):
+def import_setup_uvs(app, xsi_geometry, uvs_data, is_dynamic, is_topology_change, frame=None, frame_index=None):
     '''uv_data contains the tuples of 4 elements
     0 - name
     1 - interpolation (vertex of faceVatying)
     2 - indices
     3 - array of the form [(frame, data-in-frame), ...]
+    frame_index is created by utils.build_frame_index, if it is None, then it is created for the frame
     '''
+    if frame_index is None:
+        frame_index = utils.build_frame_index(None, 0 if frame is None else frame)
     uvs_cls = setup_uvs_cluster(app, xsi_geometry)
     for uv_data in uvs_data:
         if (is_dynamic and len(uv_data[3]) > 1) or (not is_dynamic and len(uv_data[3]) == 1):
             uv_name = uv_data[0]
             uv_interpolation = uv_data[1]
-            uv_coordinates = utils.get_closest_data(uv_data[3], 0 if frame is None else frame)
+            uv_coordinates = utils.get_data_at_frame_index(uv_data[3], frame_index)
             uv_coordinates = import_apply_indices_to_data(uv_coordinates, uv_data[2])
             find_path = xsi_geometry.Parent.FullName + ".cls." + "UVCoordinates." + uv_name
             uv_prop = app.Dictionary.GetObject(find_path, False)
@@ -693,14 +743,16 @@ def import_setup_uvs(app, xsi_geometry, uvs_data, is_dynamic, is_topology_change
                 new_uv_prop = app.AddProp("Texture Projection", uvs_cls.FullName, constants.siDefaultPropagation, uv_name)
                 uv_prop = new_uv_prop[1][0]
             if uv_interpolation == "faceVarying":
-                uv_array = utils.transpose_2vectors_array(uv_coordinates)
+                uv_array = geometry_kernel.to_list(geometry_kernel.transpose_2vectors_array(uv_coordinates))
                 if len(uv_prop.Elements.Array[0]) > 0:  # sometimes  this array is not inicialidex and equal ((), (), ())
                     uv_prop.Elements.Array = tuple([tuple(uv_array[0]), tuple(uv_array[1]), tuple([0]*len(uv_array[0]))])
             elif uv_interpolation == "vertex":
                 import_set_samples_from_vertices(uv_prop, xsi_geometry, uv_coordinates)
 
 
-def import_set_colors(app, xsi_geometry, colors_data, is_dynamic, is_topology_change, frame=None):
+def import_set_colors(app, xsi_geometry, colors_data, is_dynamic, is_topology_change, frame=None, frame_index=None):
+    if frame_index is None:
+        frame_index = utils.build_frame_index(None, 0 if frame is None else frame)
     colors_cls = setup_colors_cluster(app, xsi_geometry)
     for color_data in colors_data:
         # each color_data is a tuple of four elements:
@@ -711,7 +763,7 @@ def import_set_colors(app, xsi_geometry, colors_data, is_dynamic, is_topology_ch
         if (is_dynamic and len(color_data[3]) > 1) or (not is_dynamic and len(color_data[3]) == 1):
             color_name = color_data[0]
             color_interpolation = color_data[1]
-            colors = utils.get_closest_data(color_data[3], 0 if frame is None else frame)
+            colors = utils.get_data_at_frame_index(color_data[3], frame_index)
             colors = import_apply_indices_to_data(colors, color_data[2])
             find_path = xsi_geometry.Parent.FullName + ".cls." + "VertexColors." + color_name
             color_prop = app.Dictionary.GetObject(find_path, False)
@@ -720,7 +772,7 @@ def import_set_colors(app, xsi_geometry, colors_data, is_dynamic, is_topology_ch
                 color_prop = new_colors_prop[1][0]
             if len(color_prop.Elements.Array[0]) > 0:
                 if color_interpolation == "faceVarying":
-                    colors_array = utils.transpose_vectors_array(colors)
+                    colors_array = geometry_kernel.to_list(geometry_kernel.transpose_vectors_array(colors))
                     color_prop.Elements.Array = tuple([tuple(colors_array[0]), tuple(colors_array[1]), tuple(colors_array[2])])
                 elif color_interpolation == "vertex":
                     # for vertex data we should convert it to samples
@@ -728,14 +780,16 @@ def import_set_colors(app, xsi_geometry, colors_data, is_dynamic, is_topology_ch
                     import_set_samples_from_vertices(color_prop, xsi_geometry, colors)
 
 
-def import_set_weightmaps(app, xsi_geometry, weights_data, is_dynamic, is_topology_change, frame=None):
+def import_set_weightmaps(app, xsi_geometry, weights_data, is_dynamic, is_topology_change, frame=None, frame_index=None):
+    if frame_index is None:
+        frame_index = utils.build_frame_index(None, 0 if frame is None else frame)
     # we supports only per-vertex weight maps, so here we assign only primvars with "vertex" interpolation
     weight_cls = setup_weights_cluster(app, xsi_geometry)
     for weight_data in weights_data:
         if (is_dynamic and len(weight_data[3]) > 1) or (not is_dynamic and len(weight_data[3]) == 1):
             weight_name = weight_data[0]
             weight_interpolation = weight_data[1]
-            weights = utils.get_closest_data(weight_data[3], 0 if frame is None else frame)
+            weights = utils.get_data_at_frame_index(weight_data[3], frame_index)
             weights = import_apply_indices_to_data(weights, weight_data[2])
             find_path = xsi_geometry.Parent.FullName + ".cls." + "WeightMapCls." + weight_name
             w_prop = app.Dictionary.GetObject(find_path, False)
@@ -747,15 +801,28 @@ def import_set_weightmaps(app, xsi_geometry, weights_data, is_dynamic, is_topolo
                     w_prop.Elements.Array = tuple([w for w in weights])
 
 
+def get_xsi_faces_array(mesh_options, face_indexes, face_sizes, sample_key):
+    '''return polygons array for Geometry.Set()
+    if mesh_options contains file_path and mesh_path (the mesh is updated by the operator), then the array is cached for each time sample
+    '''
+    file_path = mesh_options.get("file_path", None)
+    mesh_path = mesh_options.get("mesh_path", None)
+    if file_path is None or mesh_path is None:
+        return geometry_kernel.to_list(geometry_kernel.build_xsi_faces_array(face_indexes, face_sizes))
+    return xsi_faces_cache.sample((file_path, mesh_path), "faces", sample_key, lambda: geometry_kernel.to_list(geometry_kernel.build_xsi_faces_array(face_indexes, face_sizes)))
+
+
 def set_geometry_from_data(app, xsi_geometry, mesh_options, mesh_data, frame=None):
     # mesh_options contains keys: attributes, is_topology_change
     # this method calls every frame from operator update (or at once, if the mesh is constructed without operator)
     # it use data, stored in mesh_data user data inside operator
     attrs = mesh_options["attributes"]
     xsi_vertex_count = xsi_geometry.Vertices.Count
+    # find the closest sample in the time table once, all attributes with the same frames use it
+    frame_index = utils.build_frame_index(utils.get_in_dict(mesh_data, "time_table"), 0 if frame is None else frame)
     points_data = mesh_data["points"]
-    points = utils.get_closest_data(points_data, frame)
-    xsi_points_postions = utils.transpose_vectors_array(points)  # convert to xsi-specific format
+    points = utils.get_data_at_frame_index(points_data, frame_index)
+    xsi_points_postions = geometry_kernel.to_list(geometry_kernel.transpose_vectors_array(points))  # convert to xsi-specific format
 
     is_topology_change = mesh_options["is_topology_change"]
 
@@ -770,11 +837,12 @@ def set_geometry_from_data(app, xsi_geometry, mesh_options, mesh_data, frame=Non
         face_size_data = mesh_data["face_sizes"]
         face_indexes_data = mesh_data["face_indexes"]
         # find points closest to the frame
-        face_size = utils.get_closest_data(face_size_data, frame)
-        face_indexes = utils.get_closest_data(face_indexes_data, frame)
+        face_size = utils.get_data_at_frame_index(face_size_data, frame_index)
+        face_indexes = utils.get_data_at_frame_index(face_indexes_data, frame_index)
 
         if len(face_indexes) > 0 and len(face_size) > 0:  # create mesh only if it exists
-            xsi_geometry.Set(xsi_points_postions, utils.usd_to_xsi_faces_array(face_indexes, face_size, mesh_options["up_axis"]))
+            faces_sample_key = (utils.get_time_at_frame_index(face_size_data, frame_index), utils.get_time_at_frame_index(face_indexes_data, frame_index))
+            xsi_geometry.Set(xsi_points_postions, get_xsi_faces_array(mesh_options, face_indexes, face_size, faces_sample_key))
 
             if mesh_options["up_axis"] is "Z":
                 app.ApplyTopoOp("InvertPolygon", xsi_geometry.Parent.Parent.Name, constants.siUnspecified, constants.siPersistentOperation)
@@ -787,12 +855,12 @@ def set_geometry_from_data(app, xsi_geometry, mesh_options, mesh_data, frame=Non
                         xsi_cluster = xsi_geometry.AddCluster(constants.siPolygonCluster, cluster_data[0], cluster_data[1])
                         if mesh_options["assign_material"]:
                             if cluster_data[2].GetPath() != "":
-                                xsi_material = materials.import_material(app, cluster_data[2], library_name=mesh_options["material_library"])
+                                xsi_material = materials.import_material(app, cluster_data[2], library_name=mesh_options["material_library"], index=mesh_options.get("materials_index", None))
                                 # assign material to the cluster
                                 app.AssignMaterial(xsi_material.FullName + "," + xsi_cluster.FullName)
 
                 if "normal" in attrs and normals_data is not None and len(normals_data) == 1:
-                    normals = utils.get_closest_data(normals_data, 0 if frame is None else frame)  # array of vector coordinates
+                    normals = utils.get_data_at_frame_index(normals_data, frame_index)  # array of vector coordinates
                     import_setup_normals(app, normals, normals_interpolation, xsi_geometry, is_topology_change)
 
                 if "uvmap" in attrs and uvs_data is not None and len(uvs_data) > 0:
@@ -807,21 +875,11 @@ def set_geometry_from_data(app, xsi_geometry, mesh_options, mesh_data, frame=Non
                 # creases import only at one frame, because at other frames it creates too many crese operator
                 vertex_creases_data = utils.get_in_dict(mesh_data, "vertex_creases")
                 if "vertex_creases" in attrs and vertex_creases_data is not None and len(vertex_creases_data) > 0:
-                    vertex_creases = utils.get_closest_data(vertex_creases_data, 0 if frame is None else frame)  # array of the pairs (index, value)
-                    vertices = xsi_geometry.Vertices
+                    vertex_creases = utils.get_data_at_frame_index(vertex_creases_data, frame_index)  # array of the pairs (index, value)
+                    vertex_count = xsi_geometry.Vertices.Count
                     name_prefix = utils.remove_last_part(xsi_geometry.Parent.FullName) + ".pnt"
-                    creases_dict = {}
-                    for vert in vertices:
-                        data_index = utils.get_index_in_array_for_value(vertex_creases, vert.Index)
-                        if data_index is not None:
-                            crease_value = vertex_creases[data_index][1]
-                            is_find = False
-                            for crease_key in creases_dict.keys():
-                                if abs(crease_key - crease_value) < 0.01:
-                                    is_find = True
-                                    creases_dict[crease_key].append(vert.Index)
-                            if not is_find:
-                                creases_dict[crease_value] = [vert.Index]
+                    creases_index = utils.build_vertex_creases_index(vertex_creases)
+                    creases_dict = utils.group_by_crease_value((v, creases_index[v]) for v in sorted(creases_index.keys()) if 0 <= v < vertex_count)
                     for crease_key in creases_dict.keys():
                         a = creases_dict[crease_key]
                         if len(a) > 0:
@@ -830,26 +888,20 @@ def set_geometry_from_data(app, xsi_geometry, mesh_options, mesh_data, frame=Non
 
                 edge_creases_data = utils.get_in_dict(mesh_data, "edge_creases")
                 if "edge_creases" in attrs and edge_creases_data is not None and len(edge_creases_data) > 0:
-                    edges_creases = utils.get_closest_data(edge_creases_data, 0 if frame is None else frame)  # array of triplets [(s, e, value), ...]
+                    edges_creases = utils.get_data_at_frame_index(edge_creases_data, frame_index)  # array of triplets [(s, e, value), ...]
                     mesh_edges = xsi_geometry.Edges
                     name_prefix = utils.remove_last_part(xsi_geometry.Parent.FullName) + ".edge"
                     # set crease value to each edge separatly
-                    creases_dict = {}  # store edge indexes for different values (epsilon = 0.001)
+                    creases_index = utils.build_edge_creases_index(edges_creases)
+                    edges_data = []  # pairs (edge index, crease value)
                     for edge in mesh_edges:
                         edge_verts = edge.Vertices
                         v0 = edge_verts[0].Index
                         v1 = edge_verts[1].Index
-                        data_index = utils.get_index_in_array_for_pair(edges_creases, v0, v1)
-                        if data_index is not None:
-                            crease_value = edges_creases[data_index][2]
-                            # find in the dict
-                            is_find = False
-                            for crease_key in creases_dict.keys():
-                                if abs(crease_key - crease_value) < 0.01:
-                                    is_find = True
-                                    creases_dict[crease_key].append(edge.Index)
-                            if not is_find:
-                                creases_dict[crease_value] = [edge.Index]
+                        crease_value = creases_index.get((v0, v1) if v0 <= v1 else (v1, v0))
+                        if crease_value is not None:
+                            edges_data.append((edge.Index, crease_value))
+                    creases_dict = utils.group_by_crease_value(edges_data)  # store edge indexes for different values (epsilon = 0.01)
                     # apply crease operator for each array in the dict
                     for crease_key in creases_dict.keys():
                         a = creases_dict[crease_key]
@@ -863,17 +915,17 @@ def set_geometry_from_data(app, xsi_geometry, mesh_options, mesh_data, frame=Non
     if not is_topology_change:
         # next setup all other dynamic attributes
         if "normal" in attrs and normals_data is not None and len(normals_data) > 1:
-            normals = utils.get_closest_data(normals_data, 0 if frame is None else frame)  # array of vector coordinates
+            normals = utils.get_data_at_frame_index(normals_data, frame_index)  # array of vector coordinates
             import_setup_normals(app, normals, normals_interpolation, xsi_geometry, is_topology_change)
 
         if "uvmap" in attrs and uvs_data is not None and len(uvs_data) > 0:
-            import_setup_uvs(app, xsi_geometry, uvs_data, True, is_topology_change, frame=frame)
+            import_setup_uvs(app, xsi_geometry, uvs_data, True, is_topology_change, frame=frame, frame_index=frame_index)
 
         if "color" in attrs and colors_data is not None and len(colors_data) > 0:  # do it only if at least one vertex colors are exists
-            import_set_colors(app, xsi_geometry, colors_data, True, is_topology_change, frame=frame)
+            import_set_colors(app, xsi_geometry, colors_data, True, is_topology_change, frame=frame, frame_index=frame_index)
 
         if "weightmap" in attrs and weightmaps_data is not None and len(weightmaps_data) > 0:
-            import_set_weightmaps(app, xsi_geometry, weightmaps_data, True, is_topology_change, frame=frame)
+            import_set_weightmaps(app, xsi_geometry, weightmaps_data, True, is_topology_change, frame=frame, frame_index=frame_index)
 
 
 def emit_mesh(app, options, mesh_name, usd_tfm, visibility, usd_prim, xsi_parent, is_simple=False):
@@ -881,6 +933,7 @@ def emit_mesh(app, options, mesh_name, usd_tfm, visibility, usd_prim, xsi_parent
     '''
     if DEBUG_MODE:
         imp.reload(utils)
+        imp.reload(geometry_kernel)
         imp.reload(materials)
 
     usd_mesh = UsdGeom.Mesh(usd_prim)
@@ -890,7 +943,7 @@ def emit_mesh(app, options, mesh_name, usd_tfm, visibility, usd_prim, xsi_parent
 
     if options.get("is_materials", False):
         usd_material = UsdShade.MaterialBindingAPI(usd_prim).GetDirectBinding().GetMaterial()
-        xsi_material = materials.import_material(app, usd_material, library_name=options["file_name"])
+        xsi_material = materials.import_material(app, usd_material, library_name=options["file_name"], index=options.get("materials_index", None))
         if xsi_material is not None:
             app.AssignMaterial(xsi_material.FullName + "," + xsi_mesh.FullName)
 
@@ -905,7 +958,8 @@ def emit_mesh(app, options, mesh_name, usd_tfm, visibility, usd_prim, xsi_parent
                     "up_axis": options["up_axis"],
                     "ignore_inmesh_tfm": is_simple,
                     "assign_material": options.get("is_materials", False),
-                    "material_library": options["file_name"]}  # name of the library with imported materials
+                    "material_library": options["file_name"],  # name of the library with imported materials
+                    "materials_index": options.get("materials_index", None)}
     if not is_animated:
         # simply apply geometry
         mesh_options["is_topology_change"] = False
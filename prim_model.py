@@ -19,3 +19,9 @@ def add_model(app, params, path_for_objects, stage, model_object, materials_opt,
     # change path in materials_opt, add new ..
     for obj in model_object.Children:
         export_processor.export_step(app, params, model_path_for_objects, ref_stage, obj, model_objects, materials_opt, "/" + model_object.Name)
+    scheduler = params.get("scheduler", None)
+    if scheduler is not None:
+        # animated children are sampled by the scheduler later, so the track keeps the stage of the model and saves it after them
+        scheduler.add_track(model_object, None, ref_stage.Save)
+    else:
+        ref_stage.Save()
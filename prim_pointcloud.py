@@ -1,33 +1,58 @@
 from pxr import UsdGeom, Usd, Sdf, UsdShade
 import os
+import array
+import hashlib
+import json
 import icecache
 import prim_xform
 import materials
 import utils
+import geometry_kernel
+import sampling
 import imp
 
 DEBUG_MODE = False
+ICE_CACHE_MANIFEST_VERSION = 1  # increase it when the format of written icecache files is changed
 
 # ---------------------------------------------------------
 # ----------------------export-----------------------------
 
 
-def set_pointcloud_at_frame(pointcloud_geometry, usd_pointcloud, usd_points_prim, frame=None):
-    xsi_pp = pointcloud_geometry.GetICEAttributeFromName("PointPosition")
-    xsi_size = pointcloud_geometry.GetICEAttributeFromName("Size")
+def build_pointcloud_data(pointcloud_sample):
+    '''convert the result of utils.read_pointcloud_sample() to the pair (points, widths)
+    '''
+    data_points, xsi_size_data, _ = pointcloud_sample
+    data_width = []
 
-    xsi_pp_data = xsi_pp.DataArray
-    xsi_size_data = xsi_size.DataArray
+    for index in range(len(data_points)):
+        data_width.append(xsi_size_data[index] if index < len(xsi_size_data) else 0.0)
+    return data_points, data_width
 
-    usd_points = usd_pointcloud.CreatePointsAttr()
-    usd_width = usd_pointcloud.CreateWidthsAttr()
 
-    data_points = []
-    data_width = []
+def build_pointcloud_writers(usd_pointcloud, usd_points_prim, is_half_widths=False):
+    '''return the list of FusedSampleWriter objects for points, widths and extent
+    '''
+    return [sampling.build_array_writer(usd_pointcloud.CreatePointsAttr(), 3, is_distance=True, tolerance=utils.EPSILON**2),
+            sampling.build_array_writer(utils.create_widths_attribute(usd_pointcloud, is_half_widths)),
+            sampling.build_array_writer(usd_points_prim.CreateAttribute("extent", Sdf.ValueTypeNames.Float3Array), 3)]
 
-    for index in range(len(xsi_pp_data)):
-        data_points.append(utils.vector_to_tuple(xsi_pp_data[index]))
-        data_width.append(xsi_size_data[index] if index < len(xsi_size_data) else 0.0)
+
+def add_pointcloud_sample(pointcloud_writers, frame, pointcloud_sample):
+    points_writer, width_writer, extent_writer = pointcloud_writers
+    data_points, data_width = build_pointcloud_data(pointcloud_sample)
+    points_writer.add(frame, data_points)
+    width_writer.add(frame, data_width)
+    extent_writer.add(frame, geometry_kernel.get_bounding_box(data_points))
+
+
+def set_pointcloud_at_frame(pointcloud_geometry, usd_pointcloud, usd_points_prim, frame=None, pointcloud_sample=None, is_half_widths=False):
+    if pointcloud_sample is None:
+        pointcloud_sample = utils.read_pointcloud_geometry(pointcloud_geometry)
+
+    usd_points = usd_pointcloud.CreatePointsAttr()
+    usd_width = utils.create_widths_attribute(usd_pointcloud, is_half_widths)
+
+    data_points, data_width = build_pointcloud_data(pointcloud_sample)
 
     if frame is None:
         usd_points.Set(data_points)
@@ -39,9 +64,9 @@ def set_pointcloud_at_frame(pointcloud_geometry, usd_pointcloud, usd_points_prim
     # set bounding box
     usd_extent = usd_points_prim.CreateAttribute("extent", Sdf.ValueTypeNames.Float3Array)
     if frame is None:
-        usd_extent.Set(utils.get_bounding_box(data_points))
+        usd_extent.Set(geometry_kernel.get_bounding_box(data_points))
     else:
-        usd_extent.Set(utils.get_bounding_box(data_points), Usd.TimeCode(frame))
+        usd_extent.Set(geometry_kernel.get_bounding_box(data_points), Usd.TimeCode(frame))
 
 
 def add_pointcloud(app, params, path_for_objects, stage, pointcloud_object, materials_opt, root_path, progress_bar=None):
@@ -49,6 +74,8 @@ def add_pointcloud(app, params, path_for_objects, stage, pointcloud_object, mate
         imp.reload(prim_xform)
         imp.reload(materials)
         imp.reload(utils)
+        imp.reload(geometry_kernel)
+        imp.reload(sampling)
 
     opt_animation = params.get("animation", None)
     usd_xform, ref_stage, ref_stage_asset = prim_xform.add_xform(app, params, path_for_objects, True, stage, pointcloud_object, root_path)
@@ -57,9 +84,17 @@ def add_pointcloud(app, params, path_for_objects, stage, pointcloud_object, mate
 
     materials.add_material(materials_opt, pointcloud_object.Material, ref_stage, ref_stage_asset, usd_xform, usd_points_prim)
     opt = params.get("options", {})
-
-    if opt_animation is None or not utils.is_poincloud_animated(pointcloud_object, opt_animation):
-        set_pointcloud_at_frame(pointcloud_object.GetActivePrimitive3().Geometry, usd_points, usd_points_prim)
+    # the animation check does not change frames, so sampled values can not be reused, when frames should be changed during the export
+    sample_cache = None if opt.get("force_change_frame", False) else params.get("sample_cache", None)
+    kind = utils.get_pointcloud_sample_kind(False)
+    is_half_widths = "width" in opt.get("half_precision", ())
+
+    if opt_animation is not None and opt.get("fused_sampling", False):
+        # frames are changed by the scheduler, the stage is saved, when the track is finished
+        pointcloud_writers = build_pointcloud_writers(usd_points, usd_points_prim, is_half_widths)
+        sampling.add_track(params, app, pointcloud_object, lambda frame: add_pointcloud_sample(pointcloud_writers, frame, utils.read_pointcloud_sample(pointcloud_object, frame)), ref_stage.Save, progress_bar)
+    elif opt_animation is None or not utils.is_poincloud_animated(pointcloud_object, opt_animation, sample_cache=sample_cache):
+        set_pointcloud_at_frame(None, usd_points, usd_points_prim, pointcloud_sample=sampling.read_sample(sample_cache, pointcloud_object.ObjectID, kind, None, lambda: utils.read_pointcloud_sample(pointcloud_object)), is_half_widths=is_half_widths)
     else:
         for frame in range(opt_animation[0], opt_animation[1] + 1):
             if progress_bar is not None:
@@ -67,7 +102,7 @@ def add_pointcloud(app, params, path_for_objects, stage, pointcloud_object, mate
             if opt.get("force_change_frame", False):
                 app.SetValue("PlayControl.Current", frame, "")
                 app.SetValue("PlayControl.Key", frame, "")
-            set_pointcloud_at_frame(pointcloud_object.GetActivePrimitive3(frame).GetGeometry3(frame), usd_points, usd_points_prim, frame=frame)
+            set_pointcloud_at_frame(None, usd_points, usd_points_prim, frame, sampling.read_sample(sample_cache, pointcloud_object.ObjectID, kind, frame, lambda: utils.read_pointcloud_sample(pointcloud_object, frame)), is_half_widths)
 
     return stage.GetPrimAtPath(root_path + str(usd_xform.GetPath()))
 
@@ -76,54 +111,141 @@ def add_pointcloud(app, params, path_for_objects, stage, pointcloud_object, mate
 # ----------------------import-----------------------------
 
 
-def split_positions_to_strands_and_points(raw_positions, segment_length):
-    strands = []
-    points = []
-    current_strand = 0
-    in_strand_index = 0
-    one_strand = []
-    for pos in raw_positions:
-        if in_strand_index == 0:
-            points.append([pos[0], pos[1], pos[2]])
-        else:
-            one_strand.append([pos[0], pos[1], pos[2]])
-        in_strand_index += 1
-        if in_strand_index == segment_length[current_strand]:
-            strands.append(one_strand)
-            one_strand = []
-            in_strand_index = 0
-            current_strand += 1
+def to_float_buffer(vectors):
+    '''return flat float buffer with coordinates of vectors
+    '''
+    if geometry_kernel.is_numpy():
+        return icecache.buffer_from_bytes(geometry_kernel.as_vectors(vectors, 3).astype("f").tobytes(), "f")
+    return array.array("f", (c for v in vectors for c in v[0:3]))
+
+
+def split_positions_to_buffers(raw_positions, segment_length):
+    '''split usd curve points to the first point of each strand and other strand points
+    return the tuple (points buffer, (strand sizes, strands buffer)) with flat float buffers, which can be passed to the icecache directly
+    '''
+    positions = to_float_buffer(raw_positions)
+    points = array.array("f")
+    strands = array.array("f")
+    strand_sizes = []
+    shift = 0
+    for length in segment_length:
+        points.extend(positions[3*shift:3*shift + 3])
+        strands.extend(positions[3*shift + 3:3*(shift + length)])
+        strand_sizes.append(length - 1)
+        shift += length
+
+    return points, (strand_sizes, strands)
+
+
+def get_ice_cache_data(raw_points, width_data, segments_data):
+    '''convert usd arrays to buffers for icecache
+    return the tuple (points, widths, strands), strands is None for pointclouds without strands
+    '''
+    if segments_data is not None:
+        points_data, strands_data = split_positions_to_buffers(raw_points, segments_data)
+        width_data = array.array("f", utils.extract_subarray(width_data, segments_data))
+    else:
+        points_data = to_float_buffer(raw_points)
+        width_data = array.array("f", width_data)
+        strands_data = None
+    return points_data, width_data, strands_data
 
-    return strands, points
 
+def get_ice_cache_path(folder_path, object_name, frame=None):
+    return folder_path + object_name + ("_" + str(frame) if frame is not None else "") + ".icecache"
 
-def write_ice_cache_at_frame(folder_path, object_name, raw_points, width_data, segments_data, frame=None):
+
+def write_ice_cache_at_frame(folder_path, object_name, raw_points, width_data, segments_data, frame=None, compression=9):
     if DEBUG_MODE:
         imp.reload(icecache)
 
-    if segments_data is not None:
-        strands_data, points_data = split_positions_to_strands_and_points(raw_points, segments_data)
-        width_data = utils.extract_subarray(width_data, segments_data)
+    points_data, width_data, strands_data = get_ice_cache_data(raw_points, width_data, segments_data)
+    icecache.write_point_cache(get_ice_cache_path(folder_path, object_name, frame), points_data, width_data, strands_data, compression)
+
+
+def get_ice_cache_manifest_path(folder_path, object_name):
+    return folder_path + object_name + "_manifest.json"
+
+
+def read_ice_cache_manifest(folder_path, object_name, settings):
+    '''return dictionary with fingerprints of cached frames (key - frame as string)
+    if there is no manifest, or it was written with other settings, then return empty dictionary
+    '''
+    manifest_path = get_ice_cache_manifest_path(folder_path, object_name)
+    if not os.path.isfile(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, "r") as file:
+            manifest = json.load(file)
+    except (IOError, ValueError):
+        return {}
+    if manifest.get("version") != ICE_CACHE_MANIFEST_VERSION or manifest.get("settings") != settings:
+        return {}
+    return manifest.get("frames", {})
+
+
+def write_ice_cache_manifest(folder_path, object_name, settings, frames):
+    with open(get_ice_cache_manifest_path(folder_path, object_name), "w") as file:
+        json.dump({"version": ICE_CACHE_MANIFEST_VERSION, "settings": settings, "frames": frames}, file, indent=1, sort_keys=True)
+
+
+def update_fingerprint(hasher, value):
+    '''add usd value (Vt array, matrix or None) to the hash
+    '''
+    if value is None:
+        data = b"none"
     else:
-        points_data = [[p[0], p[1], p[2]] for p in raw_points]
+        try:
+            data = memoryview(value).tobytes()
+        except TypeError:  # the value does not support buffer protocol
+            data = str(list(value)).encode("utf-8")
+    hasher.update(str(len(data)).encode("ascii") + b":")
+    hasher.update(data)
 
-    nb_particles = len(points_data)
-    ic = icecache.ICECache(nb_particles)
-    ic.add_point_position(points_data)
-    ic.add_scalar("Size", width_data)
-    if segments_data is not None:
-        ic.add_strand_position(strands_data)
-    ic.write(folder_path + object_name + ("_" + str(frame) if frame is not None else "") + ".icecache")
 
+def get_frame_fingerprint(positions, width_data, segments_data, tfm):
+    '''return hex digest of usd data, used for the icecache file at one frame
+    tfm is None, if the transform is ignored
+    '''
+    hasher = hashlib.md5()
+    for value in (positions, width_data, segments_data, tfm):
+        update_fingerprint(hasher, value)
+    return hasher.hexdigest()
 
-def write_ice_cache(usd_pointcloud, is_strands, xsi_object, project_path, file_name, up_key, ignore_tfm):
+
+def create_ice_cache_pool(workers):
+    '''return multiprocessing pool for writing icecache files, or None if it can not be created
+    inside Softimage sys.executable is XSI.exe, so child processes should use python.exe from the Softimage python folder
+    '''
+    import multiprocessing
+    import sys
+
+    if not os.path.basename(sys.executable).lower().startswith("python"):
+        python_path = os.path.join(sys.exec_prefix, "python.exe")
+        if not os.path.isfile(python_path):
+            print("[USD Import]: python.exe is not found in " + sys.exec_prefix + ", write icecache files in one process")
+            return None
+        multiprocessing.set_executable(python_path)
+    try:
+        return multiprocessing.Pool(workers)
+    except Exception as e:
+        print("[USD Import]: fail to start icecache workers (" + str(e) + "), write icecache files in one process")
+        return None
+
+
+def write_ice_cache(usd_pointcloud, is_strands, xsi_object, project_path, file_name, up_key, ignore_tfm, workers=1, compression=9):
+    '''if workers > 1, then animated caches are written by the pool of processes
+    usd data for each frame is read here, but packing, compression and file writing are done in workers
+    compression is gzip level 0-9 or icecache.COMPRESSION_STORE for uncompressed files
+    fingerprints of usd data are stored in the manifest, so frames with the same data and existed file are not written again
+    '''
     folder_path = project_path + "\\Simulation\\usd_cache\\" + file_name + "\\"
     if not os.path.exists(folder_path):
         os.makedirs(folder_path)
 
     usd_points = usd_pointcloud.GetPointsAttr()
     point_times = usd_points.GetTimeSamples()
-    usd_width = usd_pointcloud.GetWidthsAttr()
+    usd_width = utils.get_widths_attribute(usd_pointcloud)
     width_times = usd_width.GetTimeSamples()
 
     if is_strands:
@@ -137,42 +259,84 @@ def write_ice_cache(usd_pointcloud, is_strands, xsi_object, project_path, file_n
 
     segments_data = None
 
+    manifest_settings = {"up_axis": up_key, "ignore_tfm": ignore_tfm, "is_strands": is_strands, "compression": compression}
+    old_fingerprints = read_ice_cache_manifest(folder_path, xsi_object.Name, manifest_settings)
+    new_fingerprints = {}
+    # remove the manifest while files are rewritten, so it is not valid if the import is interrupted
+    if os.path.isfile(get_ice_cache_manifest_path(folder_path, xsi_object.Name)):
+        os.remove(get_ice_cache_manifest_path(folder_path, xsi_object.Name))
+
     if is_constant_points:
         in_tfm = usd_pointcloud.GetLocalTransformation()
-        if ignore_tfm is False and utils.is_matrices_are_different_arrays(in_tfm, [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]) is False:
+        if ignore_tfm is False and geometry_kernel.is_identity_matrix(in_tfm):
             ignore_tfm = True
 
-        tfm_positions = usd_points.Get() if ignore_tfm else [utils.vector_mult_to_matrix(p, in_tfm) for p in usd_points.Get()]
-        raw_positions = tfm_positions if up_key is "Y" else [[p[0], p[2], p[1]] for p in tfm_positions]
+        usd_positions = usd_points.Get()
         if is_strands:
             if is_constant_segments:
                 segments_data = usd_segments.Get()
             else:
                 segments_data = usd_segments.Get(0)
         if is_constant_widths:
-            width_data = usd_width.Get()
+            width_data = utils.get_float_values(usd_width)
         else:
-            width_data = usd_width.Get(width_times[0])
-        write_ice_cache_at_frame(folder_path, xsi_object.Name, raw_positions, width_data, segments_data)
+            width_data = utils.get_float_values(usd_width, width_times[0])
+        fingerprint = get_frame_fingerprint(usd_positions, width_data, segments_data, None if ignore_tfm else in_tfm)
+        new_fingerprints["static"] = fingerprint
+        if old_fingerprints.get("static") != fingerprint or not os.path.isfile(get_ice_cache_path(folder_path, xsi_object.Name)):
+            tfm_positions = usd_positions if ignore_tfm else geometry_kernel.vectors_mult_to_matrix(usd_positions, in_tfm)
+            raw_positions = tfm_positions if up_key is "Y" else geometry_kernel.swap_yz(tfm_positions)
+            write_ice_cache_at_frame(folder_path, xsi_object.Name, raw_positions, width_data, segments_data, compression=compression)
     else:
-        for frame in point_times:
-            frame_ignore_tfm = ignore_tfm
-            in_tfm = usd_pointcloud.GetLocalTransformation(frame)
-            if frame_ignore_tfm is False and utils.is_matrices_are_different_arrays(in_tfm, [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]) is False:
-                frame_ignore_tfm = True
-
-            tfm_positions = usd_points.Get(frame) if frame_ignore_tfm else [utils.vector_mult_to_matrix(p, in_tfm) for p in usd_points.Get(frame)]
-            raw_positions = tfm_positions if up_key is "Y" else [[p[0], p[2], p[1]] for p in tfm_positions]
-            if is_strands:
-                if is_constant_segments:
-                    segments_data = usd_segments.Get()
+        pool = None
+        pending_tasks = []
+        try:
+            for frame in point_times:
+                frame_ignore_tfm = ignore_tfm
+                in_tfm = usd_pointcloud.GetLocalTransformation(frame)
+                if frame_ignore_tfm is False and geometry_kernel.is_identity_matrix(in_tfm):
+                    frame_ignore_tfm = True
+
+                usd_positions = usd_points.Get(frame)
+                if is_strands:
+                    if is_constant_segments:
+                        segments_data = usd_segments.Get()
+                    else:
+                        segments_data = usd_segments.Get(frame)
+                if is_constant_widths:
+                    width_data = utils.get_float_values(usd_width)
                 else:
-                    segments_data = usd_segments.Get(frame)
-            if is_constant_widths:
-                width_data = usd_width.Get()
-            else:
-                width_data = usd_width.Get(frame)
-            write_ice_cache_at_frame(folder_path, xsi_object.Name, raw_positions, width_data, segments_data, frame=int(frame + 0.5))
+                    width_data = utils.get_float_values(usd_width, frame)
+
+                cache_frame = int(frame + 0.5)
+                fingerprint = get_frame_fingerprint(usd_positions, width_data, segments_data, None if frame_ignore_tfm else in_tfm)
+                new_fingerprints[str(cache_frame)] = fingerprint
+                if old_fingerprints.get(str(cache_frame)) == fingerprint and os.path.isfile(get_ice_cache_path(folder_path, xsi_object.Name, cache_frame)):
+                    continue
+
+                tfm_positions = usd_positions if frame_ignore_tfm else geometry_kernel.vectors_mult_to_matrix(usd_positions, in_tfm)
+                raw_positions = tfm_positions if up_key is "Y" else geometry_kernel.swap_yz(tfm_positions)
+                if pool is None and workers > 1:
+                    # create the pool only when there is at least one frame to write
+                    pool = create_ice_cache_pool(workers)
+                    workers = workers if pool is not None else 1
+                if pool is None:
+                    write_ice_cache_at_frame(folder_path, xsi_object.Name, raw_positions, width_data, segments_data, frame=cache_frame, compression=compression)
+                else:
+                    points_data, frame_width_data, strands_data = get_ice_cache_data(raw_positions, width_data, segments_data)
+                    task = icecache.pack_point_cache_task(get_ice_cache_path(folder_path, xsi_object.Name, cache_frame), points_data, frame_width_data, strands_data, compression)
+                    pending_tasks.append(pool.apply_async(icecache.write_point_cache_task, (task, )))
+                    # keep only few frames in the queue, so memory is not grow for long animations
+                    if len(pending_tasks) >= 2 * workers:
+                        pending_tasks.pop(0).get()
+            for task in pending_tasks:
+                task.get()
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    write_ice_cache_manifest(folder_path, xsi_object.Name, manifest_settings, new_fingerprints)
 
     return is_constant_points
 
@@ -198,20 +362,21 @@ def emit_pointcloud(app, options, pointloud_name, usd_tfm, visibility, usd_prim,
     if DEBUG_MODE:
         imp.reload(materials)
         imp.reload(utils)
+        imp.reload(geometry_kernel)
 
     usd_object = UsdGeom.BasisCurves(usd_prim) if is_strands else UsdGeom.Points(usd_prim)
     xsi_points = app.GetPrim("PointCloud", pointloud_name, xsi_parent)
 
     if options.get("is_materials", False):
         usd_material = UsdShade.MaterialBindingAPI(usd_prim).GetDirectBinding().GetMaterial()
-        xsi_material = materials.import_material(app, usd_material, library_name=options["file_name"])
+        xsi_material = materials.import_material(app, usd_material, library_name=options["file_name"], index=options.get("materials_index", None))
         if xsi_material is not None:
             app.AssignMaterial(xsi_material.FullName + "," + xsi_points.FullName)
 
     utils.set_xsi_transform(app, xsi_points, usd_tfm, up_key=options["up_axis"])
     utils.set_xsi_visibility(xsi_points, visibility)
     if "project_path" in options:
-        is_constant = write_ice_cache(usd_object, is_strands, xsi_points, options["project_path"], options["file_name"], options["up_axis"], is_simple)
+        is_constant = write_ice_cache(usd_object, is_strands, xsi_points, options["project_path"], options["file_name"], options["up_axis"], is_simple, options.get("ice_cache_workers", 1), options.get("ice_cache_compression", 9))
         # build ice-tree with caching node
         build_ice_tree(app, xsi_points, is_constant, options["file_name"])
 
@@ -1,5 +1,6 @@
 from pxr import Usd, UsdGeom
 import utils
+import sampling
 import imp
 
 DEBUG_MODE = False
@@ -8,13 +9,24 @@ DEBUG_MODE = False
 # ----------------------export-----------------------------
 
 
-def add_transform_to_xfo(usd_xform, obj, opt_anim):
-    if opt_anim is None or not utils.is_transform_animated(obj, opt_anim):
-        usd_xform.AddTransformOp().Set(utils.build_transform(obj))
+def add_transform_to_xfo(usd_xform, obj, opt_anim, sample_cache=None, is_fused=False, scheduler=None):
+    '''if is_fused is True, then transforms are read only once for each frame, and time samples are written only if the transform is changed
+    in this case transforms are sampled by the scheduler (if it is not None) together with other objects
+    in other case transforms, sampled by animation check, are reused from sample_cache
+    '''
+    if opt_anim is not None and is_fused:
+        tfm_writer = sampling.build_matrix_writer(usd_xform.AddTransformOp().GetAttr())
+        if scheduler is not None:
+            scheduler.add_track(obj, lambda frame: tfm_writer.add(frame, utils.build_transform(obj, frame)))
+        else:
+            for frame in range(opt_anim[0], opt_anim[1] + 1):
+                tfm_writer.add(frame, utils.build_transform(obj, frame))
+    elif opt_anim is None or not utils.is_transform_animated(obj, opt_anim, sample_cache):
+        usd_xform.AddTransformOp().Set(sampling.read_sample(sample_cache, obj.ObjectID, "transform", None, lambda: utils.build_transform(obj)))
     else:
         usd_tfm = usd_xform.AddTransformOp()
         for frame in range(opt_anim[0], opt_anim[1] + 1):
-            usd_tfm.Set(utils.build_transform(obj, frame), Usd.TimeCode(frame))
+            usd_tfm.Set(sampling.read_sample(sample_cache, obj.ObjectID, "transform", frame, lambda: utils.build_transform(obj, frame)), Usd.TimeCode(frame))
 
 
 def add_visibility_to_xfo(usd_xform, xsi_obj):
@@ -25,6 +37,7 @@ def add_visibility_to_xfo(usd_xform, xsi_obj):
 def add_xform(app, params, path_for_objects, create_ref, stage, obj, root_path, is_instance=False):
     if DEBUG_MODE:
         imp.reload(utils)
+        imp.reload(sampling)
     # we should create a new stage and reference the old one to this new
     opt_animation = params.get("animation", None)
     if create_ref:
@@ -46,10 +59,13 @@ def add_xform(app, params, path_for_objects, create_ref, stage, obj, root_path,
         usd_xform = UsdGeom.Xform.Define(stage, root_path + "/" + obj.Name)
         add_visibility_to_xfo(usd_xform, obj)
 
+    sample_cache = params.get("sample_cache", None)
+    is_fused = params.get("options", {}).get("fused_sampling", False)
+    scheduler = params.get("scheduler", None)
     if create_ref:
-        add_transform_to_xfo(refXform, obj, opt_animation)
+        add_transform_to_xfo(refXform, obj, opt_animation, sample_cache, is_fused, scheduler)
     else:
-        add_transform_to_xfo(usd_xform, obj, opt_animation)
+        add_transform_to_xfo(usd_xform, obj, opt_animation, sample_cache, is_fused, scheduler)
 
     if create_ref:
         return usd_xform, new_stage, stage_asset_path
@@ -0,0 +1,228 @@
+# sampling of animated values during the export
+# FrameSampleCache stores values, which are read from Softimage objects at different frames
+# animation checks (utils.is_*_animated) put sampled values to the cache and exporters reuse them instead of the second reading
+# FusedSampleWriter writes values of one usd attribute in one pass: the first value is written as default,
+# and time samples are created only when the value is changed at first time, so the animation check is not needed at all
+# in the held mode FusedSampleWriter writes only changed values
+# ExportScheduler collects single pass exports (tracks) of all objects and samples them in one pass through the frames
+import array
+import collections
+import sys
+from pxr import Usd
+import utils
+import geometry_kernel
+
+DEFAULT_BUDGET = 256 * 1048576  # in bytes
+
+
+def estimate_size(value):
+    '''return approximate size of the value in bytes, it is used only for the memory budget of the cache
+    long sequences are estimated by the first item, because items of sampled arrays have the same type
+    '''
+    if value is None:
+        return 0
+    if hasattr(value, "nbytes"):  # numpy array
+        return int(value.nbytes)
+    if isinstance(value, array.array):
+        return len(value) * value.itemsize
+    if isinstance(value, (list, tuple)):
+        if len(value) == 0:
+            return 64
+        if len(value) <= 16:
+            return 64 + sum(estimate_size(v) for v in value)
+        return 64 + len(value) * estimate_size(value[0])
+    return sys.getsizeof(value)
+
+
+class FrameSampleCache:
+    def __init__(self, budget=DEFAULT_BUDGET):
+        self.budget = budget
+        self.size = 0
+        self.samples = collections.OrderedDict()  # key (object id, kind, frame) -> (value, size), the least recently used key is the first
+
+    def get(self, object_id, kind, frame, default=None):
+        key = (object_id, kind, frame)
+        if key not in self.samples:
+            return default
+        # move the key to the end
+        item = self.samples.pop(key)
+        self.samples[key] = item
+        return item[0]
+
+    def put(self, object_id, kind, frame, value):
+        '''store the value, if it does not fit into the budget, then remove least recently used values of other objects
+        values of the same object are never removed, because they will be read by the exporter in the same order as they are sampled
+        so, if there is no place, the value is not stored
+        '''
+        key = (object_id, kind, frame)
+        if key in self.samples:
+            self.size -= self.samples.pop(key)[1]
+        value_size = estimate_size(value)
+        if value_size > self.budget:
+            return False
+        if self.size + value_size > self.budget:
+            for k in list(self.samples.keys()):
+                if k[0] != object_id:
+                    self.size -= self.samples.pop(k)[1]
+                    if self.size + value_size <= self.budget:
+                        break
+            if self.size + value_size > self.budget:
+                return False
+        self.samples[key] = (value, value_size)
+        self.size += value_size
+        return True
+
+    def sample(self, object_id, kind, frame, read_function):
+        '''return cached value or read it by read_function() and store to the cache
+        '''
+        key = (object_id, kind, frame)
+        if key in self.samples:
+            return self.get(object_id, kind, frame)
+        value = read_function()
+        self.put(object_id, kind, frame, value)
+        return value
+
+    def release(self, object_id):
+        '''remove all values of the object, call it when the object is exported
+        '''
+        for k in [k for k in self.samples.keys() if k[0] == object_id]:
+            self.size -= self.samples.pop(k)[1]
+
+    def clear(self):
+        self.samples.clear()
+        self.size = 0
+
+
+def read_sample(sample_cache, object_id, kind, frame, read_function):
+    '''the same as FrameSampleCache.sample(), but sample_cache can be None
+    '''
+    if sample_cache is None:
+        return read_function()
+    return sample_cache.sample(object_id, kind, frame, read_function)
+
+
+def release_samples(sample_cache, object_id):
+    if sample_cache is not None:
+        sample_cache.release(object_id)
+
+
+class FusedSampleWriter:
+    '''write values of one usd attribute frame by frame
+    is_different(reference, value) compares the value with the reference, which is created by build_reference(value)
+    while values are equal to the first one, only the default value is authored
+    when the value is changed at first time, the default value is cleared, the first value is written at the first and at the previous frames,
+    and all next values are written as time samples
+    if is_held is True, then after the first change the value is written only when it differs from the last written one,
+    in this case the last written value is also repeated at the frame before the change, so linear and held interpolations give the same result
+    call finish() after the last frame, it writes the end sample in the held mode
+    '''
+    def __init__(self, usd_attribute, is_different, build_reference=None, is_held=False):
+        self.usd_attribute = usd_attribute
+        self.is_different = is_different
+        self.build_reference = build_reference
+        self.is_held = is_held
+        self.held_value = None  # the first value, or the last written value in the held mode
+        self.reference = None
+        self.first_frame = None
+        self.last_frame = None
+        self.written_frame = None  # the last frame with written time sample
+        self.is_animated = False
+
+    def set_held_value(self, value):
+        self.held_value = value
+        self.reference = value if self.build_reference is None else self.build_reference(value)
+
+    def write_sample(self, frame, value):
+        self.usd_attribute.Set(value, Usd.TimeCode(frame))
+        self.written_frame = frame
+
+    def add(self, frame, value):
+        if self.first_frame is None:
+            self.first_frame = frame
+            self.set_held_value(value)
+            self.usd_attribute.Set(value)
+        elif self.is_animated and not self.is_held:
+            self.write_sample(frame, value)
+        elif self.is_different(self.reference, value):
+            if not self.is_animated:
+                self.usd_attribute.ClearDefault()
+                self.write_sample(self.first_frame, self.held_value)
+                self.is_animated = True
+            if self.written_frame != self.last_frame:
+                self.write_sample(self.last_frame, self.held_value)
+            self.write_sample(frame, value)
+            if self.is_held:
+                self.set_held_value(value)
+            else:
+                # the first value is not needed anymore
+                self.held_value = None
+                self.reference = None
+        self.last_frame = frame
+
+    def finish(self):
+        if self.is_animated and self.is_held and self.written_frame != self.last_frame:
+            self.write_sample(self.last_frame, self.held_value)
+
+
+def finish_writers(writers):
+    for writer in writers:
+        writer.finish()
+
+
+def build_array_writer(usd_attribute, dimension=1, is_distance=False, tolerance=utils.EPSILON, is_held=False):
+    '''return FusedSampleWriter for arrays of values (or vectors), which are compared by geometry_kernel.is_changed()
+    '''
+    return FusedSampleWriter(usd_attribute,
+                             lambda reference, value: geometry_kernel.is_changed(reference, value, dimension, is_distance, tolerance),
+                             lambda value: geometry_kernel.build_change_reference(value, dimension),
+                             is_held)
+
+
+def build_matrix_writer(usd_attribute):
+    return FusedSampleWriter(usd_attribute, geometry_kernel.is_matrices_are_different_arrays)
+
+
+class ExportScheduler:
+    '''sample animated objects frame by frame, all tracks are sampled at the frame before the next frame is set
+    so, if frames should be changed, the scene is evaluated only once per frame for all exported objects
+    the track is the pair of functions: sample(frame) reads the object at the frame and passes values to writers,
+    and finish(), which is called after the last frame (it finishes writers and saves the stage of the object)
+    any of these functions can be None, tracks are finished in the order of adding
+    '''
+    def __init__(self, app, opt_anim, force_frame=False):
+        self.app = app
+        self.opt_anim = opt_anim
+        self.force_frame = force_frame
+        self.tracks = []  # (object, sample function, finish function)
+
+    def add_track(self, obj, sample_function, finish_function=None):
+        self.tracks.append((obj, sample_function, finish_function))
+
+    def run(self, progress_bar=None):
+        if len(self.tracks) > 0:
+            for frame in range(self.opt_anim[0], self.opt_anim[1] + 1):
+                if progress_bar is not None:
+                    progress_bar.Caption = utils.build_export_object_caption(self.tracks[0][0], frame) if len(self.tracks) == 1 else "Export animation (frame " + str(frame) + ")"
+                if self.force_frame:
+                    self.app.SetValue("PlayControl.Current", frame, "")
+                    self.app.SetValue("PlayControl.Key", frame, "")
+                for obj, sample_function, finish_function in self.tracks:
+                    if sample_function is not None:
+                        sample_function(frame)
+            for obj, sample_function, finish_function in self.tracks:
+                if finish_function is not None:
+                    finish_function()
+        self.tracks = []
+
+
+def add_track(params, app, obj, sample_function, finish_function=None, progress_bar=None):
+    '''add the track to the scheduler of the export (params["scheduler"])
+    if there is no scheduler (for example, when the object is exported by itself, not by export_processor.export()), then the track is sampled at once
+    '''
+    scheduler = params.get("scheduler", None)
+    if scheduler is not None:
+        scheduler.add_track(obj, sample_function, finish_function)
+    else:
+        scheduler = ExportScheduler(app, params["animation"], params.get("options", {}).get("force_change_frame", False))
+        scheduler.add_track(obj, sample_function, finish_function)
+        scheduler.run(progress_bar)
@@ -1,8 +1,12 @@
-from pxr import UsdGeom, Gf
+from pxr import UsdGeom, Gf, Sdf
 import os
 import math
+import bisect
 
 EPSILON = 0.0001
+# type names of imported primvars, attributes with half precision are widened to floats
+UV_TYPE_NAMES = ("texCoord2f[]", "float2[]", "texCoord2h[]", "half2[]")
+COLOR_TYPE_NAMES = ("color3f[]", "color3h[]")
 
 
 # --------------------USD specific----------------------------
@@ -23,6 +27,69 @@ def build_transform(obj, frame=None):
         )
 
 
+def is_type_in(type_strings, type_names):
+    '''type_strings is the list of aliases of the usd type (ValueTypeName.aliasesAsStrings)
+    '''
+    for type_name in type_names:
+        if type_name in type_strings:
+            return True
+    return False
+
+
+def is_half_type(type_name):
+    '''return True for usd types with half precision values (half[], texCoord2h[], normal3h[] and so on)
+    '''
+    name = str(type_name)
+    return name.startswith("half") or name.endswith("h[]")
+
+
+def get_float_values(usd_attribute, frame=None, dimension=1):
+    '''return the value of the attribute at the frame (or the default value if the frame is None)
+    half precision values are converted to the list of floats (or tuples of floats for dimension > 1)
+    '''
+    value = usd_attribute.Get() if frame is None else usd_attribute.Get(frame)
+    if value is not None and is_half_type(usd_attribute.GetTypeName()):
+        import geometry_kernel
+        return geometry_kernel.to_list(geometry_kernel.widen_half_array(value, dimension))
+    return value
+
+
+def get_authored_primvar(usd_geom, name):
+    '''return the primvar with the given name, if it has authored value, otherwise return None
+    half precision normals and widths are written to primvars, because schema attributes have float types, and primvars override them
+    '''
+    primvars_api = UsdGeom.PrimvarsAPI(usd_geom)
+    if primvars_api.HasPrimvar(name):
+        primvar = primvars_api.GetPrimvar(name)
+        if primvar.HasAuthoredValue():
+            return primvar
+    return None
+
+
+def get_normals_attribute(usd_mesh):
+    '''return the pair (attribute, interpolation) for normals of the mesh
+    '''
+    primvar = get_authored_primvar(usd_mesh, "normals")
+    if primvar is not None:
+        return primvar.GetAttr(), primvar.GetInterpolation()
+    return usd_mesh.GetNormalsAttr(), usd_mesh.GetNormalsInterpolation()
+
+
+def get_widths_attribute(usd_geom):
+    primvar = get_authored_primvar(usd_geom, "widths")
+    if primvar is not None:
+        return primvar.GetAttr()
+    return usd_geom.GetWidthsAttr()
+
+
+def create_widths_attribute(usd_geom, is_half=False):
+    '''return the attribute for widths of points or curves, half precision widths are written to the primvar
+    '''
+    if is_half:
+        return UsdGeom.PrimvarsAPI(usd_geom).CreatePrimvar("widths", Sdf.ValueTypeNames.HalfArray, UsdGeom.Tokens.vertex).GetAttr()
+    return usd_geom.CreateWidthsAttr()
+
+
 def is_contains_transform(usd_prim):
     usd_props = usd_prim.GetPropertyNames()
     return "xformOp:transform" in usd_props
@@ -51,7 +118,7 @@ def is_animated_mesh(usd_mesh, attributes):
             # next check specific attributes
             # normals
             if "normal" in attributes:
-                normals_attr = usd_mesh.GetNormalsAttr()
+                normals_attr, normals_interpolation = get_normals_attribute(usd_mesh)
                 if normals_attr.IsAuthored():
                     normals_times = normals_attr.GetTimeSamples()
                     if len(normals_times) > 1:
@@ -63,9 +130,9 @@ def is_animated_mesh(usd_mesh, attributes):
                     type_strings = p.GetTypeName().aliasesAsStrings
                     interpolation = p.GetInterpolation()
                     times = p.GetTimeSamples()
-                    if "texCoord2f[]" in type_strings:  # this uvs
+                    if is_type_in(type_strings, UV_TYPE_NAMES):  # this uvs
                         is_animated = len(times) > 1
-                    elif "color3f[]" in type_strings and interpolation == "faceVarying":  # this is colors
+                    elif is_type_in(type_strings, COLOR_TYPE_NAMES) and interpolation == "faceVarying":  # this is colors
                         is_animated = len(times) > 1
                     elif interpolation == "vertex" and "float[]" in type_strings:  # this is weightmaps
                         is_animated = len(times) > 1
@@ -189,9 +256,21 @@ def is_matrices_are_different_arrays(matrix_a, matrix_b):
            abs(matrix_a[3][3] - matrix_b[3][3]) > EPSILON
 
 
-def is_transform_animated(xsi_obj, opt_anim):
+def is_transform_animated(xsi_obj, opt_anim, sample_cache=None):
+    '''if sample_cache is not None, then sampled transforms (from build_transform()) are stored to the cache with the kind "transform"
+    '''
     if opt_anim is None:
         return False
+    elif sample_cache is not None:
+        import sampling
+        import geometry_kernel
+
+        start_matrix = sampling.read_sample(sample_cache, xsi_obj.ObjectID, "transform", None, lambda: build_transform(xsi_obj))
+        for frame in range(opt_anim[0] + 1, opt_anim[1] + 1):
+            frame_matrix = sampling.read_sample(sample_cache, xsi_obj.ObjectID, "transform", frame, lambda: build_transform(xsi_obj, frame))
+            if geometry_kernel.is_matrices_are_different_arrays(start_matrix, frame_matrix):
+                return True
+        return False
     else:
         # get start transform matrix
         start_matrix = xsi_obj.Kinematics.Local.Transform.Matrix4
@@ -232,59 +311,75 @@ def is_focusdistance_animated(xsi_camera, opt_anim):
         return False
 
 
-def is_poincloud_animated(xsi_pc, opt_anim, check_strands=False):
+def read_pointcloud_geometry(xsi_geometry, read_strands=False):
+    '''return the tuple (positions, sizes, strands) with data from ice attributes of the pointcloud geometry
+    positions is a list of tuples, sizes is a list of floats, strands is a list of lists of tuples (or None, if read_strands is False)
+    '''
+    positions = [vector_to_tuple(v) for v in xsi_geometry.GetICEAttributeFromName("PointPosition").DataArray]
+    sizes = list(xsi_geometry.GetICEAttributeFromName("Size").DataArray)
+    strands = [[vector_to_tuple(v) for v in strand] for strand in xsi_geometry.GetICEAttributeFromName("StrandPosition").DataArray2D] if read_strands else None
+    return positions, sizes, strands
+
+
+def read_pointcloud_sample(xsi_pc, frame=None, read_strands=False):
+    return read_pointcloud_geometry(xsi_pc.GetActivePrimitive3().Geometry if frame is None else xsi_pc.GetActivePrimitive3(frame).GetGeometry3(frame), read_strands)
+
+
+def get_pointcloud_sample_kind(check_strands):
+    return "strands" if check_strands else "pointcloud"
+
+
+def is_poincloud_animated(xsi_pc, opt_anim, check_strands=False, sample_cache=None):
     # here we check only point positions and size attribute
     # return tru, if at least one of them are varying through time
+    # if sample_cache is not None, then data from read_pointcloud_sample() is stored to the cache
+    import geometry_kernel
+    import sampling
+
     if opt_anim is None:
         return False
     else:
+        kind = get_pointcloud_sample_kind(check_strands)
         # get attributes at start
-        start_geo = xsi_pc.GetActivePrimitive3().Geometry
-        start_pp_attr = start_geo.GetICEAttributeFromName("PointPosition")
-        start_size_attr = start_geo.GetICEAttributeFromName("Size")
-        start_pp_data = start_pp_attr.DataArray
-        start_size_data = start_size_attr.DataArray
+        start_pp_data, start_size_data, start_sp_data = sampling.read_sample(sample_cache, xsi_pc.ObjectID, kind, None, lambda: read_pointcloud_sample(xsi_pc, None, check_strands))
+        pp_reference = geometry_kernel.build_change_reference(start_pp_data, 3)
+        size_reference = geometry_kernel.build_change_reference(start_size_data)
         if check_strands:
-            start_sp_attr = start_geo.GetICEAttributeFromName("StrandPosition")
-            start_sp_data = start_sp_attr.DataArray2D
+            sp_reference = geometry_kernel.build_change_reference([v for strand in start_sp_data for v in strand], 3)
         for frame in range(opt_anim[0] + 1, opt_anim[1] + 1):
             # get attributes at frame
-            frame_geo = xsi_pc.GetActivePrimitive3(frame).GetGeometry3(frame)
-            frame_pp_attr = frame_geo.GetICEAttributeFromName("PointPosition")
-            frame_size_attr = frame_geo.GetICEAttributeFromName("Size")
-            frame_pp_data = frame_pp_attr.DataArray
-            frame_size_data = frame_size_attr.DataArray
-            if check_strands:
-                frame_sp_attr = frame_geo.GetICEAttributeFromName("StrandPosition")
-                frame_sp_data = frame_sp_attr.DataArray2D
-            if len(start_pp_data) != len(frame_pp_data) or len(start_size_data) != len(frame_size_data) or (check_strands is True and len(start_sp_data) > 0 and len(frame_sp_data) > 0 and len(start_sp_data[0]) != len(frame_sp_data[0])):
+            frame_pp_data, frame_size_data, frame_sp_data = sampling.read_sample(sample_cache, xsi_pc.ObjectID, kind, frame, lambda: read_pointcloud_sample(xsi_pc, frame, check_strands))
+            if len(start_pp_data) != len(frame_pp_data) or len(start_size_data) != len(frame_size_data):
                 # different sizes, so - animated
                 return True
-            else:
-                # both arrays have the same length, check values
-                for i in range(len(start_pp_data)):
-                    if get_distance(start_pp_data[i], frame_pp_data[i]) > EPSILON:
-                        return True
-                for i in range(len(start_size_data)):
-                    if abs(start_size_data[i] - frame_size_data[i]) > EPSILON:
-                        return True
-                if check_strands:
-                    for j in range(len(start_sp_data[i])):
-                        if get_distance(start_sp_data[i][j], frame_sp_data[i][j]) > EPSILON:
-                            return True
+            # both arrays have the same length, check values
+            if geometry_kernel.is_changed(pp_reference, frame_pp_data, 3, is_distance=True, tolerance=EPSILON**2) or geometry_kernel.is_changed(size_reference, frame_size_data):
+                return True
+            if check_strands:
+                if geometry_kernel.is_changed(sp_reference, [v for strand in frame_sp_data for v in strand], 3, is_distance=True, tolerance=EPSILON**2):
+                    return True
 
         return False
 
 
-def is_hair_animated(app, xsi_hair, opt_anim):
+def read_hair_sample(app, xsi_hair, frame=None):
+    return app.GetHairData(xsi_hair) if frame is None else app.GetHairData(xsi_hair, frame)
+
+
+def is_hair_animated(app, xsi_hair, opt_anim, sample_cache=None):
+    import geometry_kernel
+    import sampling
+
     if opt_anim is None:
         return False
     else:
-        start_pos, start_length, start_width = app.GetHairData(xsi_hair)
+        start_pos, start_length, start_width = sampling.read_sample(sample_cache, xsi_hair.ObjectID, "hair", None, lambda: read_hair_sample(app, xsi_hair))
+        references = [geometry_kernel.build_change_reference(data) for data in (start_pos, start_length, start_width)]
         for frame in range(opt_anim[0] + 1, opt_anim[1] + 1):
-            frame_pos, frame_length, frame_width = app.GetHairData(xsi_hair, frame)
-            if is_float_arrays_are_different(start_pos, frame_pos) or is_float_arrays_are_different(start_length, frame_length) or is_float_arrays_are_different(start_width, frame_width):
-                return True
+            frame_data = sampling.read_sample(sample_cache, xsi_hair.ObjectID, "hair", frame, lambda: read_hair_sample(app, xsi_hair, frame))
+            for i in range(3):
+                if geometry_kernel.is_changed(references[i], frame_data[i]):
+                    return True
 
         return False
 
@@ -324,30 +419,70 @@ def is_param_animated(xsi_param, opt_anim):
         return False
 
 
-def is_constant_topology(app, mesh, opt_anim, force_change_frame):
+def read_polygonmesh_data(xsi_polygonmesh):
+    '''return the result of Get2() for the polygon mesh geometry, for empty mesh return the data with one zero point and empty polygons
+    '''
+    if xsi_polygonmesh.Vertices.Count == 0:
+        return (((0,), (0,), (0,)), (0,))
+    return xsi_polygonmesh.Get2()
+
+
+def is_constant_topology(app, mesh, opt_anim, force_change_frame, sample_cache=None):
+    '''return the pair (is_constant, is_deformable)
+    positions are read by one call of Vertices.PositionArray for each frame
+    when the deformation is found, only the number of vertices is checked for other frames
+    if sample_cache is not None, then the data from read_polygonmesh_data() is stored to the cache with the kind "mesh"
+    for frames before the deformation is found (the data for other frames is read by the export)
+    '''
+    import geometry_kernel
+
     is_deformable = False
     if opt_anim is None:
         return True, False
+    elif sample_cache is not None:
+        import sampling
+
+        start_reference = None
+        for frame in range(opt_anim[0], opt_anim[1] + 1):
+            if force_change_frame:
+                app.SetValue("PlayControl.Current", frame, "")
+                app.SetValue("PlayControl.Key", frame, "")
+            if is_deformable:
+                # deformation is already found, so we should check only the topology
+                if len(start_reference[0]) != mesh.GetActivePrimitive3(frame).GetGeometry3(frame).Vertices.Count:
+                    return False, True
+                continue
+            frame_data = sampling.read_sample(sample_cache, mesh.ObjectID, "mesh", frame, lambda: read_polygonmesh_data(mesh.GetActivePrimitive3(frame).GetGeometry3(frame)))
+            frame_positions = geometry_kernel.from_xsi_vectors_array(frame_data[0])
+            if start_reference is None:
+                start_reference = geometry_kernel.build_change_reference(frame_positions, 3)
+            elif len(start_reference[0]) != len(frame_positions):
+                return False, True
+            else:
+                is_deformable = geometry_kernel.is_changed(start_reference, frame_positions, 3, is_distance=True)
+        return True, is_deformable
     else:
         # get number of points at the first frame
         geo = mesh.GetActivePrimitive3(opt_anim[0]).GetGeometry3(opt_anim[0])
-        start_vertices = [(v.Position.X, v.Position.Y, v.Position.Z) for v in geo.Vertices]
+        start_vertices = geometry_kernel.from_xsi_vectors_array(geo.Vertices.PositionArray)
         starr_vertex_count = len(start_vertices)
+        start_reference = geometry_kernel.build_change_reference(start_vertices, 3)
         # next iterate by other frames
         for frame in range(opt_anim[0] + 1, opt_anim[1] + 1):
             if force_change_frame:
                 app.SetValue("PlayControl.Current", frame, "")
                 app.SetValue("PlayControl.Key", frame, "")
-            geo_frame = mesh.GetActivePrimitive3(frame).GetGeometry3(frame)
-            frame_vertices = [(v.Position.X, v.Position.Y, v.Position.Z) for v in geo_frame.Vertices]
-            verts_frame = len(frame_vertices)
-            if starr_vertex_count != verts_frame:
-                return False, True
+            frame_vertices = mesh.GetActivePrimitive3(frame).GetGeometry3(frame).Vertices
+            if is_deformable:
+                # deformation is already found, so we should check only the topology
+                if starr_vertex_count != frame_vertices.Count:
+                    return False, True
             else:
+                frame_positions = geometry_kernel.from_xsi_vectors_array(frame_vertices.PositionArray)
+                if starr_vertex_count != len(frame_positions):
+                    return False, True
                 # the number of vertices are the same, check deformation
-                if is_deformable is False:
-                    # check the deformations
-                    is_deformable = is_tuple3_arrays_are_different(start_vertices, frame_vertices)
+                is_deformable = geometry_kernel.is_changed(start_reference, frame_positions, 3, is_distance=True)
 
         return True, is_deformable
 
@@ -489,13 +624,16 @@ def transpose_4vectors_array(array):
 
 def usd_to_xsi_faces_array(face_indexes, face_sizes, up_axis):
     # if up_axis = Z, then we should invert polygons
-    polygons = []
+    # the result array is allocated at once, and indexes of each polygon are copied by one slice
+    face_indexes = list(face_indexes)
+    polygons = [0] * (len(face_sizes) + sum(face_sizes))
+    shift = 0
     index = 0
     for f in face_sizes:
-        polygons.append(f)
-        for i in range(f):
-            polygons.append(face_indexes[index])
-            index += 1
+        polygons[shift] = f
+        polygons[shift + 1:shift + 1 + f] = face_indexes[index:index + f]
+        shift += f + 1
+        index += f
     return polygons
 
 
@@ -654,6 +792,60 @@ def get_closest_data(array, key):
             return array[end][1]
 
 
+def build_time_table(arrays):
+    '''return sorted list of all frames from animated arrays of the form [(frame, data), ...]
+    arrays with only one sample are ignored
+    '''
+    frames = set()
+    for array in arrays:
+        if len(array) > 1:
+            frames.update(a[0] for a in array)
+    return sorted(frames)
+
+
+def get_closest_index(times, key):
+    '''return index of the closest value in the sorted array times
+    for the same distance return the greater value, as in get_closest_data
+    '''
+    end = min(bisect.bisect_left(times, key), len(times) - 1)
+    start = max(end - 1, 0)
+    return start if abs(key - times[start]) < abs(key - times[end]) else end
+
+
+def build_frame_index(time_table, key):
+    '''return the triple (key, length of the time table, index of the closest frame in the table)
+    it should be created once for each frame and used in get_data_at_frame_index for all arrays of the object
+    '''
+    if time_table is None or len(time_table) == 0:
+        return (key, 0, None)
+    return (key, len(time_table), get_closest_index(time_table, key))
+
+
+def get_time_at_frame_index(array, frame_index):
+    '''return the frame of the sample, which is returned by get_data_at_frame_index
+    '''
+    key, table_length, index = frame_index
+    if len(array) == 1:
+        return array[0][0]
+    elif len(array) == table_length:
+        return array[index][0]
+    else:
+        return array[get_closest_index([a[0] for a in array], key)][0]
+
+
+def get_data_at_frame_index(array, frame_index):
+    '''array is [(frame, data), ...], frame_index is created by build_frame_index
+    arrays with all frames from the time table use precomputed index, other arrays use binary search
+    '''
+    key, table_length, index = frame_index
+    if len(array) == 1:
+        return array[0][1]
+    elif len(array) == table_length:
+        return array[index][1]
+    else:
+        return get_closest_data(array, key)
+
+
 def collapse_usd_hard_edges_data(indices, length, sharpness):
     '''convert three attributes for usd edge sharpness to one array of triples (v_start, v_end, sharpness)
     '''
@@ -695,6 +887,51 @@ def get_index_in_array_for_pair(array, v0, v1):
     return None
 
 
+def build_vertex_creases_index(vertex_creases):
+    '''return dictionary {vertex index: sharpness} for the array of pairs [(vertex index, sharpness), ...]
+    if the vertex is repeated, then the first value is used, as in get_index_in_array_for_value
+    '''
+    index = {}
+    for crease in vertex_creases:
+        if crease[0] not in index:
+            index[crease[0]] = crease[1]
+    return index
+
+
+def build_edge_creases_index(edge_creases):
+    '''return dictionary {(v_min, v_max): sharpness} for the array of triples [(v_start, v_end, sharpness), ...]
+    key is sorted pair of vertex indexes, so the edge can be found for any direction, as in get_index_in_array_for_pair
+    '''
+    index = {}
+    for crease in edge_creases:
+        key = (crease[0], crease[1]) if crease[0] <= crease[1] else (crease[1], crease[0])
+        if key not in index:
+            index[key] = crease[2]
+    return index
+
+
+def group_by_crease_value(elements, step=0.01):
+    '''elements is an iterable of pairs (element index, crease value)
+    return dictionary {crease value: [element indexes, ...]}
+    the element is added to the existing value, if the difference is less than the step, otherwise its value is added as the new key
+    existing values are stored in the sorted list, so only two neighbour values are compared with the element value
+    '''
+    creases_dict = {}
+    keys = []  # sorted keys of the creases_dict
+    for element_index, value in elements:
+        position = bisect.bisect_left(keys, value)
+        nearest_key = None
+        for key in keys[max(0, position - 1):position + 1]:
+            if abs(key - value) < step and (nearest_key is None or abs(key - value) < abs(nearest_key - value)):
+                nearest_key = key
+        if nearest_key is None:
+            keys.insert(position, value)
+            creases_dict[value] = [element_index]
+        else:
+            creases_dict[nearest_key].append(element_index)
+    return creases_dict
+
+
 def get_in_dict(dict, key, default=None):
     '''the same as dict.get(key, default)
     XSI build-in dictionary does not supports this default method